@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Picks the ASGI database connection defaults (pooling instead of persistent connections)
+os.environ.setdefault('APP_SERVER', 'asgi')
 
 application = get_asgi_application()
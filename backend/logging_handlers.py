@@ -0,0 +1,183 @@
+"""
+Logging handlers that keep file I/O off the request path.
+
+Log records are put on a bounded in-memory queue by the request thread and
+written to a RotatingFileHandler by a background QueueListener thread, so disk
+writes and rotation never add to request latency.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+
+
+class _BlockingQueueListener(logging.handlers.QueueListener):
+
+    def enqueue_sentinel(self):
+        # The stock listener uses put_nowait, which fails when the queue is full
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        # Handlers start their listener with the first record, it may never have run
+        if self._thread is not None:
+            super().stop()
+
+
+class AsyncRotatingFileHandler(logging.handlers.QueueHandler):
+    """
+    RotatingFileHandler behind a bounded queue and a listener thread.
+
+    overflow decides what happens when the queue is full:
+    - 'drop': DEBUG/INFO records are dropped at once, WARNING and above wait
+      up to warning_timeout seconds (a fraction of a request) for room
+    - 'block': every record waits up to put_timeout seconds for room
+      (backpressure on the caller)
+    Records still without room after the wait are dropped and counted, so a
+    listener that fell behind or stopped writing never hangs the callers.
+
+    The log directory and the listener thread are created by the first
+    record, so configuring handlers that are never used costs nothing. A
+    forked child does not inherit the listener thread: it gets a new queue
+    and starts its own listener with its first record.
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, encoding=None,
+                 queue_size=10000, overflow='drop', put_timeout=5.0, warning_timeout=0.05):
+        if overflow not in ('drop', 'block'):
+            raise ValueError(f"Invalid overflow policy: {overflow}")
+        super().__init__(queue.Queue(maxsize=queue_size))
+
+        self.target = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=True,
+        )
+        self.overflow = overflow
+        self.put_timeout = put_timeout
+        self.warning_timeout = warning_timeout
+        self.dropped = 0
+        self.drop_lock = threading.Lock()
+        self.listener = _BlockingQueueListener(self.queue, self.target)
+        self.started = False
+        self.start_lock = threading.Lock()
+        atexit.register(self.close)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.reset_after_fork)
+
+    def reset_after_fork(self):
+        # Only the forking thread survives in the child: the listener is gone
+        # and the queue's locks may have been held by it
+        if self.listener is None:
+            return  # Closed
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.listener = _BlockingQueueListener(self.queue, self.target)
+        self.started = False
+        self.start_lock = threading.Lock()
+        self.dropped = 0
+        self.drop_lock = threading.Lock()
+
+    def start(self):
+        with self.start_lock:
+            if self.started or self.listener is None:
+                return
+            os.makedirs(os.path.dirname(self.target.baseFilename), exist_ok=True)
+            self.listener.start()
+            self.started = True
+
+    def setFormatter(self, fmt):
+        # Records are formatted by the file handler on the listener thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Merge the %-style arguments now, they may change after the call returns.
+        # Time and layout formatting are left to the listener thread.
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if not self.started:
+            self.start()
+        if self.overflow == 'block':
+            timeout = self.put_timeout
+        elif record.levelno >= logging.WARNING:
+            timeout = self.warning_timeout
+        else:
+            timeout = 0
+        try:
+            if self.dropped and self.overflow == 'drop':
+                self.put_dropped_record(record)
+            if timeout:
+                self.queue.put(record, timeout=timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.count_dropped(1)
+
+    def count_dropped(self, count):
+        # Request threads log concurrently, += on an attribute is not atomic
+        with self.drop_lock:
+            self.dropped += count
+
+    def put_dropped_record(self, record):
+        ''' Report the records dropped so far, before the record that found room again '''
+        with self.drop_lock:
+            dropped, self.dropped = self.dropped, 0
+        if not dropped:
+            return
+        try:
+            self.queue.put_nowait(logging.makeLogRecord({
+                'name': record.name,
+                'levelno': logging.WARNING,
+                'levelname': 'WARNING',
+                'msg': f"{dropped} log records dropped, the logging queue was full",
+            }))
+        except queue.Full:
+            # Still full, the record itself may wait for room (warnings)
+            self.count_dropped(dropped)
+
+    def close(self):
+        with self.start_lock:
+            if self.listener is not None:
+                # Flushes every queued record before the file is closed
+                self.listener.stop()
+                self.listener = None
+        self.target.close()
+        super().close()
+
+
+class JsonFormatter(logging.Formatter):
+    """ One JSON object per line, for log shippers """
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """ Keeps a fraction of the records below WARNING, WARNING and above always pass """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
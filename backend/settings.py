@@ -1,6 +1,8 @@
 from datetime import timedelta
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
+import copy
+import importlib.util
 import os
 import logging
 import logging.handlers
@@ -25,6 +27,16 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 # Application definition
 
+# Deployment profile: 'full' (default) serves the task API together with the
+# admin, allauth social login and dj_rest_auth. 'api' is for workers that only
+# serve api/ with JWT: it loads just the apps, middleware and URLs the task API
+# needs, which shortens worker cold starts and manage.py commands.
+# manage.py startup_report shows the import time of each profile.
+DEPLOYMENT_PROFILE = config('DEPLOYMENT_PROFILE', default='full')
+if DEPLOYMENT_PROFILE not in ('full', 'api'):
+    raise ValueError(f"Invalid DEPLOYMENT_PROFILE: {DEPLOYMENT_PROFILE}")
+API_ONLY = DEPLOYMENT_PROFILE == 'api'
+
 INSTALLED_APPS = [
     # default apps
     'django.contrib.admin',
@@ -52,22 +64,49 @@ SITE_ID = 1  # Required for django-allauth
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication with an in-process cache of the token users
+        'tasks.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'tasks.renderers.InstrumentedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Token buckets per user (tasks/throttling.py), reads and writes have separate
+    # budgets, the token endpoints use tasks_token per client IP (api_urls.py)
+    'DEFAULT_THROTTLE_CLASSES': (
+        'tasks.throttling.ReadRateThrottle',
+        'tasks.throttling.WriteRateThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'tasks_read': config('TASKS_THROTTLE_READ', default='600/min'),
+        'tasks_write': config('TASKS_THROTTLE_WRITE', default='120/min'),
+        'tasks_token': config('TASKS_THROTTLE_TOKEN', default='10/min'),
+    },
 }
 
+# Where the throttle buckets live: 'local' keeps them in each worker process (a
+# client may then use the budget once per process), 'cache' shares them through
+# the default cache, which must then be a shared backend with atomic incr (Redis,
+# Memcached). Behind a proxy set REST_FRAMEWORK['NUM_PROXIES'] for the client IPs.
+TASKS_THROTTLE_BACKEND = config('TASKS_THROTTLE_BACKEND', default='local')
+
 # JWT settings for access and refresh tokens
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    'UPDATE_LAST_LOGIN': config('JWT_UPDATE_LAST_LOGIN', default=True, cast=bool),
 }
 
+# Seconds an authenticated user stays cached per access token, this is also how
+# long another worker process may still accept a deactivated user (0 disables)
+TASKS_AUTH_USER_CACHE_TTL = config('TASKS_AUTH_USER_CACHE_TTL', default=60, cast=int)
+TASKS_AUTH_USER_CACHE_SIZE = config('TASKS_AUTH_USER_CACHE_SIZE', default=10000, cast=int)
+
 
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',  # Default backend
@@ -111,9 +150,27 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',  # Newly added
+    'tasks.middleware.RequestMetricsMiddleware',  # Per view timings, served at api/metrics/
 ]
 
 
+if API_ONLY:
+    # JWT requests use neither sessions, CSRF cookies nor messages, tokens come from api/token/
+    INSTALLED_APPS = [
+        'django.contrib.auth',
+        'django.contrib.contenttypes',
+        'rest_framework',
+        'tasks',
+    ]
+    MIDDLEWARE = [
+        'django.middleware.security.SecurityMiddleware',
+        'django.middleware.common.CommonMiddleware',
+        'tasks.middleware.RequestMetricsMiddleware',
+    ]
+    AUTHENTICATION_BACKENDS = ['django.contrib.auth.backends.ModelBackend']
+    # The browsable API needs templates and static files, API workers only speak JSON
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = ('tasks.renderers.InstrumentedJSONRenderer',)
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -132,23 +189,127 @@ TEMPLATES = [
     },
 ]
 
+if API_ONLY:
+    TEMPLATES[0]['OPTIONS']['context_processors'] = ['django.template.context_processors.request']
+
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Connection reuse:
+# - WSGI (default): persistent connections kept for DB_CONN_MAX_AGE seconds and
+#   health-checked before reuse, so a request does not pay TCP + auth setup.
+# - ASGI (APP_SERVER=asgi, set by backend/asgi.py): persistent connections are
+#   per async context there and would leak, so psycopg3's connection pool is
+#   used instead when psycopg_pool is installed. DB_POOL=True/False overrides.
+# Server-side cursors back QuerySet.iterator() for the streamed task list, set
+# DB_DISABLE_SERVER_SIDE_CURSORS=True behind pgbouncer in transaction mode.
+APP_SERVER = config('APP_SERVER', default='wsgi')
+DB_POOL = config('DB_POOL', default=APP_SERVER == 'asgi', cast=bool)
+if DB_POOL and importlib.util.find_spec('psycopg_pool') is None:
+    DB_POOL = False
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'task_manager_db',
-        'USER': 'task_user',
+        'NAME': config('DB_NAME', default='task_manager_db'),
+        'USER': config('DB_USER', default='task_user'),
         'PASSWORD': config('DB_PASSWORD'),
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'HOST': config('DB_HOST', default='localhost'),
+        'PORT': config('DB_PORT', default='5432'),
+        # The pool owns the connections, Django must close (return) them after each request
+        'CONN_MAX_AGE': 0 if DB_POOL or APP_SERVER == 'asgi' else config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': config('DB_DISABLE_SERVER_SIDE_CURSORS', default=False, cast=bool),
+        'OPTIONS': {
+            'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+        },
+    }
+}
+
+if DB_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),  # Seconds to wait for a free connection
+        'max_idle': 300,
+    }
+
+# Read replicas: DB_REPLICA_HOSTS=host1,host2 adds the aliases replica1, replica2...
+# with the credentials of the primary. The task list, search, stats and history
+# reads go to a random replica (tasks/routers.py), except for users who wrote in
+# the last TASKS_REPLICA_PIN_SECONDS, keep it above the usual replication lag.
+# The pin is stored in the TASKS_CACHE_ALIAS cache: with replicas, that cache
+# must be shared by every worker process (Redis, Memcached), the per-process
+# LocMemCache default would only pin the writer on the worker that served the
+# write. The tasks.E001 system check refuses to start otherwise, silence it
+# (SILENCED_SYSTEM_CHECKS) only for a deployment with a single process.
+for index, host in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), start=1):
+    DATABASES[f'replica{index}'] = dict(copy.deepcopy(DATABASES['default']), HOST=host, TEST={'MIRROR': 'default'})
+
+TASKS_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+TASKS_REPLICA_PIN_SECONDS = config('TASKS_REPLICA_PIN_SECONDS', default=5, cast=int)
+DATABASE_ROUTERS = ['tasks.routers.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory (per process, LRU eviction) by default. For several workers point
+# CACHE_BACKEND/CACHE_LOCATION at a shared backend, e.g.
+# django.core.cache.backends.redis.RedisCache and redis://127.0.0.1:6379/1
+
+CACHE_BACKEND = config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': config('CACHE_LOCATION', default='task-api'),
+        'TIMEOUT': 300,
     }
 }
 
+if CACHE_BACKEND.endswith('LocMemCache'):
+    # Least recently used entries are culled past this size
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 10000}
+
+# Per-user response cache of the task list and completed history endpoints
+TASKS_CACHE_ALIAS = 'default'
+TASKS_CACHE_TIMEOUT = config('TASKS_CACHE_TIMEOUT', default=300, cast=int)
+
+# Request metrics (tasks/middleware.py): slow request thresholds and the
+# bearer token of the Prometheus scraper
+TASKS_SLOW_REQUEST_MS = config('TASKS_SLOW_REQUEST_MS', default=500, cast=int)
+TASKS_SLOW_REQUEST_QUERIES = config('TASKS_SLOW_REQUEST_QUERIES', default=50, cast=int)
+TASKS_METRICS_TOKEN = config('TASKS_METRICS_TOKEN', default='')
+
+# Deadline reminders (tasks/reminders.py, manage.py run_reminders): open tasks
+# due within TASKS_DUE_SOON_HOURS are due soon, missed deadlines are picked up
+# for TASKS_OVERDUE_LOOKBACK_HOURS, the worker scans every TASKS_REMINDER_INTERVAL seconds
+TASKS_DUE_SOON_HOURS = config('TASKS_DUE_SOON_HOURS', default=24, cast=int)
+TASKS_OVERDUE_LOOKBACK_HOURS = config('TASKS_OVERDUE_LOOKBACK_HOURS', default=24 * 7, cast=int)
+TASKS_REMINDER_INTERVAL = config('TASKS_REMINDER_INTERVAL', default=60, cast=int)
+
+# Pre-rendered task lists of hot users (tasks/snapshots.py): a user with
+# TASKS_SNAPSHOT_HOT_REQUESTS task list requests within TASKS_SNAPSHOT_WINDOW
+# seconds in one web process is served a snapshot for TASKS_SNAPSHOT_HOT_SECONDS.
+# Snapshots are rebuilt by manage.py run_snapshots on TASKS_SNAPSHOT_PROCESSES
+# processes, keep the threshold at 0 (disabled) when that worker is not running.
+TASKS_SNAPSHOT_HOT_REQUESTS = config('TASKS_SNAPSHOT_HOT_REQUESTS', default=0, cast=int)
+TASKS_SNAPSHOT_WINDOW = config('TASKS_SNAPSHOT_WINDOW', default=60, cast=int)
+TASKS_SNAPSHOT_HOT_SECONDS = config('TASKS_SNAPSHOT_HOT_SECONDS', default=600, cast=int)
+TASKS_SNAPSHOT_PROCESSES = config('TASKS_SNAPSHOT_PROCESSES', default=2, cast=int)
+TASKS_SNAPSHOT_INTERVAL = config('TASKS_SNAPSHOT_INTERVAL', default=1, cast=float)
+
+# Text search configuration of the task search vectors (PostgreSQL, tasks/search/)
+TASKS_SEARCH_CONFIG = config('TASKS_SEARCH_CONFIG', default='english')
+
+# Completed task history older than TASKS_HISTORY_HOT_MONTHS months (current
+# month included) is moved to gzip NDJSON files by manage.py archive_history
+TASKS_HISTORY_HOT_MONTHS = config('TASKS_HISTORY_HOT_MONTHS', default=12, cast=int)
+TASKS_HISTORY_ARCHIVE_DIR = config('TASKS_HISTORY_ARCHIVE_DIR', default=str(BASE_DIR / 'archive'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -194,6 +355,30 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Add at the end of settings.py
 # logging settings
+# File handlers write from a background thread through a bounded queue (see
+# backend/logging_handlers.py), started by the first record so idle loggers
+# cost nothing at startup. LOG_FORMAT=json switches to one JSON object per
+# line and LOG_INFO_SAMPLE_RATE keeps only that fraction of the api INFO lines.
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_FORMAT = config('LOG_FORMAT', default='verbose')
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+LOG_OVERFLOW = config('LOG_OVERFLOW', default='drop')  # 'drop' or 'block'
+LOG_INFO_SAMPLE_RATE = config('LOG_INFO_SAMPLE_RATE', default=1.0, cast=float)
+
+
+def log_file_handler(filename, level):
+    return {
+        'level': level,
+        'class': 'backend.logging_handlers.AsyncRotatingFileHandler',
+        'filename': os.path.join(BASE_DIR, 'logs', filename),
+        'maxBytes': 5 * 1024 * 1024,  # Rotate after 5 MB
+        'backupCount': 5,  # Keep 5 backup files
+        'queue_size': LOG_QUEUE_SIZE,
+        'overflow': LOG_OVERFLOW,
+        'formatter': LOG_FORMAT,
+    }
+
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -203,50 +388,33 @@ LOGGING = {
             'style': '{',
             'datefmt': '%Y-%m-%d %H:%M:%S',
         },
-    },
-    'handlers': {
-        'file_app': {
-            'level': 'DEBUG',
-            'class': 'logging.handlers.RotatingFileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', 'app_info.log'),
-            'maxBytes': 5 * 1024 * 1024,  # Rotate after 5 MB
-            'backupCount': 5,  # Keep 5 backup files
-            'formatter': 'verbose',  # Use the custom formatter
-        },
-        'file_db': {
-            'level': 'WARNING',
-            'class': 'logging.handlers.RotatingFileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', 'db.log'),
-            'maxBytes': 5 * 1024 * 1024,
-            'backupCount': 5,
-            'formatter': 'verbose',
+        'json': {
+            '()': 'backend.logging_handlers.JsonFormatter',
+            'datefmt': '%Y-%m-%dT%H:%M:%S',
         },
-        'file_autoreload': {
-            'level': 'WARNING',
-            'class': 'logging.handlers.RotatingFileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', 'autoreload.log'),
-            'maxBytes': 5 * 1024 * 1024,
-            'backupCount': 5,
-            'formatter': 'verbose',
+    },
+    'filters': {
+        'sample_info': {
+            '()': 'backend.logging_handlers.SamplingFilter',
+            'rate': LOG_INFO_SAMPLE_RATE,
         },
-        'file_api': {
-            'level': 'INFO',
-            'class': 'logging.handlers.RotatingFileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', 'api.log'),
-            'maxBytes': 5 * 1024 * 1024,
-            'backupCount': 5,
-            'formatter': 'verbose',
-        }
+    },
+    'handlers': {
+        'file_app': log_file_handler('app_info.log', 'DEBUG'),
+        'file_db': log_file_handler('db.log', 'WARNING'),
+        'file_autoreload': log_file_handler('autoreload.log', 'WARNING'),
+        'file_api': dict(log_file_handler('api.log', 'INFO'), filters=['sample_info']),
+        'file_slow': log_file_handler('slow_requests.log', 'WARNING'),
     },
     'loggers': {
         'django': {
             'handlers': ['file_app'],
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'propagate': False,
         },
         'tasks': {  # Custom logger for your tasks app
             'handlers': ['file_app'],
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'propagate': False,
         },
         
@@ -265,6 +433,16 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
             
+        },
+        'api.slow':{
+            'handlers': ['file_slow'],
+            'level': 'WARNING',
+            'propagate': False,
         }
     },
 }
+
+if API_ONLY:
+    # The autoreloader only runs under runserver
+    del LOGGING['handlers']['file_autoreload']
+    del LOGGING['loggers']['django.utils.autoreload']
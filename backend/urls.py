@@ -14,16 +14,19 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path, include
-from django.shortcuts import redirect
-from django.contrib.auth.decorators import login_required
-
-# Redirect view for the root URL
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('api/', include('tasks.api_urls')),  # Include API URLs from tasks
-    path('auth/', include('dj_rest_auth.urls')),
-    path('auth/registration/', include('dj_rest_auth.registration.urls')),
 ]
+
+# API-only workers never import the admin, dj_rest_auth or allauth
+if not settings.API_ONLY:
+    from django.contrib import admin
+
+    urlpatterns += [
+        path('admin/', admin.site.urls),
+        path('auth/', include('dj_rest_auth.urls')),
+        path('auth/registration/', include('dj_rest_auth.registration.urls')),
+    ]
@@ -1,6 +1,7 @@
 # tasks/api_urls.py
 from django.urls import path
-from . import api_views
+from . import api_views, async_views
+from .throttling import TokenRateThrottle
 from rest_framework_simplejwt.views import(
     TokenObtainPairView,
     TokenRefreshView,
@@ -11,9 +12,23 @@ urlpatterns = [
     path('tasks/create/', api_views.TaskCreateView.as_view(), name='task_create_api'),
     path('tasks/<int:pk>/update/', api_views.TaskUpdateView.as_view(), name='task_update_api'),
     path('tasks/<int:pk>/delete/', api_views.TaskDeleteView.as_view(), name='task_delete_api'),
+    path('tasks/bulk/', api_views.TaskBulkView.as_view(), name='task_bulk_api'),
+    path('tasks/sync/', api_views.TaskSyncView.as_view(), name='task_sync_api'),
+    path('tasks/search/', api_views.TaskSearchView.as_view(), name='task_search_api'),
+    path('tasks/stats/', api_views.TaskStatsView.as_view(), name='task_stats_api'),
     path('tasks/completed-history/', api_views.CompletedTaskHistoryView.as_view(), name='completed_task_history_api'),
+    path('tasks/export/', api_views.TaskExportView.as_view(), name='task_export_api'),
+    path('tasks/import/', api_views.TaskImportView.as_view(), name='task_import_api'),
+    path('tasks/completed-history/export/', api_views.CompletedTaskHistoryExportView.as_view(), name='completed_task_history_export_api'),
+    path('metrics/', api_views.MetricsView.as_view(), name='metrics_api'),
+    # Async variants of the task API for ASGI deployments
+    path('async/tasks/', async_views.AsyncTaskListView.as_view(), name='async_task_list_api'),
+    path('async/tasks/create/', async_views.AsyncTaskCreateView.as_view(), name='async_task_create_api'),
+    path('async/tasks/<int:pk>/update/', async_views.AsyncTaskUpdateView.as_view(), name='async_task_update_api'),
+    path('async/tasks/<int:pk>/delete/', async_views.AsyncTaskDeleteView.as_view(), name='async_task_delete_api'),
+    path('async/tasks/completed-history/', async_views.AsyncCompletedTaskHistoryView.as_view(), name='async_completed_task_history_api'),
     # JWT Token endpoints
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/', TokenObtainPairView.as_view(throttle_classes=[TokenRateThrottle]), name='token_obtain_pair'),
+    path('token/refresh/', TokenRefreshView.as_view(throttle_classes=[TokenRateThrottle]), name='token_refresh'),
     
 ]
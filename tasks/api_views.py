@@ -1,37 +1,215 @@
 # tasks/api_views.py
 
+import hmac
+
+from django.conf import settings
 from django.forms import ValidationError
+from django.http import HttpResponse
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Task, CompletedTaskHistory
-from .serializers import TaskSerializer, CompletedTaskHistorySerializer  # You'll need to create a serializer
+from .models import Task, CompletionRollup
+from .serializers import TaskSerializer, TaskValuesSerializer, CompletedTaskHistoryValuesSerializer
+from .queries import (
+    task_list_queryset, completed_history_queryset, completion_stats, filter_due, filter_task_list, parse_task_fields,
+    search_tasks, DUE_FILTERS,
+)
+from .cache import response_key, get_cached_response, set_cached_response
+from .conditional import (
+    task_list_validators, task_list_etag, last_modified_timestamp, set_validator_headers,
+    task_etag, if_match_passes,
+)
+from .sync import changes_since, InvalidSyncToken
+from .archive import reads_archive, archived_history
+from .routers import ReplicaReadMixin
+from .snapshots import snapshot_body
+from .metrics import registry
+from .transfer import (
+    FORMATS, TASK_EXPORT_COLUMNS, HISTORY_EXPORT_COLUMNS, task_export_queryset, history_export_queryset,
+    export_response, import_tasks,
+)
+from .pagination import KeysetPaginator, InvalidCursor, DEFAULT_PAGE_SIZE, streaming_json_response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import APIException
 import logging
 
 logger = logging.getLogger('api')
 
-class TaskListView(APIView):
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+MAX_SEARCH_LENGTH = 200
+
+class TaskListView(ReplicaReadMixin, APIView):
     permission_classes = [IsAuthenticated]  # Restrict access to authenticated users
 
     def get(self, request):
         try:
-            logger.info(f"Received request for task list by user: {request.user.username}" )
-            tasks = Task.objects.filter(user=request.user)  # Get tasks for the logged-in user
-            if not tasks.exists():
-                logger.warning(f"No tasks found for user: {request.user.username}")            
-            serializer = TaskSerializer(tasks, many=True)
-            logger.info(f"Returned {tasks.count()} tasks for {request.user.username}")
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            logger.info("Received request for task list by user: %s", request.user.username)
+
+            # Filters and the fields= projection run in the database
+            params = request.query_params
+            try:
+                fields = parse_task_fields(params.get('fields'))
+                tasks = filter_task_list(task_list_queryset(request.user, fields), params)
+                if 'ordering' in params:
+                    tasks = KeysetPaginator(ordering=params['ordering']).order(tasks)
+            except ValueError as e:
+                logger.warning("Invalid task list parameters for user: %s: %s", request.user.username, e)
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Deadline filters depend on the current time, neither validators nor cached bodies apply
+            due = params.get('due')
+            if due is not None:
+                if due not in DUE_FILTERS:
+                    logger.warning("Invalid due filter for user: %s: %s", request.user.username, due)
+                    return Response({"error": f"due must be one of: {', '.join(DUE_FILTERS)}"}, status=status.HTTP_400_BAD_REQUEST)
+                return self.get_task_list(request, filter_due(tasks, due), fields, cacheable=False)
+
+            # Conditional GET: answer 304 from the aggregate validators without loading any task
+            validators = task_list_validators(request.user)
+            etag = task_list_etag(request, validators)
+            last_modified = last_modified_timestamp(validators)
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                logger.info("Task list not modified for %s", request.user.username)
+                return not_modified
+
+            # Hot users get the full list pre-rendered by the snapshot worker, one row read
+            if not params and request.accepted_renderer.format == 'json':
+                body = snapshot_body(request.user.pk, validators)
+                if body is not None:
+                    logger.info("Returned task list snapshot for %s", request.user.username)
+                    response = HttpResponse(body, content_type='application/json')
+                    set_validator_headers(response, etag, last_modified)
+                    return response
+
+            response = self.get_task_list(request, tasks, fields)
+            if response.status_code == status.HTTP_200_OK:
+                set_validator_headers(response, etag, last_modified)
+            return response
         
         except APIException as e:
-            logger.error(f"APIException occurred for user: {request.user.username} while fetching task list: {str(e)}")
+            logger.error("APIException occurred for user: %s while fetching task list: %s", request.user.username, e)
             return Response({"error": "an error occurred while fetching task list"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
             
         except Exception as e:
-            logger.error(f"Unexpected error for user: {request.user.username} while fetching task list: {str(e)}")
+            logger.error("Unexpected error for user: %s while fetching task list: %s", request.user.username, e)
+            return Response({"error": "an unexpected error occurred"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def get_task_list(self, request, tasks, fields=None, cacheable=True):
+        # Opt-in cursor pagination and streaming for users with very large task sets
+        params = request.query_params
+        if params.get('stream') in ('1', 'true'):
+            return self.get_paginated(request, tasks, fields)
+
+        cache_key = response_key(request.user.pk, 'task_list', params) if cacheable else None
+        cached = get_cached_response(cache_key) if cacheable else None
+        if cached is not None:
+            logger.info("Returned cached task list for %s", request.user.username)
+            return Response(cached, status=status.HTTP_200_OK)
+
+        if 'cursor' in params or 'page_size' in params:
+            response = self.get_paginated(request, tasks, fields)
+            if cacheable and response.status_code == status.HTTP_200_OK:
+                set_cached_response(cache_key, response.data)
+            return response
+
+        # Evaluate once, the emptiness check and the count come from the fetched rows
+        serializer = TaskValuesSerializer(request.user.username, fields)
+        rows = list(serializer.values(tasks))
+        if not rows:
+            logger.warning("No tasks found for user: %s", request.user.username)            
+        data = serializer.to_representation(rows)
+        if cacheable:
+            set_cached_response(cache_key, data)
+        logger.info("Returned %s tasks for %s", len(rows), request.user.username)
+        return Response(data, status=status.HTTP_200_OK)
+
+    def get_paginated(self, request, tasks, fields=None):
+        params = request.query_params
+        try:
+            paginator = KeysetPaginator(
+                ordering=params.get('ordering', 'created_at'),
+                page_size=params.get('page_size', DEFAULT_PAGE_SIZE),
+            )
+        except (InvalidCursor, ValueError) as e:
+            logger.warning("Invalid pagination parameters for user: %s: %s", request.user.username, e)
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = TaskValuesSerializer(request.user.username, fields, ordering_field=paginator.field)
+        rows = serializer.values(tasks)
+
+        # Streaming mode writes the whole list as a JSON array from a server-side iterator
+        if params.get('stream') in ('1', 'true'):
+            logger.info("Streaming task list for %s", request.user.username)
+            # The stream is read after the view returns, bind it to the database chosen for this request
+            rows = paginator.order(rows)
+            return streaming_json_response(rows.using(rows.db), serializer.to_representation)
+
+        try:
+            rows, next_cursor = paginator.paginate(rows, params.get('cursor'), serializer.cursor_key(paginator.field))
+        except InvalidCursor as e:
+            logger.warning("Invalid cursor for user: %s: %s", request.user.username, e)
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info("Returned page of %s tasks for %s", len(rows), request.user.username)
+        return Response({"results": serializer.to_representation(rows), "next_cursor": next_cursor}, status=status.HTTP_200_OK)
+
+
+
+class TaskSearchView(ReplicaReadMixin, APIView):
+    '''
+    Tasks of the user matching ?q=, best matches first, in pages of
+    page_size (default 20) selected with ?page=. The task list filters and
+    fields= apply as well.
+    '''
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        text = params.get('q', '').strip()
+        logger.info("Received task search by user: %s", request.user.username)
+
+        try:
+            if not text:
+                raise ValueError("Missing search text q")
+            if len(text) > MAX_SEARCH_LENGTH:
+                raise ValueError(f"Search text is limited to {MAX_SEARCH_LENGTH} characters")
+            page = int(params.get('page', 1))
+            page_size = max(1, min(int(params.get('page_size', SEARCH_PAGE_SIZE)), MAX_SEARCH_PAGE_SIZE))
+            if page < 1:
+                raise ValueError(f"Invalid page: {page}")
+            fields = parse_task_fields(params.get('fields'))
+            tasks = filter_task_list(task_list_queryset(request.user, fields), params)
+        except ValueError as e:
+            logger.warning("Invalid search parameters for user: %s: %s", request.user.username, e)
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            cache_key = response_key(request.user.pk, 'task_search', params)
+            cached = get_cached_response(cache_key)
+            if cached is not None:
+                logger.info("Returned cached search results for %s", request.user.username)
+                return Response(cached, status=status.HTTP_200_OK)
+
+            # One extra row tells whether there is a next page
+            offset = (page - 1) * page_size
+            serializer = TaskValuesSerializer(request.user.username, fields)
+            rows = list(serializer.values(search_tasks(tasks, text))[offset:offset + page_size + 1])
+            data = {
+                "results": serializer.to_representation(rows[:page_size]),
+                "next_page": page + 1 if len(rows) > page_size else None,
+            }
+            set_cached_response(cache_key, data)
+            logger.info("Returned %s search results for %s", len(data["results"]), request.user.username)
+            return Response(data, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.error("Unexpected error searching tasks for user: %s: %s", request.user.username, e)
             return Response({"error": "an unexpected error occurred"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
@@ -44,23 +222,23 @@ class TaskCreateView(APIView):
         try:
             # Check if 'importance' is in request data
             if 'importance' not in request.data:
-                logger.warning(f"Missing 'importance' field for task creation by user: {request.user.username}")
+                logger.warning("Missing 'importance' field for task creation by user: %s", request.user.username)
                 return Response({"error": "Importance level is required"}, status=status.HTTP_400_BAD_REQUEST)
                
             serializer = TaskSerializer(data=request.data)
             if serializer.is_valid():
                 serializer.save(user=request.user)  # Associate the task with the logged-in user
-                logger.info(f"Task {request.data.get('title')} created by user: {request.user.username}")
+                logger.info("Task %s created by user: %s", request.data.get('title'), request.user.username)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             else:
-                logger.warning(f"Invalid data for task create by user: {request.user.username} - Errors {serializer.errors}")
+                logger.warning("Invalid data for task create by user: %s - Errors %s", request.user.username, serializer.errors)
                 raise ValidationError(serializer.errors)
 
         except ValidationError as e:
             return Response({"error": "Invalid data", "details": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         except Exception as e:
-            logger.error(f"An unexpected error occurred for user {request.user.username} creating a new task: {str(e)}")
+            logger.error("An unexpected error occurred for user %s creating a new task: %s", request.user.username, e)
             return Response({"error": "An error occurred"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     
@@ -71,25 +249,33 @@ class TaskUpdateView(APIView):
     def put(self, request, pk):
         try:
             
-            task = get_object_or_404(Task, pk=pk, user=request.user)
-            serializer = TaskSerializer(task, data=request.data, partial=True)
-            if serializer.is_valid():
-                serializer.save()
-                logger.info(f"Task {request.data.get('title')} updated by user: {request.user.username}")
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            else:
-                logger.warning(f"Invalid data for task update by user: {request.user.username}")
-                raise ValidationError(serializer.errors)
+            with transaction.atomic():
+                # Lock the row so an If-Match check cannot race with another update
+                task = get_object_or_404(Task.objects.select_for_update(), pk=pk, user=request.user)
+                if not if_match_passes(request, task):
+                    logger.warning("If-Match precondition failed for task %s by user: %s", pk, request.user.username)
+                    return Response({"error": "Task has been modified"}, status=status.HTTP_412_PRECONDITION_FAILED)
+
+                serializer = TaskSerializer(task, data=request.data, partial=True)
+                if serializer.is_valid():
+                    serializer.save()
+                    logger.info("Task %s updated by user: %s", request.data.get('title'), request.user.username)
+                    response = Response(serializer.data, status=status.HTTP_200_OK)
+                    response['ETag'] = task_etag(task)
+                    return response
+                else:
+                    logger.warning("Invalid data for task update by user: %s", request.user.username)
+                    raise ValidationError(serializer.errors)
         
         except ValidationError as e:
             return Response({"error": "Invalid data", "details": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         except Task.DoesNotExist:
-            logger.error(f"Task with id {pk} not found for user: {request.user.username}")
+            logger.error("Task with id %s not found for user: %s", pk, request.user.username)
             return Response({"error": "Task not found"}, status=status.HTTP_400_BAD_REQUEST)
         
         except Exception as e:
-            logger.error(f"An unexpected error occurred for user {request.user.username} updating the task {pk}: {str(e)}")
+            logger.error("An unexpected error occurred for user %s updating the task %s: %s", request.user.username, pk, e)
             return Response({"error": "An error occurred"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR) 
     
     
@@ -102,27 +288,162 @@ class TaskDeleteView(APIView):
         try:     
             task = get_object_or_404(Task, pk=pk, user=request.user)
             task.delete()
-            logger.info(f"Task '{request.data.get('title')}' deleted by: {request.user.username}")
+            logger.info("Task '%s' deleted by: %s", request.data.get('title'), request.user.username)
             return Response(status=status.HTTP_204_NO_CONTENT)
         
         except Task.DoesNotExist:
-            logger.error(f"Task with id {pk} not found for user: {request.user.username}")
+            logger.error("Task with id %s not found for user: %s", pk, request.user.username)
             return Response({"error": "Task not found"}, status=status.HTTP_400_BAD_REQUEST)
         
         except Exception as e:
-            logger.error(f"An unexpected error occurred for user {request.user.username} deleting the task {pk}: {str(e)}")
+            logger.error("An unexpected error occurred for user %s deleting the task %s: %s", request.user.username, pk, e)
             return Response({"error": "An error occurred"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)  # Return a 500 Internal Server Error if an error occurs. This will help to debug the issue.
     
     
 
-class CompletedTaskHistoryView(APIView):
+class TaskBulkView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    # Upper bound on the number of operations accepted in one request
+    MAX_OPERATIONS = 5000
+
+    def post(self, request):
+        if not isinstance(request.data, dict):
+            return Response({"error": "Expected a JSON object"}, status=status.HTTP_400_BAD_REQUEST)
+        create_data = request.data.get('create', [])
+        update_data = request.data.get('update', [])
+        delete_ids = request.data.get('delete', [])
+
+        if not all(isinstance(ops, list) for ops in (create_data, update_data, delete_ids)):
+            return Response({"error": "create, update and delete must be lists"}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info("Received bulk request by user: %s - create: %s, update: %s, delete: %s", request.user.username, len(create_data), len(update_data), len(delete_ids))
+
+        if len(create_data) + len(update_data) + len(delete_ids) > self.MAX_OPERATIONS:
+            return Response({"error": f"At most {self.MAX_OPERATIONS} operations per request"}, status=status.HTTP_400_BAD_REQUEST)
+
+        update_ids = [item.get('id') for item in update_data if isinstance(item, dict)]
+        # bool is an int subclass, True would delete the task with id 1
+        if not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in update_ids + delete_ids):
+            return Response({"error": "Task ids must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(set(update_ids)) != len(update_ids):
+            return Response({"error": "Each task can only be updated once per request"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # One query for every task touched by the update operations
+            instances = Task.objects.filter(user=request.user).in_bulk(update_ids) if update_ids else {}
+            for task in instances.values():
+                task.user = request.user
+
+            create_serializer = TaskSerializer(data=create_data, many=True)
+            update_serializer = TaskSerializer(instances, data=update_data, many=True, partial=True)
+            create_valid = create_serializer.is_valid()
+            update_valid = update_serializer.is_valid()
+            if not (create_valid and update_valid):
+                logger.warning("Invalid data for bulk request by user: %s", request.user.username)
+                return Response({
+                    "error": "Invalid data",
+                    "details": {"create": create_serializer.errors, "update": update_serializer.errors},
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            with transaction.atomic():
+                created = create_serializer.save(user=request.user) if create_data else []
+                updated = update_serializer.save() if update_data else []
+                deleted = 0
+                if delete_ids:
+                    _, deleted_per_model = Task.objects.filter(user=request.user, pk__in=delete_ids).delete()
+                    deleted = deleted_per_model.get(Task._meta.label, 0)
+
+            logger.info("Bulk request by user: %s created %s, updated %s, deleted %s tasks", request.user.username, len(created), len(updated), deleted)
+            return Response({
+                "created": TaskSerializer(created, many=True).data,
+                "updated": TaskSerializer(updated, many=True).data,
+                "deleted": deleted,
+            }, status=status.HTTP_200_OK)
+
+        except ValidationError as e:
+            return Response({"error": "Invalid data", "details": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        except Exception as e:
+            logger.error("An unexpected error occurred for user %s in bulk request: %s", request.user.username, e)
+            return Response({"error": "An error occurred"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+
+
+class TaskSyncView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        token = request.query_params.get('since')
+        logger.info("Received sync request by user: %s", request.user.username)
+
+        try:
+            changed, deleted, sync_token = changes_since(request.user, token)
+        except InvalidSyncToken as e:
+            logger.warning("Invalid sync token for user: %s", request.user.username)
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error("Unexpected error syncing tasks for user: %s: %s", request.user.username, e)
+            return Response({"error": "An error occurred while syncing tasks"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        logger.info("Sync for %s returned %s changed and %s deleted tasks", request.user.username, len(changed), len(deleted))
+        return Response({
+            "changed": TaskSerializer(changed, many=True).data,
+            "deleted": deleted,
+            "sync_token": sync_token,
+        }, status=status.HTTP_200_OK)
+
+
+
+class TaskStatsView(ReplicaReadMixin, APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        period = request.query_params.get('period', 'month')
+        start = request.query_params.get('start')
+        end = request.query_params.get('end')
+
+        logger.info("Received request for completion stats by user %s with period: %s, start: %s, end: %s", request.user.username, period, start, end)
+
+        try:
+            if period not in dict(CompletionRollup.PERIOD_CHOICES):
+                raise ValidationError(f"Invalid period parameter: {period}")
+            start = self.parse_date('start', start)
+            end = self.parse_date('end', end)
+        except ValidationError as ve:
+            logger.warning("Validation error in completion stats for user: %s: %s", request.user.username, ve)
+            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            stats = completion_stats(request.user, period=period, start=start, end=end)
+            logger.info("Returned %s stats buckets for user: %s", len(stats['buckets']), request.user.username)
+            return Response(stats, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.error("Unexpected error retrieving completion stats for user: %s: %s", request.user.username, e)
+            return Response({"error": "An error occurred while retrieving completion stats"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def parse_date(self, name, value):
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError(f"Invalid {name} parameter: {value}")
+        return parsed
+
+
+
+class CompletedTaskHistoryView(ReplicaReadMixin, APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
         month = request.query_params.get('month')
         year = request.query_params.get('year')
         
-        logger.info(f"Received request for completed tasks by user {request.user.username} with filters: Month - {month}, Year - {year}")
+        logger.info("Received request for completed tasks by user %s with filters: Month - %s, Year - %s", request.user.username, month, year)
 
         # Begin validation and parsing
         try:
@@ -137,27 +458,120 @@ class CompletedTaskHistoryView(APIView):
                 year = int(year)
 
         except ValidationError as ve:
-            logger.warning(f"Validation error in completed task history for user: {request.user.username}: {str(ve)}")
+            logger.warning("Validation error in completed task history for user: %s: %s", request.user.username, ve)
             return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Unexpected error validating parameters for user: {request.user.username}: {str(e)}")
+            logger.error("Unexpected error validating parameters for user: %s: %s", request.user.username, e)
             return Response({"error": "Invalid parameters"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            completed_tasks = CompletedTaskHistory.objects.filter(task__user=request.user)
+            cache_key = response_key(request.user.pk, 'completed_history', {'month': month or '', 'year': year or ''})
+            cached = get_cached_response(cache_key)
+            if cached is not None:
+                logger.info("Returned cached completed tasks for user: %s", request.user.username)
+                return Response(cached, status=status.HTTP_200_OK)
 
-            if year:
-                completed_tasks = completed_tasks.filter(completed_date__year=year)
-            if month:
-                completed_tasks = completed_tasks.filter(completed_date__month=month)
+            completed_tasks = completed_history_queryset(request.user, year=year, month=month)
 
-            if not completed_tasks.exists():
-                logger.warning(f"No completed tasks found for user: {request.user.username} with filters: Month - {month}, Year - {year}")
+            serializer = CompletedTaskHistoryValuesSerializer()
+            completed_tasks = list(serializer.values(completed_tasks))
+            if not completed_tasks:
+                logger.warning("No completed tasks found for user: %s with filters: Month - %s, Year - %s", request.user.username, month, year)
 
-            serializer = CompletedTaskHistorySerializer(completed_tasks, many=True)
-            logger.info(f"Returned {completed_tasks.count()} completed tasks for user: {request.user.username}")
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            data = serializer.to_representation(completed_tasks)
+            # Months past the hot window are read from the history archive
+            if reads_archive(year, month):
+                data = archived_history(request.user, year=year, month=month) + data
+            set_cached_response(cache_key, data)
+            logger.info("Returned %s completed tasks for user: %s", len(data), request.user.username)
+            return Response(data, status=status.HTTP_200_OK)
         
         except Exception as e:
-            logger.error(f"Unexpected error retrieving completed tasks for user: {request.user.username}: {str(e)}")
+            logger.error("Unexpected error retrieving completed tasks for user: %s: %s", request.user.username, e)
             return Response({"error": "An error occurred while retrieving completed tasks"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+
+class TaskExportView(APIView):
+    ''' All tasks of the user as NDJSON (default) or CSV with ?as=csv, streamed from a DB cursor '''
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        fmt = request.query_params.get('as', 'ndjson')
+        if fmt not in FORMATS:
+            return Response({"error": f"Invalid export format: {fmt}"}, status=status.HTTP_400_BAD_REQUEST)
+        logger.info("Exporting tasks as %s for user: %s", fmt, request.user.username)
+        return export_response(task_export_queryset(request.user), TASK_EXPORT_COLUMNS, fmt, 'tasks')
+
+
+
+class CompletedTaskHistoryExportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        fmt = request.query_params.get('as', 'ndjson')
+        if fmt not in FORMATS:
+            return Response({"error": f"Invalid export format: {fmt}"}, status=status.HTTP_400_BAD_REQUEST)
+        logger.info("Exporting completed task history as %s for user: %s", fmt, request.user.username)
+        return export_response(history_export_queryset(request.user), HISTORY_EXPORT_COLUMNS, fmt, 'completed_history')
+
+
+
+class TaskImportView(APIView):
+    '''
+    Import tasks from an NDJSON or CSV body, or from a multipart upload in
+    the "file" field. The format comes from ?as=, else from the content type
+    or the file name. Valid rows are created, invalid rows are reported.
+    '''
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        fmt = request.query_params.get('as')
+        if request.content_type.startswith('multipart/form-data'):
+            stream = request.FILES.get('file')
+            if stream is None:
+                return Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
+            fmt = fmt or ('csv' if stream.name.lower().endswith('.csv') else 'ndjson')
+        else:
+            stream = request.stream
+            fmt = fmt or ('csv' if request.content_type.startswith('text/csv') else 'ndjson')
+
+        if fmt not in FORMATS:
+            return Response({"error": f"Invalid import format: {fmt}"}, status=status.HTTP_400_BAD_REQUEST)
+        if stream is None:
+            return Response({"error": "Empty request body"}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info("Received %s task import by user: %s", fmt, request.user.username)
+        try:
+            result = import_tasks(request.user, stream, fmt)
+        except Exception as e:
+            logger.error("Unexpected error importing tasks for user: %s: %s", request.user.username, e)
+            return Response({"error": "An error occurred while importing tasks"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        logger.info("Imported %s tasks for %s, %s invalid rows", result.created, request.user.username, result.error_count)
+        return Response(result.as_dict(), status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    '''
+    Prometheus scrape endpoint for the request metrics of this process.
+
+    With TASKS_METRICS_TOKEN set the scraper sends it as a bearer token,
+    otherwise only INTERNAL_IPS and loopback addresses are allowed.
+    '''
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        if not self.allowed(request):
+            logger.warning("Metrics request refused from %s", request.META.get('REMOTE_ADDR'))
+            return Response({"error": "Not allowed"}, status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    def allowed(self, request):
+        token = getattr(settings, 'TASKS_METRICS_TOKEN', '')
+        if token:
+            header = request.headers.get('Authorization', '')
+            return hmac.compare_digest(header.encode(), f"Bearer {token}".encode())
+        remote_addr = request.META.get('REMOTE_ADDR')
+        return remote_addr in ('127.0.0.1', '::1') or remote_addr in getattr(settings, 'INTERNAL_IPS', ())
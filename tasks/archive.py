@@ -0,0 +1,151 @@
+# tasks/archive.py
+
+import gzip
+import json
+import logging
+import os
+from datetime import date
+from itertools import groupby
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import CompletedTaskHistory, HistoryArchive, HistoryArchiveSegment
+from .partitions import add_months, drop_partition
+from .queries import period_range
+from .serializers import datetime_formatter
+
+logger = logging.getLogger('tasks')
+
+# (archive key, values_list field) of each archived history row
+ARCHIVE_COLUMNS = (
+    ('id', 'id'), ('user_id', 'user_id'), ('task_id', 'task_id'), ('task_title', 'task__title'),
+    ('task_importance', 'task__importance'), ('completed_date', 'completed_date'),
+)
+ARCHIVE_CHUNK_SIZE = 2000
+
+
+def archive_dir():
+    return Path(getattr(settings, 'TASKS_HISTORY_ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+
+
+def first_hot_month(today=None):
+    ''' First day of the oldest month kept in the history table, older months are archived '''
+    today = today or timezone.localdate()
+    return add_months(today.replace(day=1), 1 - getattr(settings, 'TASKS_HISTORY_HOT_MONTHS', 12))
+
+
+def archivable_months(today=None):
+    ''' Months older than the hot window that still have rows in the history table, oldest first '''
+    cutoff = first_hot_month(today)
+    start, _ = period_range(cutoff.year, cutoff.month)
+    oldest = CompletedTaskHistory.objects.filter(completed_date__lt=start).aggregate(oldest=Min('completed_date'))['oldest']
+    if oldest is None:
+        return []
+    month = timezone.localdate(oldest).replace(day=1)
+    months = []
+    while month < cutoff:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def archive_month(month):
+    '''
+    Move the history rows of one month into a gzip NDJSON archive file.
+
+    Rows are written ordered by user, each user's rows as a separate gzip
+    member (the file stays a plain .ndjson.gz for any gzip reader) whose
+    position is stored in HistoryArchiveSegment. The file is complete on disk
+    before the rows are removed from the database, and the removal commits
+    together with the archive records: on PostgreSQL the month's partition is
+    dropped, elsewhere its rows are deleted. Returns None for an empty month.
+    '''
+    start, end = period_range(month.year, month.month)
+    rows = (
+        CompletedTaskHistory.objects.filter(completed_date__gte=start, completed_date__lt=end)
+        .order_by('user_id', 'id').values_list(*(field for _, field in ARCHIVE_COLUMNS))
+    )
+    names = [name for name, _ in ARCHIVE_COLUMNS]
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'history-{month:%Y-%m}.ndjson.gz'
+    partial = path.with_name(path.name + '.partial')
+
+    segments = []
+    row_count = 0
+    with transaction.atomic():
+        with open(partial, 'wb') as out:
+            for user_id, user_rows in groupby(rows.iterator(chunk_size=ARCHIVE_CHUNK_SIZE), key=lambda row: row[1]):
+                lines = []
+                for row in user_rows:
+                    record = dict(zip(names, row))
+                    record['completed_date'] = record['completed_date'].isoformat()
+                    lines.append(json.dumps(record, ensure_ascii=False))
+                member = gzip.compress(('\n'.join(lines) + '\n').encode())
+                # Rows without an owner cannot be served, they are kept in the file only
+                if user_id is not None:
+                    segments.append(HistoryArchiveSegment(user_id=user_id, offset=out.tell(), length=len(member), row_count=len(lines)))
+                out.write(member)
+                row_count += len(lines)
+            out.flush()
+            os.fsync(out.fileno())
+        if not row_count:
+            # Nothing to keep, an empty month only loses its partition
+            os.remove(partial)
+            drop_partition(month)
+            return None
+        os.replace(partial, path)
+
+        archive = HistoryArchive.objects.create(month=month, path=path.name, row_count=row_count)
+        for segment in segments:
+            segment.archive = archive
+        HistoryArchiveSegment.objects.bulk_create(segments, batch_size=ARCHIVE_CHUNK_SIZE)
+        if not drop_partition(month):
+            CompletedTaskHistory.objects.filter(completed_date__gte=start, completed_date__lt=end).delete()
+
+    logger.info("Archived %s history rows of %s to %s", row_count, f'{month:%Y-%m}', path)
+    return archive
+
+
+def reads_archive(year=None, month=None):
+    ''' Whether a history query may include archived months, False when it only covers hot months '''
+    if not year:
+        return True
+    return date(year, month or 1, 1) < first_hot_month()
+
+
+def archived_history(user, year=None, month=None):
+    '''
+    Archived history of a user for the same filters as completed_history_queryset,
+    oldest month first, in the representation of the history endpoint.
+    '''
+    segments = HistoryArchiveSegment.objects.filter(user=user).select_related('archive').order_by('archive__month')
+    if year:
+        segments = segments.filter(archive__month__gte=date(year, month or 1, 1), archive__month__lte=date(year, month or 12, 1))
+    elif month:
+        segments = segments.filter(archive__month__month=month)
+
+    format_datetime = datetime_formatter()
+    data = []
+    directory = archive_dir()
+    for segment in segments:
+        with open(directory / segment.archive.path, 'rb') as archive_file:
+            archive_file.seek(segment.offset)
+            member = gzip.decompress(archive_file.read(segment.length))
+        for line in member.splitlines():
+            record = json.loads(line)
+            completed_date = format_datetime(parse_datetime(record['completed_date']))
+            if record['task_id'] is None:
+                # Same shape as the hot rows of a deleted task
+                data.append({'id': record['id'], 'task_completed_date': completed_date})
+            else:
+                data.append({
+                    'id': record['id'], 'task_title': record['task_title'],
+                    'task_importance': record['task_importance'], 'task_completed_date': completed_date,
+                })
+    return data
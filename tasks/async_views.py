@@ -0,0 +1,251 @@
+# tasks/async_views.py
+
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, Throttled
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from .archive import reads_archive, archived_history
+from .authentication import AsyncJWTAuthentication
+from .conditional import task_etag, if_match_passes
+from .models import Task
+from .routers import replica_aliases, replica_reads
+from .pagination import KeysetPaginator, InvalidCursor, DEFAULT_PAGE_SIZE
+from .queries import (
+    task_list_queryset, completed_history_queryset, filter_due, filter_task_list, parse_task_fields, task_columns,
+    DUE_FILTERS,
+)
+from .serializers import TaskSerializer, CompletedTaskHistorySerializer
+from .throttling import get_buckets, cache_buckets
+
+logger = logging.getLogger('api')
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    # Same renderer as the DRF views so both variants return identical bodies
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+    '''
+    Base class of the async task API.
+
+    Requests are authenticated with the JWT access token like the DRF views,
+    with the user loaded through the async ORM, so a worker never blocks a
+    thread while waiting on the database for authentication. The read and
+    write budgets of the DRF views (DEFAULT_THROTTLE_CLASSES) apply as well.
+    '''
+
+    authentication = AsyncJWTAuthentication()
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    # Run the queries of GET requests on a read replica (see tasks.routers)
+    use_replica = False
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            auth = await self.authentication.aauthenticate(request)
+        except AuthenticationFailed as e:
+            # InvalidToken carries a dict with the per token class messages
+            data = e.detail if isinstance(e.detail, dict) else {"detail": e.detail}
+            return json_response(data, status=status.HTTP_401_UNAUTHORIZED)
+        if auth is None:
+            return json_response({"detail": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        request.user, request.auth = auth
+        if get_buckets() is cache_buckets:
+            # Shared buckets are cache round trips, kept off the event loop
+            wait = await sync_to_async(self.check_throttles)(request)
+        else:
+            wait = self.check_throttles(request)
+        if wait is not None:
+            logger.warning("Request throttled for user: %s", request.user.username)
+            # Same body and Retry-After as DRF's Throttled exception
+            throttled = Throttled(wait)
+            response = json_response({"detail": throttled.detail}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = '%d' % throttled.wait
+            return response
+
+        if self.use_replica and request.method in ('GET', 'HEAD') and replica_aliases():
+            with replica_reads(request.user.pk):
+                return await super().dispatch(request, *args, **kwargs)
+        return await super().dispatch(request, *args, **kwargs)
+
+    def check_throttles(self, request):
+        ''' Seconds until the request would be allowed, None when no throttle refuses it (see APIView.check_throttles) '''
+        throttles = [throttle_class() for throttle_class in self.throttle_classes]
+        waits = [throttle.wait() for throttle in throttles if not throttle.allow_request(request, self)]
+        if not waits:
+            return None
+        return max((wait for wait in waits if wait is not None), default=0)
+
+    def parse_body(self, request):
+        data = json.loads(request.body or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        return data
+
+
+class AsyncTaskListView(AsyncAPIView):
+
+    use_replica = True
+
+    async def get(self, request):
+        logger.info("Received async request for task list by user: %s", request.user.username)
+        try:
+            fields = parse_task_fields(request.GET.get('fields'))
+            tasks = filter_task_list(task_list_queryset(request.user, fields), request.GET)
+            if 'ordering' in request.GET:
+                tasks = KeysetPaginator(ordering=request.GET['ordering']).order(tasks)
+        except ValueError as e:
+            logger.warning("Invalid task list parameters for user: %s: %s", request.user.username, e)
+            return json_response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        due = request.GET.get('due')
+        if due is not None:
+            if due not in DUE_FILTERS:
+                logger.warning("Invalid due filter for user: %s: %s", request.user.username, due)
+                return json_response({"error": f"due must be one of: {', '.join(DUE_FILTERS)}"}, status=status.HTTP_400_BAD_REQUEST)
+            tasks = filter_due(tasks, due)
+
+        try:
+            if 'cursor' in request.GET or 'page_size' in request.GET:
+                paginator = KeysetPaginator(
+                    ordering=request.GET.get('ordering', 'created_at'),
+                    page_size=request.GET.get('page_size', DEFAULT_PAGE_SIZE),
+                )
+                if fields is not None:
+                    # The cursor reads the ordering column, it must not be deferred
+                    tasks = tasks.only(*task_columns([*fields, paginator.field]))
+                rows, next_cursor = await paginator.apaginate(tasks, request.GET.get('cursor'))
+                logger.info("Returned page of %s tasks for %s", len(rows), request.user.username)
+                return json_response({"results": TaskSerializer(rows, many=True, fields=fields).data, "next_cursor": next_cursor})
+        except (InvalidCursor, ValueError) as e:
+            logger.warning("Invalid pagination parameters for user: %s: %s", request.user.username, e)
+            return json_response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        tasks = [task async for task in tasks]
+        if not tasks:
+            logger.warning("No tasks found for user: %s", request.user.username)
+        logger.info("Returned %s tasks for %s", len(tasks), request.user.username)
+        return json_response(TaskSerializer(tasks, many=True, fields=fields).data)
+
+
+class AsyncTaskCreateView(AsyncAPIView):
+
+    async def post(self, request):
+        try:
+            data = self.parse_body(request)
+        except ValueError:
+            return json_response({"error": "Invalid JSON body"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if 'importance' not in data:
+            logger.warning("Missing 'importance' field for task creation by user: %s", request.user.username)
+            return json_response({"error": "Importance level is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = TaskSerializer(data=data)
+        if not serializer.is_valid():
+            logger.warning("Invalid data for task create by user: %s - Errors %s", request.user.username, serializer.errors)
+            return json_response({"error": "Invalid data", "details": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        task = await Task.objects.acreate(user=request.user, **serializer.validated_data)
+        logger.info("Task %s created by user: %s", task.title, request.user.username)
+        return json_response(TaskSerializer(task).data, status=status.HTTP_201_CREATED)
+
+
+class AsyncTaskUpdateView(AsyncAPIView):
+
+    async def put(self, request, pk):
+        try:
+            data = self.parse_body(request)
+        except ValueError:
+            return json_response({"error": "Invalid JSON body"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            task = await Task.objects.select_related('user').aget(pk=pk, user=request.user)
+        except Task.DoesNotExist:
+            logger.error("Task with id %s not found for user: %s", pk, request.user.username)
+            return json_response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = TaskSerializer(task, data=data, partial=True)
+        if not serializer.is_valid():
+            logger.warning("Invalid data for task update by user: %s", request.user.username)
+            return json_response({"error": "Invalid data", "details": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        for attr, value in serializer.validated_data.items():
+            setattr(task, attr, value)
+        if request.headers.get('If-Match'):
+            saved = await sync_to_async(self.save_if_match)(request, task)
+            if not saved:
+                logger.warning("If-Match precondition failed for task %s by user: %s", pk, request.user.username)
+                return json_response({"error": "Task has been modified"}, status=status.HTTP_412_PRECONDITION_FAILED)
+        else:
+            await task.asave()
+        logger.info("Task %s updated by user: %s", task.title, request.user.username)
+        response = json_response(TaskSerializer(task).data)
+        response['ETag'] = task_etag(task)
+        return response
+
+    def save_if_match(self, request, task):
+        # Same check as TaskUpdateView, on the locked row so it cannot race with another update
+        with transaction.atomic():
+            current = Task.objects.select_for_update().only('updated_at').filter(pk=task.pk).first()
+            # Deleted meanwhile: no longer the task the ETag was taken from
+            if current is None or not if_match_passes(request, current):
+                return False
+            task.save()
+        return True
+
+
+class AsyncTaskDeleteView(AsyncAPIView):
+
+    async def delete(self, request, pk):
+        try:
+            task = await Task.objects.aget(pk=pk, user=request.user)
+        except Task.DoesNotExist:
+            logger.error("Task with id %s not found for user: %s", pk, request.user.username)
+            return json_response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        await task.adelete()
+        logger.info("Task '%s' deleted by: %s", task.title, request.user.username)
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncCompletedTaskHistoryView(AsyncAPIView):
+
+    use_replica = True
+
+    async def get(self, request):
+        month = request.GET.get('month')
+        year = request.GET.get('year')
+        logger.info("Received async request for completed tasks by user %s with filters: Month - %s, Year - %s", request.user.username, month, year)
+
+        try:
+            if month:
+                month = int(month)
+                if not (1 <= month <= 12):
+                    raise ValueError(f"Invalid month parameter: {month}")
+            if year:
+                if not year.isdigit() or len(year) != 4:
+                    raise ValueError(f"Invalid year parameter: {year}")
+                year = int(year)
+        except ValueError as e:
+            logger.warning("Validation error in completed task history for user: %s: %s", request.user.username, e)
+            return json_response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        history = completed_history_queryset(request.user, year=year, month=month)
+        completed_tasks = [row async for row in history]
+        data = CompletedTaskHistorySerializer(completed_tasks, many=True).data
+        if reads_archive(year, month):
+            data = await sync_to_async(archived_history)(request.user, year=year, month=month) + data
+        logger.info("Returned %s completed tasks for user: %s", len(data), request.user.username)
+        return json_response(data)
@@ -0,0 +1,155 @@
+# tasks/authentication.py
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class UserCache:
+    '''
+    Small in-process LRU cache of authenticated users, keyed by access token.
+
+    Entries expire after `ttl` seconds. Saving or deleting a user evicts its
+    entries in this process (see tasks.signals), other worker processes pick
+    the change up once their entries expire, so `ttl` is the longest a
+    deactivated user or a changed password can still be accepted elsewhere.
+    '''
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()  # (user_id, jti) -> (user, expires_at)
+        self.keys_by_user = {}  # user_id -> {(user_id, jti), ...}
+        self.lock = threading.Lock()
+
+    # Tokens carry the user id as a string, signals pass the primary key
+    def get(self, user_id, jti):
+        key = (str(user_id), jti)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+        return user
+
+    def set(self, user_id, jti, user):
+        if self.ttl <= 0 or jti is None:
+            return
+        key = (str(user_id), jti)
+        with self.lock:
+            self.entries[key] = (user, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            self.keys_by_user.setdefault(key[0], set()).add(key)
+            while len(self.entries) > self.max_size:
+                self._remove(next(iter(self.entries)))
+
+    def evict(self, user_id):
+        with self.lock:
+            for key in self.keys_by_user.pop(str(user_id), ()):
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.keys_by_user.clear()
+
+    def _remove(self, key):
+        self.entries.pop(key, None)
+        keys = self.keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_user[key[0]]
+
+
+user_cache = UserCache(
+    ttl=getattr(settings, 'TASKS_AUTH_USER_CACHE_TTL', 60),
+    max_size=getattr(settings, 'TASKS_AUTH_USER_CACHE_SIZE', 10000),
+)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    '''
+    JWTAuthentication that keeps the users of recently seen access tokens in
+    memory, so the task endpoints do not load the user row on every request.
+
+    The active and password revocation checks still run on every request,
+    against the cached user.
+    '''
+
+    def get_user(self, validated_token):
+        user_id, jti = self.get_token_ids(validated_token)
+        user = user_cache.get(user_id, jti)
+        if user is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            self.check_user(user, validated_token)
+            user_cache.set(user_id, jti, user)
+        else:
+            self.check_user(user, validated_token)
+        # Requests may modify request.user, never hand out the shared instance
+        return copy.copy(user)
+
+    def get_token_ids(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+        return user_id, validated_token.get(api_settings.JTI_CLAIM)
+
+    def check_user(self, user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    '''
+    JWTAuthentication for the async views.
+
+    Token parsing and validation are pure CPU work and reused as they are,
+    only the user lookup goes through the async ORM.
+    '''
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id, jti = self.get_token_ids(validated_token)
+        user = user_cache.get(user_id, jti)
+        if user is None:
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            self.check_user(user, validated_token)
+            user_cache.set(user_id, jti, user)
+        else:
+            self.check_user(user, validated_token)
+        return copy.copy(user)
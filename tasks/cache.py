@@ -0,0 +1,96 @@
+# tasks/cache.py
+
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# Cache alias holding the per-user response cache, point it at a shared backend
+# (e.g. Redis or Memcached) when running several workers
+CACHE_ALIAS = getattr(settings, 'TASKS_CACHE_ALIAS', 'default')
+CACHE_TIMEOUT = getattr(settings, 'TASKS_CACHE_TIMEOUT', 300)
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f'tasks:version:{user_id}'
+
+
+def user_version(user_id):
+    ''' Current cache version of a user, every data change moves it forward '''
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a counter evicted from the cache never reuses an old version
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(user_id):
+    cache = get_cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.add(_version_key(user_id), time.time_ns(), timeout=None)
+
+
+def _pin_key(user_id):
+    return f'tasks:pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    ''' Keep the reads of a user who just wrote on the primary database for TASKS_REPLICA_PIN_SECONDS '''
+    pin_seconds = getattr(settings, 'TASKS_REPLICA_PIN_SECONDS', 5)
+    if getattr(settings, 'TASKS_READ_REPLICAS', None) and pin_seconds > 0:
+        get_cache().set(_pin_key(user_id), 1, timeout=pin_seconds)
+
+
+def is_pinned_to_primary(user_id):
+    return get_cache().get(_pin_key(user_id)) is not None
+
+
+def invalidate_user(user_id):
+    ''' Invalidate every cached response of a user '''
+    if user_id is None:
+        return
+    _bump(user_id)
+    # Every write path ends here, the writer reads its own writes from the primary
+    pin_to_primary(user_id)
+    if transaction.get_connection().in_atomic_block:
+        # A reader may cache the pre-commit state in the meantime, bump again once committed
+        transaction.on_commit(lambda: _bump(user_id))
+
+
+def invalidate_users(user_ids):
+    for user_id in set(user_ids):
+        invalidate_user(user_id)
+
+
+def response_key(user_id, endpoint, params=None):
+    '''
+    Cache key of one response, bound to the user's current version.
+
+    Compute it once before building the response: if the data changes meanwhile
+    the response is stored under the old version and never served.
+    '''
+    params = params or {}
+    items = params.lists() if hasattr(params, 'lists') else params.items()
+    query = urlencode(sorted(items), doseq=True)
+    digest = hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+    return f'tasks:response:{endpoint}:{user_id}:{user_version(user_id)}:{digest}'
+
+
+def get_cached_response(key):
+    return get_cache().get(key)
+
+
+def set_cached_response(key, data):
+    get_cache().set(key, data, timeout=CACHE_TIMEOUT)
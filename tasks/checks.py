@@ -0,0 +1,35 @@
+# tasks/checks.py
+
+from django.conf import settings
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, register
+
+from .cache import CACHE_ALIAS, get_cache
+
+# Backends whose entries are only seen by the process that wrote them
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+@register()
+def check_replica_pin_cache(app_configs, **kwargs):
+    '''
+    Read-your-writes on the replicas relies on the pin set by the write
+    (tasks.cache.pin_to_primary) being visible to the process serving the
+    next read. With a per-process cache, the next request of the user lands
+    on another worker and reads a replica that may lag behind the write.
+    '''
+    if not getattr(settings, 'TASKS_READ_REPLICAS', None) or getattr(settings, 'TASKS_REPLICA_PIN_SECONDS', 5) <= 0:
+        return []
+    backend = type(get_cache())
+    if not issubclass(backend, PROCESS_LOCAL_CACHES):
+        return []
+    return [Error(
+        f"Read replicas are configured but the '{CACHE_ALIAS}' cache ({backend.__name__}) is not shared "
+        "between processes, writers would not be pinned to the primary on the other workers.",
+        hint=(
+            "Set CACHE_BACKEND and CACHE_LOCATION to a shared cache such as Redis or Memcached. "
+            "A deployment with a single process can silence this check."
+        ),
+        id='tasks.E001',
+    )]
@@ -0,0 +1,72 @@
+# tasks/conditional.py
+
+import hashlib
+
+from django.db.models import Count, Max, Subquery
+from django.utils.http import http_date, parse_etags, quote_etag
+
+from .cache import response_key, get_cached_response, set_cached_response
+from .models import Task, TaskTombstone
+
+
+def task_list_validators(user):
+    '''
+    Latest updated_at and number of tasks of a user, with the time of the
+    user's latest task deletion, from one aggregate query.
+
+    The result is cached under the user's cache version, so it is recomputed
+    exactly when one of the user's tasks changes.
+    '''
+    cache_key = response_key(user.pk, 'task_list_validators')
+    validators = get_cached_response(cache_key)
+    if validators is None:
+        latest_deletion = TaskTombstone.objects.filter(user=user).order_by('-deleted_at').values('deleted_at')[:1]
+        validators = Task.objects.filter(user=user).aggregate(
+            last_modified=Max('updated_at'), count=Count('id'), deleted_at=Max(Subquery(latest_deletion)),
+        )
+        set_cached_response(cache_key, validators)
+    return validators
+
+
+def task_list_etag(request, validators):
+    ''' Strong ETag of one task list representation (the query string selects the representation) '''
+    last_modified = validators['last_modified']
+    raw = ':'.join([
+        str(validators['count']),
+        last_modified.isoformat() if last_modified else '',
+        request.user.username,
+        request.get_full_path(),
+    ])
+    return quote_etag(hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest())
+
+
+def last_modified_timestamp(validators):
+    '''
+    Last-Modified of the task list. Deleting a task other than the latest
+    updated one leaves Max(updated_at) as it was, so the latest tombstone
+    counts as a modification too.
+    '''
+    last_modified = max(filter(None, (validators['last_modified'], validators.get('deleted_at'))), default=None)
+    return int(last_modified.timestamp()) if last_modified else None
+
+
+def set_validator_headers(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def task_etag(task):
+    ''' Strong ETag of a single task, changes whenever the task is saved '''
+    raw = f"{task.pk}:{task.updated_at.isoformat()}"
+    return quote_etag(hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest())
+
+
+def if_match_passes(request, task):
+    ''' False when an If-Match header is sent and does not match the current task '''
+    header = request.headers.get('If-Match')
+    if not header:
+        return True
+    etags = parse_etags(header)
+    return '*' in etags or task_etag(task) in etags
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks.archive import archivable_months, archive_dir, archive_month, first_hot_month
+from tasks.models import HistoryArchive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move completed task history older than TASKS_HISTORY_HOT_MONTHS months into gzip NDJSON files "
+        "of TASKS_HISTORY_ARCHIVE_DIR, one file per month"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="List the months that would be archived")
+
+    def handle(self, *args, **options):
+        months = archivable_months()
+        archived = set(HistoryArchive.objects.filter(month__in=months).values_list('month', flat=True))
+        self.stdout.write(
+            f"Keeping {getattr(settings, 'TASKS_HISTORY_HOT_MONTHS', 12)} months from {first_hot_month():%Y-%m}, "
+            f"archiving to {archive_dir()}"
+        )
+
+        for month in months:
+            if month in archived:
+                # Rows written into a month after it was archived, they stay in the table
+                self.stderr.write(f"{month:%Y-%m} is already archived, its remaining rows are left in place")
+                continue
+            if options['dry_run']:
+                self.stdout.write(f"Would archive {month:%Y-%m}")
+                continue
+            archive = archive_month(month)
+            if archive is not None:
+                self.stdout.write(f"Archived {archive.row_count} rows of {month:%Y-%m} to {archive.path}")
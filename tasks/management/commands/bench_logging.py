@@ -0,0 +1,74 @@
+import logging
+import logging.handlers
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.logging_handlers import AsyncRotatingFileHandler
+
+FORMAT = '{asctime} [{levelname}] {name} - {message}'
+
+
+class Command(BaseCommand):
+    help = "Measure the per-request logging overhead of the synchronous and the queued file handlers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--queue-size', type=int, default=10000)
+        parser.add_argument('--overflow', choices=('drop', 'block'), default='drop')
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        with tempfile.TemporaryDirectory() as log_dir:
+            sync_handler = logging.handlers.RotatingFileHandler(
+                os.path.join(log_dir, 'sync.log'), maxBytes=5 * 1024 * 1024, backupCount=5,
+            )
+            self.report("sync handler, f-strings", self.run(sync_handler, self.eager_request, requests))
+
+            async_handler = AsyncRotatingFileHandler(
+                os.path.join(log_dir, 'async.log'), maxBytes=5 * 1024 * 1024, backupCount=5,
+                queue_size=options['queue_size'], overflow=options['overflow'],
+            )
+            self.report("queued handler, %-style", self.run(async_handler, self.lazy_request, requests))
+
+    def report(self, label, timings):
+        timings.sort()
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        self.stdout.write(
+            f"{label:26} mean {statistics.mean(timings):8.2f} us  p99 {p99:8.2f} us  max {timings[-1]:10.2f} us"
+        )
+
+    def run(self, handler, request, requests):
+        handler.setFormatter(logging.Formatter(FORMAT, style='{', datefmt='%Y-%m-%d %H:%M:%S'))
+        logger = logging.getLogger(f'bench.{id(handler)}')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+
+        timings = []
+        for i in range(requests):
+            start = time.perf_counter_ns()
+            request(logger, i)
+            timings.append((time.perf_counter_ns() - start) / 1000)
+
+        # Draining the queue happens off the request path, it is not part of the measurement
+        logger.removeHandler(handler)
+        handler.close()
+        return timings
+
+    # The log calls of one TaskListView request, before and after the change
+
+    def eager_request(self, logger, i):
+        username = f'user{i % 100}'
+        logger.info(f"Received request for task list by user: {username}")
+        logger.debug(f"Set end date to {time.time()} for Low priority task.")
+        logger.info(f"Returned {i % 500} tasks for {username}")
+
+    def lazy_request(self, logger, i):
+        username = f'user{i % 100}'
+        logger.info("Received request for task list by user: %s", username)
+        logger.debug("Set end date to %s for Low priority task.", time.time())
+        logger.info("Returned %s tasks for %s", i % 500, username)
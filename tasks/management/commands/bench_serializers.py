@@ -0,0 +1,71 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from tasks.models import Task
+from tasks.queries import task_list_queryset
+from tasks.serializers import TaskSerializer, TaskValuesSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare TaskSerializer with the values() fast path on synthetic task lists"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per size, the best one is reported")
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+
+        # Everything runs in a transaction that is rolled back, the database is left untouched
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(username=f'bench-{time.time_ns()}')
+            created = 0
+            for size in sorted(options['sizes']):
+                self.seed(user, size - created)
+                created = size
+                tasks = task_list_queryset(user)
+
+                def model_path():
+                    return renderer.render(TaskSerializer(list(tasks), many=True).data)
+
+                def values_path():
+                    serializer = TaskValuesSerializer(user.username)
+                    return renderer.render(serializer.to_representation(list(serializer.values(tasks))))
+
+                model_time, model_body = self.best_of(model_path, options['repeat'])
+                values_time, values_body = self.best_of(values_path, options['repeat'])
+                if model_body != values_body:
+                    raise CommandError(f"Fast path output differs from TaskSerializer at {size} rows")
+
+                self.stdout.write(
+                    f"{size:>8} rows  serializer {model_time * 1000:9.1f} ms  "
+                    f"values {values_time * 1000:9.1f} ms  speedup {model_time / values_time:5.1f}x"
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, user, count):
+        importance = [choice for choice, _ in Task.IMPORTANCE_CHOICES]
+        now = timezone.now()
+        tasks = [
+            Task(
+                user=user, title=f'bench task {i}', description='benchmark' if i % 2 else None,
+                importance=importance[i % len(importance)], completed=bool(i % 3 == 0),
+                end_date=now + timezone.timedelta(days=i % 30),
+            )
+            for i in range(count)
+        ]
+        Task.objects.bulk_create(tasks, batch_size=2000)
+
+    def best_of(self, func, repeat):
+        best, body = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, body
@@ -0,0 +1,56 @@
+import statistics
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.throttling import UserRateThrottle
+
+from tasks.throttling import ReadRateThrottle, local_buckets
+
+RATE = '1000000/s'  # Never reached, every check takes the allowed path
+
+
+class DRFUserRateThrottle(UserRateThrottle):
+    THROTTLE_RATES = {'user': RATE}
+
+
+class Command(BaseCommand):
+    help = "Measure the per-request cost of the token bucket throttle against DRF's cache based UserRateThrottle"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100000)
+        parser.add_argument('--users', type=int, default=1000, help="Distinct users the requests cycle through")
+
+    def handle(self, *args, **options):
+        requests = [
+            SimpleNamespace(method='GET', user=SimpleNamespace(is_authenticated=True, pk=i % options['users']), META={}, headers={})
+            for i in range(options['requests'])
+        ]
+        local_cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-throttle'}}
+        rest_framework = {'DEFAULT_THROTTLE_RATES': {'tasks_read': RATE}}
+
+        with override_settings(CACHES=local_cache, REST_FRAMEWORK=rest_framework):
+            local_buckets.clear()
+            with override_settings(TASKS_THROTTLE_BACKEND='local'):
+                self.report("token bucket, local", self.run(ReadRateThrottle, requests))
+            with override_settings(TASKS_THROTTLE_BACKEND='cache'):
+                self.report("token bucket, locmem cache", self.run(ReadRateThrottle, requests))
+            self.report("DRF UserRateThrottle", self.run(DRFUserRateThrottle, requests))
+            local_buckets.clear()
+
+    def run(self, throttle_class, requests):
+        # DRF builds new throttle instances for every request
+        timings = []
+        for request in requests:
+            start = time.perf_counter_ns()
+            throttle_class().allow_request(request, None)
+            timings.append((time.perf_counter_ns() - start) / 1000)
+        return timings
+
+    def report(self, label, timings):
+        timings.sort()
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        self.stdout.write(
+            f"{label:28} mean {statistics.mean(timings):8.2f} us  p99 {p99:8.2f} us  max {timings[-1]:10.2f} us"
+        )
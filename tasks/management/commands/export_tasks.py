@@ -0,0 +1,39 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.transfer import (
+    FORMATS, TASK_EXPORT_COLUMNS, HISTORY_EXPORT_COLUMNS, task_export_queryset, history_export_queryset, export_rows,
+)
+
+
+class Command(BaseCommand):
+    help = "Stream the tasks or completed task history of a user as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--history', action='store_true', help="Export the completed task history instead of the tasks")
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--output', help="File to write, standard output by default")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User not found: {options['username']}")
+
+        if options['history']:
+            rows = export_rows(history_export_queryset(user), HISTORY_EXPORT_COLUMNS, options['format'])
+        else:
+            rows = export_rows(task_export_queryset(user), TASK_EXPORT_COLUMNS, options['format'])
+
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in rows:
+                out.write(chunk)
+        finally:
+            if options['output']:
+                out.close()
+            else:
+                out.flush()
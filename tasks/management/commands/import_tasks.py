@@ -0,0 +1,40 @@
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.transfer import FORMATS, IMPORT_BATCH_SIZE, import_tasks
+
+
+class Command(BaseCommand):
+    help = "Import tasks for a user from an NDJSON or CSV file, invalid rows are reported and skipped"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('file', help="File to read, - for standard input")
+        parser.add_argument('--format', choices=FORMATS, help="Default: from the file extension, else ndjson")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User not found: {options['username']}")
+
+        path = options['file']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+
+        start = time.perf_counter()
+        if path == '-':
+            result = import_tasks(user, sys.stdin.buffer, fmt, options['batch_size'])
+        else:
+            with open(path, 'rb') as stream:
+                result = import_tasks(user, stream, fmt, options['batch_size'])
+        elapsed = time.perf_counter() - start
+
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(
+            f"Imported {result.created} tasks in {elapsed:.1f} s, {result.error_count} invalid rows"
+        )
@@ -0,0 +1,376 @@
+import json
+import platform
+import random
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, teardown_databases, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from tasks.models import Task, CompletedTaskHistory
+from tasks.sync import make_sync_token
+
+PASSWORD = 'loadtest-password'
+SEED_BATCH_SIZE = 5000
+IMPORT_ROWS = 100  # Tasks per import request
+
+
+class Scenario:
+    '''
+    One endpoint call. build(ctx, rng) runs untimed before the request and
+    returns (path, data), e.g. to create the task a delete request removes.
+    Request bodies are JSON encoded, other content types are sent as built.
+    '''
+
+    def __init__(self, name, method, build, expected=(200,), authenticated=True, content_type='application/json'):
+        self.name = name
+        self.method = method
+        self.build = build
+        self.expected = expected
+        self.authenticated = authenticated
+        self.content_type = content_type
+
+
+def seeded_task(ctx, rng):
+    return rng.choice(ctx.task_ids[ctx.user.pk])
+
+
+def fresh_task(ctx, rng):
+    return Task.objects.create(user=ctx.user, title='loadtest delete', importance='Low').pk
+
+
+def new_task(rng):
+    return {
+        'title': f'loadtest {rng.randrange(10 ** 6)}',
+        'importance': rng.choice([choice for choice, _ in Task.IMPORTANCE_CHOICES]),
+    }
+
+
+def import_body(rng, fmt, rows=IMPORT_ROWS):
+    tasks = [new_task(rng) for _ in range(rows)]
+    if fmt == 'csv':
+        return 'title,importance\n' + ''.join(f"{task['title']},{task['importance']}\n" for task in tasks)
+    return ''.join(json.dumps(task) + '\n' for task in tasks)
+
+
+SCENARIOS = [
+    Scenario('task_list', 'get', lambda ctx, rng: (reverse('task_list_api'), None)),
+    Scenario('task_list_page', 'get', lambda ctx, rng: (reverse('task_list_api'), {'page_size': 100})),
+    Scenario('task_list_dashboard', 'get', lambda ctx, rng: (reverse('task_list_api'), {
+        'completed': 'false', 'importance': 'Urgent', 'ordering': 'end_date', 'fields': 'id,title,end_date',
+    })),
+    Scenario('task_list_stream', 'get', lambda ctx, rng: (reverse('task_list_api'), {'stream': 1})),
+    Scenario('task_create', 'post', lambda ctx, rng: (reverse('task_create_api'), new_task(rng)), expected=(201,)),
+    Scenario('task_update', 'put', lambda ctx, rng: (
+        reverse('task_update_api', args=[seeded_task(ctx, rng)]), {'title': f'updated {rng.randrange(10 ** 6)}'},
+    )),
+    Scenario('task_delete', 'delete', lambda ctx, rng: (
+        reverse('task_delete_api', args=[fresh_task(ctx, rng)]), None,
+    ), expected=(204,)),
+    Scenario('task_bulk', 'post', lambda ctx, rng: (reverse('task_bulk_api'), {
+        'create': [new_task(rng) for _ in range(10)],
+        'update': [{'id': pk, 'title': 'bulk updated'} for pk in rng.sample(ctx.task_ids[ctx.user.pk], 10)],
+    })),
+    Scenario('task_sync', 'get', lambda ctx, rng: (
+        reverse('task_sync_api'), {'since': make_sync_token(ctx.user, timezone.now() - timezone.timedelta(hours=1))},
+    )),
+    Scenario('task_search', 'get', lambda ctx, rng: (
+        reverse('task_search_api'), {'q': f'seeded task {rng.randrange(1000)}'},
+    )),
+    Scenario('task_export', 'get', lambda ctx, rng: (reverse('task_export_api'), {'as': 'ndjson'})),
+    Scenario('task_export_csv', 'get', lambda ctx, rng: (reverse('task_export_api'), {'as': 'csv'})),
+    Scenario('completed_history_export', 'get', lambda ctx, rng: (
+        reverse('completed_task_history_export_api'), {'as': 'ndjson'},
+    )),
+    Scenario('task_import', 'post', lambda ctx, rng: (
+        reverse('task_import_api'), import_body(rng, 'ndjson'),
+    ), content_type='application/x-ndjson'),
+    Scenario('task_import_csv', 'post', lambda ctx, rng: (
+        reverse('task_import_api'), import_body(rng, 'csv'),
+    ), content_type='text/csv'),
+    Scenario('task_stats', 'get', lambda ctx, rng: (reverse('task_stats_api'), {'period': 'month'})),
+    Scenario('completed_history', 'get', lambda ctx, rng: (reverse('completed_task_history_api'), None)),
+    Scenario('metrics', 'get', lambda ctx, rng: (reverse('metrics_api'), None), authenticated=False),
+    Scenario('async_task_list', 'get', lambda ctx, rng: (reverse('async_task_list_api'), None)),
+    Scenario('async_task_create', 'post', lambda ctx, rng: (reverse('async_task_create_api'), new_task(rng)), expected=(201,)),
+    Scenario('async_task_update', 'put', lambda ctx, rng: (
+        reverse('async_task_update_api', args=[seeded_task(ctx, rng)]), {'title': f'updated {rng.randrange(10 ** 6)}'},
+    )),
+    Scenario('async_task_delete', 'delete', lambda ctx, rng: (
+        reverse('async_task_delete_api', args=[fresh_task(ctx, rng)]), None,
+    ), expected=(204,)),
+    Scenario('async_completed_history', 'get', lambda ctx, rng: (reverse('async_completed_task_history_api'), None)),
+    Scenario('token_obtain', 'post', lambda ctx, rng: (
+        reverse('token_obtain_pair'), {'username': ctx.user.username, 'password': PASSWORD},
+    ), authenticated=False),
+    Scenario('token_refresh', 'post', lambda ctx, rng: (
+        reverse('token_refresh'), {'refresh': ctx.refresh},
+    ), authenticated=False),
+]
+
+
+class WorkerContext:
+    ''' Per worker state: the user it acts as and the ids of that user's seeded tasks '''
+
+    def __init__(self, user, refresh, task_ids):
+        self.user = user
+        self.refresh = refresh
+        self.task_ids = task_ids
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic users, tasks and completion history in a throwaway test database and "
+        "drive every task API endpoint through the full URL and middleware stack with concurrent "
+        "clients. Reports latency percentiles, throughput and queries per request as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--tasks', type=int, default=10000, help="Total number of seeded tasks (1k to 1M)")
+        parser.add_argument('--completed', type=float, default=0.5, help="Fraction of seeded tasks completed, each with a history row")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint")
+        parser.add_argument('--concurrency', type=int, default=4, help="Concurrent client threads")
+        parser.add_argument('--warmup', type=int, default=5, help="Untimed requests per endpoint and client")
+        parser.add_argument('--endpoints', nargs='+', choices=[s.name for s in SCENARIOS], help="Only run these endpoints")
+        parser.add_argument('--seed', type=int, default=1, help="Random seed, keep it fixed to compare runs")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+        parser.add_argument('--baseline', help="JSON report of an earlier run to compare against")
+        parser.add_argument('--threshold', type=float, default=0.2, help="Allowed relative p95/throughput regression")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['tasks'] < options['users'] * 10:
+            raise CommandError("Need at least one user and 10 tasks per user")
+
+        scenarios = [s for s in SCENARIOS if not options['endpoints'] or s.name in options['endpoints']]
+
+        # A throwaway test database and a private cache, the real data and cache are never touched.
+        # DEBUG is off so connection.queries does not grow during the run. The clients would
+        # only measure the throttle budgets, the throttle rates are lifted.
+        rest_framework = dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={})
+        setup_test_environment(debug=False)
+        sqlite_dir = tempfile.TemporaryDirectory()
+        self.use_sqlite_files(sqlite_dir.name)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'loadtest'}},
+                REST_FRAMEWORK=rest_framework,
+            ):
+                seed_time = time.perf_counter()
+                contexts = self.seed(options)
+                seed_time = time.perf_counter() - seed_time
+                self.stderr.write(f"Seeded {options['tasks']} tasks for {options['users']} users in {seed_time:.1f} s")
+
+                results = {}
+                for scenario in scenarios:
+                    results[scenario.name] = self.run_scenario(scenario, contexts, options)
+                    self.stderr.write(
+                        f"{scenario.name:24} p50 {results[scenario.name]['p50_ms']:8.2f} ms  "
+                        f"p95 {results[scenario.name]['p95_ms']:8.2f} ms  {results[scenario.name]['rps']:8.1f} req/s"
+                    )
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            sqlite_dir.cleanup()
+
+        report = {
+            'meta': {
+                'database': connection.vendor,
+                # Connection reuse changes latency a lot, runs are only comparable with the same settings
+                'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+                'pool': bool(connection.settings_dict['OPTIONS'].get('pool')),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'users': options['users'],
+                'tasks': options['tasks'],
+                'completed': options['completed'],
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'seed': options['seed'],
+                'seed_seconds': round(seed_time, 2),
+            },
+            'endpoints': results,
+        }
+        body = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(body + '\n')
+        else:
+            self.stdout.write(body)
+
+        if options['baseline']:
+            self.compare(report, options['baseline'], options['threshold'])
+
+    def use_sqlite_files(self, directory):
+        # The default in-memory SQLite test database uses shared-cache table locks that fail
+        # immediately under concurrent writers, a file database waits for the lock instead
+        for alias in connections:
+            settings_dict = connections[alias].settings_dict
+            if connections[alias].vendor == 'sqlite' and not settings_dict['TEST'].get('NAME'):
+                settings_dict['TEST']['NAME'] = f'{directory}/{alias}.sqlite3'
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        User = get_user_model()
+        password = make_password(PASSWORD)  # Hashed once, every user shares it
+        User.objects.bulk_create([
+            User(username=f'loadtest-{i}', password=password) for i in range(options['users'])
+        ])
+        users = list(User.objects.filter(username__startswith='loadtest-').order_by('pk'))
+
+        importance = [choice for choice, _ in Task.IMPORTANCE_CHOICES]
+        now = timezone.now()
+        task_ids = {user.pk: [] for user in users}
+        for offset in range(0, options['tasks'], SEED_BATCH_SIZE):
+            batch = [
+                Task(
+                    user=users[i % len(users)], title=f'seeded task {i}',
+                    description='loadtest' if i % 2 else None,
+                    importance=rng.choice(importance), completed=rng.random() < options['completed'],
+                    end_date=now + timezone.timedelta(days=rng.randint(-30, 30)),
+                )
+                for i in range(offset, min(offset + SEED_BATCH_SIZE, options['tasks']))
+            ]
+            batch = Task.objects.bulk_create(batch)
+            CompletedTaskHistory.record_completions([task for task in batch if task.completed])
+            for task in batch:
+                task_ids[task.user_id].append(task.pk)
+
+        return [
+            WorkerContext(user, str(RefreshToken.for_user(user)), task_ids)
+            for user in users
+        ]
+
+    def run_scenario(self, scenario, contexts, options):
+        concurrency = options['concurrency']
+        per_worker = [options['requests'] // concurrency + (i < options['requests'] % concurrency) for i in range(concurrency)]
+        latencies, queries, errors, failures = [], [], [], []
+        lock = threading.Lock()
+        barrier = threading.Barrier(concurrency + 1)
+
+        def worker(index):
+            ctx = contexts[index % len(contexts)]
+            rng = random.Random(f"{options['seed']}:{scenario.name}:{index}")
+            # Server errors are returned as 500 responses and counted instead of raised
+            client = Client(raise_request_exception=False)
+            headers = {}
+            if scenario.authenticated:
+                headers['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken(ctx.refresh).access_token}'
+            try:
+                for _ in range(options['warmup']):
+                    self.request(client, scenario, ctx, rng, headers)
+                barrier.wait()
+                results = [self.request(client, scenario, ctx, rng, headers) for _ in range(per_worker[index])]
+                with lock:
+                    for latency, count, status_code in results:
+                        latencies.append(latency)
+                        queries.append(count)
+                        if status_code not in scenario.expected:
+                            errors.append(status_code)
+            except Exception as e:  # Errors outside of a request, e.g. while building it
+                failures.append(e)
+                # Release the other workers and the main thread instead of leaving them at the barrier
+                barrier.abort()
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            pass
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        failures = [e for e in failures if not isinstance(e, threading.BrokenBarrierError)]
+        if failures:
+            raise CommandError(f"{scenario.name} failed: {failures[0]!r}")
+
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'errors': len(errors),
+            'error_statuses': sorted(set(errors)),
+            'p50_ms': round(self.percentile(latencies, 50) * 1000, 3),
+            'p95_ms': round(self.percentile(latencies, 95) * 1000, 3),
+            'p99_ms': round(self.percentile(latencies, 99) * 1000, 3),
+            'mean_ms': round(statistics.mean(latencies) * 1000, 3) if latencies else 0,
+            'rps': round(len(latencies) / elapsed, 1) if elapsed else 0,
+            'queries_per_request': round(statistics.mean(queries), 2) if queries else 0,
+        }
+
+    def request(self, client, scenario, ctx, rng, headers):
+        path, data = scenario.build(ctx, rng)
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            start = time.perf_counter()
+            if scenario.method == 'get':
+                response = client.get(path, data, **headers)
+            else:
+                if scenario.content_type == 'application/json':
+                    data = json.dumps(data or {})
+                response = getattr(client, scenario.method)(path, data, content_type=scenario.content_type, **headers)
+            if response.streaming:
+                # The body is produced while it is consumed, that is part of the request
+                b''.join(response.streaming_content)
+            latency = time.perf_counter() - start
+        return latency, counter.count, response.status_code
+
+    def percentile(self, values, percent):
+        if not values:
+            return 0
+        index = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+        return values[index]
+
+    def compare(self, report, baseline_path, threshold):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+        regressions = []
+        for name, current in report['endpoints'].items():
+            previous = baseline['endpoints'].get(name)
+            if previous is None:
+                continue
+            if previous['p95_ms'] and current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+                regressions.append(f"{name}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+            if previous['rps'] and current['rps'] < previous['rps'] * (1 - threshold):
+                regressions.append(f"{name}: throughput {previous['rps']} -> {current['rps']} req/s")
+            if current['queries_per_request'] > previous['queries_per_request']:
+                regressions.append(
+                    f"{name}: queries per request {previous['queries_per_request']} -> {current['queries_per_request']}"
+                )
+            if current['errors'] > previous['errors']:
+                regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n" + '\n'.join(regressions))
+        self.stderr.write(f"No regressions against {baseline_path}")
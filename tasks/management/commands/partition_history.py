@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tasks.partitions import MONTHS_AHEAD, convert_history_table, ensure_partitions, history_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = (
+        "Range partition the completed task history by month on PostgreSQL (converting the table the first time) "
+        "and create the partitions of the coming months. Run it monthly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD, help="Monthly partitions to create in advance")
+        parser.add_argument(
+            '--convert', action='store_true',
+            help="Convert an unpartitioned table. Copies every row under an exclusive lock, run it in a maintenance window",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(f"{connection.vendor} does not support table partitioning, the history table stays unpartitioned")
+            return
+
+        if not is_partitioned():
+            if not options['convert']:
+                raise CommandError("The history table is not partitioned yet, run again with --convert")
+            convert_history_table(options['months_ahead'])
+            self.stdout.write("Converted the history table to a partitioned table")
+        else:
+            created = ensure_partitions(options['months_ahead'])
+            self.stdout.write(f"Created {len(created)} partitions")
+
+        for name in history_partitions():
+            self.stdout.write(f"  {name}")
@@ -0,0 +1,45 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tasks.reminders import scan_reminders, REMINDER_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Record due soon and overdue reminder events of open tasks, once or on a fixed interval"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=getattr(settings, 'TASKS_REMINDER_INTERVAL', 60),
+            help="Seconds between two scans",
+        )
+        parser.add_argument('--once', action='store_true', help="Run a single scan and exit")
+        parser.add_argument('--batch-size', type=int, default=REMINDER_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['once']:
+            self.scan(options['batch_size'])
+            return
+
+        # SIGTERM/SIGINT finish the running scan, then stop the worker
+        stop = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+
+        self.stdout.write(f"Scanning for reminders every {options['interval']} s")
+        while not stop.is_set():
+            close_old_connections()
+            try:
+                self.scan(options['batch_size'])
+            except Exception as e:
+                # A failed scan is retried on the next interval, the window overlaps
+                self.stderr.write(f"Reminder scan failed: {e}")
+            stop.wait(options['interval'])
+        self.stdout.write("Reminder worker stopped")
+
+    def scan(self, batch_size):
+        scanned = scan_reminders(batch_size=batch_size)
+        self.stdout.write(", ".join(f"{kind}: {count}" for kind, count in scanned.items()))
@@ -0,0 +1,72 @@
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tasks.snapshots import expire_snapshots, rebuild_queued, SNAPSHOT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Rebuild the queued task list snapshots of hot users on a process pool, once or continuously"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=getattr(settings, 'TASKS_SNAPSHOT_INTERVAL', 1),
+            help="Seconds between two polls of an empty queue",
+        )
+        parser.add_argument(
+            '--processes', type=int, default=getattr(settings, 'TASKS_SNAPSHOT_PROCESSES', 2),
+            help="Rebuild processes, 0 rebuilds in this process",
+        )
+        parser.add_argument('--once', action='store_true', help="Rebuild the queued snapshots once and exit")
+        parser.add_argument('--batch-size', type=int, default=SNAPSHOT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        executor = None
+        if options['processes'] > 0:
+            # spawn: the pool processes must not inherit this process's connections or logging threads.
+            # They load Django before unpickling any job, the jobs import the models.
+            executor = ProcessPoolExecutor(
+                max_workers=options['processes'], mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        try:
+            if options['once']:
+                self.rebuild(executor, options['batch_size'])
+                return
+            self.run(executor, options)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def run(self, executor, options):
+        # SIGTERM/SIGINT finish the running batch, then stop the worker
+        stop = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+
+        self.stdout.write(f"Rebuilding task list snapshots on {options['processes']} processes")
+        while not stop.is_set():
+            close_old_connections()
+            try:
+                rebuilt = self.rebuild(executor, options['batch_size'])
+            except Exception as e:
+                # The snapshots stay queued and are retried on the next poll
+                self.stderr.write(f"Snapshot rebuild failed: {e}")
+                rebuilt = 0
+            # A full batch means more are probably queued
+            if rebuilt < options['batch_size']:
+                stop.wait(options['interval'])
+        self.stdout.write("Snapshot worker stopped")
+
+    def rebuild(self, executor, batch_size):
+        expire_snapshots()
+        rebuilt = rebuild_queued(executor, batch_size)
+        if rebuilt:
+            self.stdout.write(f"Rebuilt {rebuilt} snapshots")
+        return rebuilt
@@ -0,0 +1,151 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILES = ('full', 'api')
+
+# Run in a fresh interpreter under -X importtime: everything a worker imports
+# before serving its first request (settings, apps, URLconf, middleware)
+PROBE = '''
+import json, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.apps import apps
+from django.core.handlers.wsgi import WSGIHandler
+from django.urls import get_resolver
+get_resolver().url_patterns
+WSGIHandler()
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'apps': [app.name for app in apps.get_app_configs()]}))
+'''
+
+IMPORTTIME_PREFIX = 'import time:'
+NOISE_MS = 5  # Smaller per-app differences are not reported as regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Start fresh interpreters with -X importtime for each deployment profile and report "
+        "the startup time and the import time per installed app (other modules per top level "
+        "package) as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=PROFILES, help="Profiles to measure (default: the current one)")
+        parser.add_argument('--runs', type=int, default=3, help="Interpreters started per profile, the median is reported")
+        parser.add_argument('--top', type=int, default=15, help="Apps and packages listed in the summary")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+        parser.add_argument('--baseline', help="JSON report of an earlier run to compare against")
+        parser.add_argument('--threshold', type=float, default=0.2, help="Allowed relative startup time regression")
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError("Need at least one run")
+
+        profiles = {}
+        for profile in options['profiles'] or [settings.DEPLOYMENT_PROFILE]:
+            profiles[profile] = self.measure(profile, options['runs'])
+            self.summary(profile, profiles[profile], options['top'])
+
+        report = {
+            'meta': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'settings': settings.SETTINGS_MODULE,
+                'runs': options['runs'],
+            },
+            'profiles': profiles,
+        }
+        body = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(body + '\n')
+        else:
+            self.stdout.write(body)
+
+        if options['baseline']:
+            self.compare(report, options['baseline'], options['threshold'])
+
+    def measure(self, profile, runs):
+        results = [self.run_probe(profile) for _ in range(runs)]
+        groups = sorted({group for result in results for group in result['import_ms']})
+        import_ms = {group: round(statistics.median(r['import_ms'].get(group, 0) for r in results), 1) for group in groups}
+        return {
+            'startup_ms': round(statistics.median(r['seconds'] for r in results) * 1000, 1),
+            'import_ms_total': round(statistics.median(sum(r['import_ms'].values()) for r in results), 1),
+            'apps': results[0]['apps'],
+            'import_ms': dict(sorted(import_ms.items(), key=lambda item: item[1], reverse=True)),
+        }
+
+    def run_probe(self, profile):
+        env = dict(os.environ, DEPLOYMENT_PROFILE=profile, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        lines = process.stderr.splitlines()
+        if process.returncode:
+            errors = [line for line in lines if not line.startswith(IMPORTTIME_PREFIX)]
+            raise CommandError(f"The {profile} profile failed to start:\n" + '\n'.join(errors[-20:]))
+        result = json.loads(process.stdout.splitlines()[-1])
+        result['import_ms'] = self.aggregate(lines, result['apps'])
+        return result
+
+    def aggregate(self, lines, apps):
+        '''
+        Self import time in ms per installed app, modules outside the apps
+        grouped by top level package. Self times add up to the total import
+        time, cumulative ones would count nested imports several times.
+        '''
+        # Longest names first so django.contrib.auth is not counted as django
+        apps = sorted(apps, key=len, reverse=True)
+        totals = {}
+        for line in lines:
+            if not line.startswith(IMPORTTIME_PREFIX):
+                continue
+            self_us, _, module = line[len(IMPORTTIME_PREFIX):].split('|', 2)
+            if not self_us.strip().isdigit():
+                continue  # Header line
+            module = module.strip()
+            group = next((app for app in apps if module == app or module.startswith(app + '.')), module.split('.')[0])
+            totals[group] = totals.get(group, 0) + int(self_us) / 1000
+        return totals
+
+    def summary(self, profile, result, top):
+        self.stderr.write(
+            f"{profile}: startup {result['startup_ms']} ms, imports {result['import_ms_total']} ms, "
+            f"{len(result['apps'])} apps"
+        )
+        for group, ms in list(result['import_ms'].items())[:top]:
+            self.stderr.write(f"  {group:40} {ms:8.1f} ms")
+
+    def compare(self, report, baseline_path, threshold):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+        regressions = []
+        for profile, current in report['profiles'].items():
+            previous = baseline['profiles'].get(profile)
+            if previous is None:
+                continue
+            for key in ('startup_ms', 'import_ms_total'):
+                if previous[key] and current[key] > previous[key] * (1 + threshold):
+                    regressions.append(f"{profile}: {key} {previous[key]} -> {current[key]}")
+            for app in sorted(set(current['apps']) - set(previous['apps'])):
+                regressions.append(f"{profile}: new app {app}")
+            for group, ms in current['import_ms'].items():
+                before = previous['import_ms'].get(group, 0)
+                if ms - before > NOISE_MS and ms > before * (1 + threshold):
+                    regressions.append(f"{profile}: {group} imports {before} -> {ms} ms")
+
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n" + '\n'.join(regressions))
+        self.stderr.write(f"No regressions against {baseline_path}")
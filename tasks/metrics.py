@@ -0,0 +1,174 @@
+# tasks/metrics.py
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Histogram bucket upper bounds, +Inf is implicit
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Slow requests keep at most this many queries for the slow log
+MAX_RECORDED_QUERIES = 100
+
+
+class Histogram:
+    ''' Cumulative histogram in the Prometheus layout, safe to observe from several threads '''
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.sum
+
+
+class Registry:
+    '''
+    In-process metrics of the API, one histogram per (metric, view).
+
+    Every worker process keeps its own registry, Prometheus scrapes each
+    worker and aggregates across them.
+    '''
+
+    METRICS = {
+        'tasks_http_request_duration_seconds': ("Wall time of a request", SECONDS_BUCKETS),
+        'tasks_http_db_queries': ("Database queries per request", QUERY_BUCKETS),
+        'tasks_http_db_duration_seconds': ("Time spent in database queries per request", SECONDS_BUCKETS),
+        'tasks_http_serialization_duration_seconds': ("Time spent serializing and rendering per request", SECONDS_BUCKETS),
+        'tasks_http_response_size_bytes': ("Size of non-streaming response bodies", SIZE_BUCKETS),
+    }
+
+    def __init__(self):
+        self.histograms = {}
+        self.requests = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, metric, view):
+        key = (metric, view)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram(self.METRICS[metric][1]))
+        return histogram
+
+    def observe(self, metric, view, value):
+        self.histogram(metric, view).observe(value)
+
+    def count_request(self, view, method, status_code):
+        key = (view, method, status_code)
+        with self.lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.requests = {}
+
+    def render(self):
+        ''' Prometheus text exposition format (version 0.0.4) '''
+        lines = [
+            "# HELP tasks_http_requests_total Requests handled, by view, method and status",
+            "# TYPE tasks_http_requests_total counter",
+        ]
+        with self.lock:
+            requests = sorted(self.requests.items())
+            histograms = sorted(self.histograms.items())
+        for (view, method, status_code), count in requests:
+            lines.append(f'tasks_http_requests_total{{view="{view}",method="{method}",status="{status_code}"}} {count}')
+
+        for metric, (help_text, buckets) in self.METRICS.items():
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for (name, view), histogram in histograms:
+                if name != metric:
+                    continue
+                counts, total = histogram.snapshot()
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{view="{view}"}} {total}')
+                lines.append(f'{metric}_count{{view="{view}"}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    ''' Measurements collected while one request is handled '''
+
+    __slots__ = ('queries', 'db_time', 'serialization_time', 'recorded_queries')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.recorded_queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # Called by record_query, times every query of the request
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += duration
+            if len(self.recorded_queries) < MAX_RECORDED_QUERIES:
+                self.recorded_queries.append((sql, duration))
+
+
+current_request = ContextVar('current_request_metrics', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    '''
+    Execute wrapper kept on every database connection (see install_query_hook).
+
+    Counts the query for the request of the current context: under ASGI the
+    queries run on sync_to_async threads with their own connections, and the
+    context variable follows the request there.
+    '''
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_hook(connection, **kwargs):
+    ''' connection_created receiver, connections are per thread '''
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def serialization_timer():
+    '''
+    Adds the time spent in the block to the serialization time of the current
+    request. Does nothing outside of an instrumented request, also usable as
+    a decorator.
+    '''
+    metrics = current_request.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.serialization_time += time.perf_counter() - start
@@ -0,0 +1,88 @@
+# tasks/middleware.py
+
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import registry, RequestMetrics, current_request
+
+slow_logger = logging.getLogger('api.slow')
+
+
+class RequestMetricsMiddleware:
+    '''
+    Records per view (URL name) the wall time, number and time of the
+    database queries (counted by tasks.metrics.record_query on every
+    connection), serialization time and response size of every request
+    into the in-process histograms of tasks.metrics.
+
+    Requests slower than TASKS_SLOW_REQUEST_MS or running more than
+    TASKS_SLOW_REQUEST_QUERIES queries are written to the api.slow logger
+    together with their queries.
+    '''
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, metrics, duration):
+        match = request.resolver_match
+        view = match.url_name if match is not None and match.url_name else 'unmatched'
+
+        registry.count_request(view, request.method, response.status_code)
+        registry.observe('tasks_http_request_duration_seconds', view, duration)
+        registry.observe('tasks_http_db_queries', view, metrics.queries)
+        registry.observe('tasks_http_db_duration_seconds', view, metrics.db_time)
+        registry.observe('tasks_http_serialization_duration_seconds', view, metrics.serialization_time)
+        # Streaming bodies are produced after the middleware returns, their size is unknown here
+        if not response.streaming:
+            registry.observe('tasks_http_response_size_bytes', view, len(response.content))
+
+        slow_ms = getattr(settings, 'TASKS_SLOW_REQUEST_MS', 500)
+        slow_queries = getattr(settings, 'TASKS_SLOW_REQUEST_QUERIES', 50)
+        if duration * 1000 >= slow_ms or metrics.queries >= slow_queries:
+            self.log_slow_request(request, response, view, metrics, duration)
+
+    def log_slow_request(self, request, response, view, metrics, duration):
+        queries = '\n'.join(
+            f"  {sql_duration * 1000:.1f} ms  {sql}" for sql, sql_duration in metrics.recorded_queries
+        )
+        if metrics.queries > len(metrics.recorded_queries):
+            queries += f"\n  ... {metrics.queries - len(metrics.recorded_queries)} more queries"
+        slow_logger.warning(
+            "Slow request %s %s (%s) status %s: %.1f ms total, %s queries in %.1f ms, serialization %.1f ms\n%s",
+            request.method, request.path, view, response.status_code, duration * 1000,
+            metrics.queries, metrics.db_time * 1000, metrics.serialization_time * 1000, queries,
+        )
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_task_user(apps, schema_editor):
+    # Backfill the denormalized owner of existing history rows from their task
+    CompletedTaskHistory = apps.get_model('tasks', 'CompletedTaskHistory')
+    Task = apps.get_model('tasks', 'Task')
+    CompletedTaskHistory.objects.filter(task__isnull=False).update(
+        user=models.Subquery(Task.objects.filter(pk=models.OuterRef('task_id')).values('user_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_alter_task_importance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='completedtaskhistory',
+            name='user',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copy_task_user, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='completedtaskhistory',
+            index=models.Index(fields=['user', 'completed_date'], name='history_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'completed', 'end_date'], name='task_user_done_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'created_at'], name='task_user_created_idx'),
+        ),
+    ]
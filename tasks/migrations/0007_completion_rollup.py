@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:11
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import Counter
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def build_rollups(apps, schema_editor):
+    # Count the existing history into the rollup buckets in one pass
+    CompletedTaskHistory = apps.get_model('tasks', 'CompletedTaskHistory')
+    CompletionRollup = apps.get_model('tasks', 'CompletionRollup')
+
+    buckets = {}
+    history = CompletedTaskHistory.objects.filter(task__isnull=False, user__isnull=False).values_list(
+        'user_id', 'completed_date', 'task__importance', 'task__end_date'
+    )
+    for user_id, completed_date, importance, end_date in history.iterator(chunk_size=2000):
+        on_time = end_date is None or completed_date <= end_date
+        day = timezone.localdate(completed_date)
+        starts = {
+            'day': day,
+            'week': day - timezone.timedelta(days=day.weekday()),
+            'month': day.replace(day=1),
+        }
+        for period, start in starts.items():
+            bucket = buckets.setdefault((user_id, period, start, importance), Counter())
+            bucket['completed_count'] += 1
+            bucket['on_time_count' if on_time else 'overdue_count'] += 1
+
+    CompletionRollup.objects.bulk_create(
+        [
+            CompletionRollup(user_id=user_id, period=period, period_start=start, importance=importance, **counts)
+            for (user_id, period, start, importance), counts in buckets.items()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_task_tombstone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompletionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('importance', models.CharField(max_length=10)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('on_time_count', models.PositiveIntegerField(default=0)),
+                ('overdue_count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'period', 'period_start', 'importance'), name='rollup_unique_bucket')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
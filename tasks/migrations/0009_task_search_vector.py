@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:57
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+SEARCH_CONFIG = getattr(settings, 'TASKS_SEARCH_CONFIG', 'english')
+
+
+def create_search_index(apps, schema_editor):
+    # tsvector and GIN only exist on PostgreSQL, other databases search with LIKE
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Task = apps.get_model('tasks', 'Task')
+    Task.objects.update(
+        search_vector=SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+    )
+    # btree_gin lets one GIN index cover the per-user scope and the text match
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gin')
+    schema_editor.execute('CREATE INDEX task_search_idx ON tasks_task USING gin (user_id, search_vector)')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS task_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_task_reminder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_history_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskListSnapshot',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('body', models.BinaryField(null=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('last_modified', models.DateTimeField(null=True)),
+                ('built_at', models.DateTimeField(null=True)),
+                ('requested_at', models.DateTimeField(null=True)),
+                ('promoted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('requested_at__isnull', False)), fields=['requested_at'], name='snapshot_queue_idx')],
+            },
+        ),
+    ]
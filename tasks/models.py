@@ -1,15 +1,88 @@
-from django.db import models
+from collections import Counter
+
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connections, models, router, transaction, IntegrityError
 from django.forms import ValidationError
 from django.utils import timezone
 from django.conf import settings
+from .cache import invalidate_user, invalidate_users
 import logging
 
 logger = logging.getLogger('tasks')
 
+# Text search configuration of the stored task search vectors
+SEARCH_CONFIG = getattr(settings, 'TASKS_SEARCH_CONFIG', 'english')
+SEARCH_FIELDS = frozenset(('title', 'description'))
+
+
+def search_vector(title, description):
+    ''' Weighted tsvector of a title and a description, given as column names or expressions '''
+    return (
+        SearchVector(title, weight='A', config=SEARCH_CONFIG)
+        + SearchVector(description, weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def supports_search(using):
+    ''' Stored search vectors are only maintained on PostgreSQL '''
+    return connections[using].vendor == 'postgresql'
+
 
 # Create your models here.
 
 
+class TaskQuerySet(models.QuerySet):
+
+    def owner_ids(self):
+        return set(self.order_by().values_list('user_id', flat=True).distinct())
+
+    def update_search_vector(self):
+        ''' Recompute the stored search vectors from the current titles and descriptions '''
+        if not supports_search(self.db):
+            return 0
+        return super().update(search_vector=search_vector('title', 'description'))
+
+    def update(self, **kwargs):
+        # Keep auto_now semantics so mass updates still move updated_at (ETags, sync)
+        kwargs.setdefault('updated_at', timezone.now())
+
+        # Search vectors are computed from the new text by a second statement, on the rows matched before the change
+        if SEARCH_FIELDS & kwargs.keys() and supports_search(self.db):
+            with transaction.atomic(using=self.db):
+                pks = list(self.order_by().values_list('pk', flat=True))
+                rows = self._update_tasks(kwargs)
+                Task.objects.using(self.db).filter(pk__in=pks).update_search_vector()
+            return rows
+
+        return self._update_tasks(kwargs)
+
+    def _update_tasks(self, kwargs):
+        # Mass completion records history for every task that was not completed before
+        if kwargs.get('completed') is not True:
+            user_ids = self.owner_ids()
+            rows = super().update(**kwargs)
+            invalidate_users(user_ids)
+            return rows
+
+        with transaction.atomic(using=self.db):
+            user_ids = self.owner_ids()
+            newly_completed = list(
+                self.filter(completed=False).select_for_update().only('user', 'importance', 'end_date')
+            )
+            rows = super().update(**kwargs)
+            CompletedTaskHistory.record_completions(newly_completed)
+            invalidate_users(user_ids)
+        return rows
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            deleted = list(self.order_by().values_list('pk', 'user_id'))
+            result = super().delete()
+            TaskTombstone.record_deletions(deleted)
+        invalidate_users(user_id for _, user_id in deleted)
+        return result
+
+
 class Task(models.Model):
     
     # set choices for the importance of a task
@@ -28,39 +101,105 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)  # Timestamp for when the task was created
     updated_at = models.DateTimeField(auto_now=True)  # Timestamp for when the task was last updated
     end_date = models.DateTimeField(blank=True, null=True)
+    # Full-text search document of title and description, maintained on PostgreSQL only
+    # (GIN index on (user, search_vector) created by migration 0009)
+    search_vector = SearchVectorField(null=True, editable=False)
     
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Per-user open/overdue lookups ordered by deadline
+            models.Index(fields=['user', 'completed', 'end_date'], name='task_user_done_end_idx'),
+            # Per-user listing in creation order (task list and its cursor pages)
+            models.Index(fields=['user', 'created_at'], name='task_user_created_idx'),
+            # Per-user listing by deadline (ordering=end_date and its cursor pages)
+            models.Index(fields=['user', 'end_date', 'id'], name='task_user_end_idx'),
+            # Delta sync: tasks changed since a point in time
+            models.Index(fields=['user', 'updated_at'], name='task_user_updated_idx'),
+            # Reminder scans across all users: open tasks by deadline
+            models.Index(fields=['end_date', 'id'], condition=models.Q(completed=False), name='task_open_end_idx'),
+        ]
     
 
-    def save(self, *args, **kwargs):
-        # Check if task completion status has changed from the last saved state
-        creating_history = self.pk is None or (not self.completed and self.completed)
+    # Days until the automatic end date for each importance level
+    IMPORTANCE_DAYS = {
+        'Low': 30,
+        'Medium': 14,
+        'Urgent': 3
+    }
 
-        # Define the automatic end dates based on importance
-        importance_days = {
-            'Low': 30,
-            'Medium': 14,
-            'Urgent': 3
-        }
-        
+    def set_default_end_date(self):
         # Automatically set end date based on importance if not specified
         if not self.end_date:
-            days_to_add = importance_days.get(self.importance)
+            days_to_add = self.IMPORTANCE_DAYS.get(self.importance)
             if days_to_add:
                 self.end_date = timezone.now() + timezone.timedelta(days=days_to_add)
-                logger.debug(f"Set end date to {self.end_date} for {self.importance} priority task.")
+                logger.debug("Set end date to %s for %s priority task.", self.end_date, self.importance)
             else:
                 raise ValidationError("Invalid importance level")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the completion state as loaded, so save() can detect the transition
+        if 'completed' in field_names:
+            instance._loaded_completed = instance.completed
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or 'completed' in fields:
+            self._loaded_completed = self.completed
+
+    def was_completed(self):
+        ''' Completion state of the task as last loaded from or saved to the database '''
+        if self._state.adding:
+            return False
+        if not hasattr(self, '_loaded_completed'):
+            # Only reached when 'completed' was deferred or the pk was set by hand
+            self._loaded_completed = Task.objects.filter(pk=self.pk, completed=True).exists()
+        return self._loaded_completed
+
+    def save(self, *args, **kwargs):
+        # Check if task completion status has changed from the last saved state
+        update_fields = kwargs.get('update_fields')
+        tracks_completion = update_fields is None or 'completed' in update_fields
+        creating_history = tracks_completion and self.completed and not self.was_completed()
+
+        self.set_default_end_date()
+
+        # Compute the search vector from the saved values in the same INSERT/UPDATE
+        using = kwargs.get('using') or router.db_for_write(Task, instance=self)
+        updates_search = supports_search(using) and (update_fields is None or bool(SEARCH_FIELDS & set(update_fields)))
+        if updates_search:
+            self.search_vector = search_vector(models.Value(self.title), models.Value(self.description or ''))
+            if update_fields is not None:
+                kwargs['update_fields'] = [*update_fields, 'search_vector']
         
-        logger.info(f"Saving task '{self.title}' with end date set to: {self.end_date}")
+        logger.info("Saving task '%s' with end date set to: %s", self.title, self.end_date)
         
         # Save the task model instance
         super().save(*args, **kwargs)
+        if updates_search:
+            # Drop the expression, the stored vector is loaded again only if read
+            del self.__dict__['search_vector']
         
         # Create history record if task has been marked as complete
-        if creating_history and self.completed:
-            CompletedTaskHistory.objects.get_or_create(task=self, completed_date=timezone.now())
-            logger.info(f"Completed task history created for '{self.title}'.")
+        if creating_history:
+            CompletedTaskHistory.record_completions([self])
+        if tracks_completion:
+            self._loaded_completed = self.completed
+
+        invalidate_user(self.user_id)
 
+    def delete(self, *args, **kwargs):
+        task_id = self.pk
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            TaskTombstone.record_deletions([(task_id, self.user_id)])
+        invalidate_user(self.user_id)
+        return result
 
     
     
@@ -70,9 +209,237 @@ class Task(models.Model):
 
 class CompletedTaskHistory(models.Model):
     task = models.ForeignKey(Task, on_delete=models.SET_NULL, null=True)  # Link to the Task model
+    # Owner of the task, copied from the task so per-user history queries avoid the join.
+    # Indexed through history_user_date_idx below.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, db_index=False)
     completed_date = models.DateTimeField(default=timezone.now) # Timestamp for when the task was
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'completed_date'], name='history_user_date_idx'),
+        ]
     
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        # Keep the denormalized owner in sync with the task
+        if self.user_id is None and self.task_id is not None:
+            self.user_id = self.task.user_id
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding and self.task_id is not None:
+                CompletionRollup.add([(self.user_id, self.completed_date, self.task.importance, self.task.end_date)])
+        invalidate_user(self.user_id)
     
     def __str__(self):
         return f"completed: {self.task.title} on {self.completed_date}"
-    
\ No newline at end of file
+    
+
+    @classmethod
+    def record_completions(cls, tasks):
+        ''' Write one history row per completed task with a single INSERT and update the rollups '''
+        now = timezone.now()
+        with transaction.atomic():
+            history = cls.objects.bulk_create([
+                cls(task_id=task.pk, user_id=task.user_id, completed_date=now)
+                for task in tasks
+            ])
+            CompletionRollup.add([(task.user_id, now, task.importance, task.end_date) for task in tasks])
+        if history:
+            logger.info("Completed task history created for %s tasks.", len(history))
+            invalidate_users(task.user_id for task in tasks)
+        return history
+
+
+class HistoryArchive(models.Model):
+    '''
+    One month of completed task history moved out of the hot table into a
+    gzip NDJSON file of the archive directory (see tasks.archive).
+    '''
+    month = models.DateField(unique=True)  # First day of the archived month
+    path = models.CharField(max_length=255)  # File name inside TASKS_HISTORY_ARCHIVE_DIR
+    row_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"history archive {self.month:%Y-%m} ({self.row_count} rows)"
+
+
+class HistoryArchiveSegment(models.Model):
+    '''
+    Rows of one user in a month archive: a separate gzip member at `offset`,
+    so serving a user reads `length` bytes instead of the whole month.
+    '''
+    archive = models.ForeignKey(HistoryArchive, on_delete=models.CASCADE, db_index=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
+    offset = models.BigIntegerField()
+    length = models.PositiveIntegerField()
+    row_count = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'archive'], name='archive_segment_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.archive}: user {self.user_id}"
+
+
+class TaskTombstone(models.Model):
+    ''' Deletion log so sync clients learn about removed tasks '''
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
+    task_id = models.BigIntegerField()  # Id of the deleted task, the row itself is gone
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='tombstone_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"deleted: task {self.task_id} on {self.deleted_at}"
+
+    @classmethod
+    def record_deletions(cls, deletions):
+        ''' Write one tombstone per (task_id, user_id) pair with a single INSERT '''
+        now = timezone.now()
+        return cls.objects.bulk_create([
+            cls(task_id=task_id, user_id=user_id, deleted_at=now)
+            for task_id, user_id in deletions
+        ])
+
+
+class CompletionRollup(models.Model):
+    '''
+    Completion counts per user, period and importance.
+
+    Maintained incrementally by the completion-history write path so the
+    statistics endpoint never has to scan CompletedTaskHistory.
+    '''
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()  # First day of the day/week (Monday)/month
+    importance = models.CharField(max_length=10)
+    completed_count = models.PositiveIntegerField(default=0)
+    on_time_count = models.PositiveIntegerField(default=0)  # Completed on or before end_date (or without one)
+    overdue_count = models.PositiveIntegerField(default=0)  # Completed after end_date
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period', 'period_start', 'importance'], name='rollup_unique_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.period} {self.period_start} {self.importance}: {self.completed_count}"
+
+    @staticmethod
+    def period_starts(day):
+        return {
+            'day': day,
+            'week': day - timezone.timedelta(days=day.weekday()),
+            'month': day.replace(day=1),
+        }
+
+    @classmethod
+    def add(cls, completions):
+        ''' Count (user_id, completed_date, importance, end_date) completions into their buckets '''
+        counts = Counter()
+        for user_id, completed_date, importance, end_date in completions:
+            on_time = end_date is None or completed_date <= end_date
+            day = timezone.localdate(completed_date)
+            for period, start in cls.period_starts(day).items():
+                counts[(user_id, period, start, importance, on_time)] += 1
+
+        for (user_id, period, start, importance, on_time), count in counts.items():
+            cls.increment(user_id, period, start, importance, count, count if on_time else 0, 0 if on_time else count)
+
+    @classmethod
+    def increment(cls, user_id, period, start, importance, completed, on_time, overdue):
+        bucket = cls.objects.filter(user_id=user_id, period=period, period_start=start, importance=importance)
+        changes = {
+            'completed_count': models.F('completed_count') + completed,
+            'on_time_count': models.F('on_time_count') + on_time,
+            'overdue_count': models.F('overdue_count') + overdue,
+        }
+        if bucket.update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    user_id=user_id, period=period, period_start=start, importance=importance,
+                    completed_count=completed, on_time_count=on_time, overdue_count=overdue,
+                )
+        except IntegrityError:
+            # Another writer created the bucket first
+            bucket.update(**changes)
+
+
+class TaskReminder(models.Model):
+    '''
+    Reminder event of a task: its deadline is close (due_soon) or has passed (overdue).
+
+    One event per task, kind and deadline, so rescanning the same window
+    never records an event twice while moving the deadline allows a new one.
+    '''
+    DUE_SOON = 'due_soon'
+    OVERDUE = 'overdue'
+    KIND_CHOICES = [
+        (DUE_SOON, 'Due soon'),
+        (OVERDUE, 'Overdue'),
+    ]
+
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, db_index=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    end_date = models.DateTimeField()  # Deadline the event was raised for
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'kind', 'end_date'], name='reminder_unique_event'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='reminder_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: task {self.task_id} due {self.end_date}"
+
+    @classmethod
+    def record(cls, kind, tasks):
+        ''' Record one event per task with a single INSERT, events already recorded are skipped '''
+        now = timezone.now()
+        return cls.objects.bulk_create([
+            cls(task_id=task.pk, user_id=task.user_id, kind=kind, end_date=task.end_date, created_at=now)
+            for task in tasks
+        ], ignore_conflicts=True)
+
+
+class TaskListSnapshot(models.Model):
+    '''
+    Pre-rendered JSON task list of a hot user (see tasks.snapshots).
+
+    It is served while count and last_modified match the user's current
+    task list validators. A set requested_at queues it for a rebuild.
+    '''
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True)
+    body = models.BinaryField(null=True)  # Response body, None until the first build
+    count = models.PositiveIntegerField(default=0)
+    last_modified = models.DateTimeField(null=True)
+    built_at = models.DateTimeField(null=True)
+    requested_at = models.DateTimeField(null=True)
+    promoted_at = models.DateTimeField(default=timezone.now)  # Last time a web process found the user hot
+
+    class Meta:
+        indexes = [
+            # Rebuild queue, oldest request first
+            models.Index(fields=['requested_at'], condition=models.Q(requested_at__isnull=False), name='snapshot_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"task list snapshot of user {self.user_id}"
@@ -0,0 +1,155 @@
+# tasks/pagination.py
+
+import base64
+import json
+
+from django.db.models import F, Q
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from rest_framework.renderers import JSONRenderer
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+
+# Orderings allowed for keyset pagination, the primary key is always the tie-breaker
+ORDERING_FIELDS = ('created_at', 'end_date', 'updated_at')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPaginator:
+    '''
+    Keyset (cursor) pagination over a task queryset.
+
+    Pages are ordered on (field, id) and the cursor stores the last row seen,
+    so every page is a single indexed range query no matter how deep it is.
+    NULL values of the ordering field are always placed last.
+    '''
+
+    def __init__(self, ordering='created_at', page_size=DEFAULT_PAGE_SIZE):
+        descending = ordering.startswith('-')
+        field = ordering.lstrip('-')
+        if field not in ORDERING_FIELDS:
+            raise InvalidCursor(f"Invalid ordering: {ordering}")
+        self.ordering = ordering
+        self.field = field
+        self.descending = descending
+        self.page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+
+    def order(self, queryset):
+        if self.descending:
+            return queryset.order_by(F(self.field).desc(nulls_last=True), '-id')
+        return queryset.order_by(F(self.field).asc(nulls_last=True), 'id')
+
+    def encode_cursor(self, value, pk):
+        payload = {
+            'o': self.ordering,
+            'v': value.isoformat() if value is not None else None,
+            'id': pk,
+        }
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            value = payload['v']
+            last_id = int(payload['id'])
+            ordering = payload['o']
+        except (ValueError, KeyError, TypeError):
+            raise InvalidCursor("Invalid cursor")
+
+        # A cursor is only valid for the ordering that produced it
+        if ordering != self.ordering:
+            raise InvalidCursor("Cursor does not match the requested ordering")
+
+        if value is not None:
+            value = parse_datetime(value)
+            if value is None:
+                raise InvalidCursor("Invalid cursor")
+        return value, last_id
+
+    def filter_after(self, queryset, cursor):
+        value, last_id = self.decode_cursor(cursor)
+        op = 'lt' if self.descending else 'gt'
+        field = self.field
+
+        if value is None:
+            # Already in the NULL tail, only the tie-breaker moves forward
+            return queryset.filter(**{f'{field}__isnull': True, f'id__{op}': last_id})
+
+        after = Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': last_id})
+        if queryset.model._meta.get_field(field).null:
+            # The NULL tail follows every value, an OR branch NOT NULL fields do not need
+            after |= Q(**{f'{field}__isnull': True})
+        return queryset.filter(after)
+
+    def cursor_key(self, row):
+        ''' (ordering value, pk) of a model instance, override with cursor_key= for value rows '''
+        return getattr(row, self.field), row.pk
+
+    def paginate(self, queryset, cursor=None, cursor_key=None):
+        ''' Return (rows, next_cursor) for the page following the given cursor '''
+        queryset = self.order(queryset)
+        if cursor:
+            queryset = self.filter_after(queryset, cursor)
+
+        # Fetch one extra row to know whether there is a next page
+        rows = list(queryset[:self.page_size + 1])
+        return self.split_page(rows, cursor_key or self.cursor_key)
+
+    async def apaginate(self, queryset, cursor=None, cursor_key=None):
+        ''' Async variant of paginate() for the async views '''
+        queryset = self.order(queryset)
+        if cursor:
+            queryset = self.filter_after(queryset, cursor)
+
+        rows = [row async for row in queryset[:self.page_size + 1]]
+        return self.split_page(rows, cursor_key or self.cursor_key)
+
+    def split_page(self, rows, cursor_key):
+        next_cursor = None
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            next_cursor = self.encode_cursor(*cursor_key(rows[-1]))
+        return rows, next_cursor
+
+
+def stream_json_array(queryset, serialize, chunk_size=STREAM_CHUNK_SIZE):
+    '''
+    Yield a JSON array of serialized rows chunk by chunk.
+
+    Rows come from QuerySet.iterator() so at most one chunk of rows and
+    serialized data is held in memory at a time. serialize() turns a list of
+    rows into a list of representations.
+    '''
+    renderer = JSONRenderer()
+    yield b'['
+    first = True
+    chunk = []
+    for row in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield _render_chunk(renderer, serialize, chunk, first)
+            first = False
+            chunk = []
+    if chunk:
+        yield _render_chunk(renderer, serialize, chunk, first)
+    yield b']'
+
+
+def _render_chunk(renderer, serialize, chunk, first):
+    # Render the chunk as a list and drop the surrounding brackets
+    body = renderer.render(serialize(chunk))[1:-1]
+    return body if first else b',' + body
+
+
+def streaming_json_response(queryset, serialize, chunk_size=STREAM_CHUNK_SIZE):
+    return StreamingHttpResponse(
+        stream_json_array(queryset, serialize, chunk_size),
+        content_type='application/json',
+    )
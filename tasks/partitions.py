@@ -0,0 +1,147 @@
+# tasks/partitions.py
+
+import logging
+from datetime import date
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import CompletedTaskHistory
+from .queries import period_range
+
+logger = logging.getLogger('tasks')
+
+HISTORY_TABLE = CompletedTaskHistory._meta.db_table
+DEFAULT_PARTITION = f'{HISTORY_TABLE}_default'
+MONTHS_AHEAD = 3
+
+
+def add_months(month, count):
+    ''' First day of the month `count` months after (or before) the given month '''
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{HISTORY_TABLE}_p{month:%Y%m}'
+
+
+def is_partitioned():
+    ''' Whether the history table is range partitioned, always False outside PostgreSQL '''
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [HISTORY_TABLE])
+        return cursor.fetchone() is not None
+
+
+def history_partitions():
+    ''' Names of the partitions of the history table '''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = %s::regclass ORDER BY c.relname',
+            [HISTORY_TABLE],
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def _create_partition(cursor, month):
+    # Bounds are the month in the current timezone, the same ranges the history filters query
+    start, end = period_range(month.year, month.month)
+    quote = connection.ops.quote_name
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {quote(partition_name(month))} PARTITION OF {quote(HISTORY_TABLE)} '
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def ensure_partitions(months_ahead=MONTHS_AHEAD, first_month=None):
+    '''
+    Create the monthly partitions from first_month (default: the current
+    month) up to months_ahead months from now, and the default partition.
+
+    Run it at least once a month: a completion falling past the last monthly
+    partition lands in the default partition, which then blocks creating the
+    partition of its month.
+    '''
+    current = timezone.localdate().replace(day=1)
+    month = first_month or current
+    last = add_months(current, months_ahead)
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        existing = set(history_partitions())
+        while month <= last:
+            if partition_name(month) not in existing:
+                _create_partition(cursor, month)
+                created.append(partition_name(month))
+            month = add_months(month, 1)
+        quote = connection.ops.quote_name
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {quote(DEFAULT_PARTITION)} PARTITION OF {quote(HISTORY_TABLE)} DEFAULT')
+    if created:
+        logger.info("Created history partitions: %s", ', '.join(created))
+    return created
+
+
+def convert_history_table(months_ahead=MONTHS_AHEAD):
+    '''
+    Rebuild the history table as a table range partitioned by month on
+    completed_date, in one transaction holding an exclusive lock.
+
+    Partitioned tables need the partition key in the primary key, so the new
+    key is (id, completed_date); ids still come from one sequence and stay
+    unique. Indexes and foreign keys are recreated under their old names
+    after the rows are copied.
+    '''
+    quote = connection.ops.quote_name
+    table = quote(HISTORY_TABLE)
+    old = quote(f'{HISTORY_TABLE}_unpartitioned')
+    sequence = f'{HISTORY_TABLE}_pid_seq'
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+        constraints = connection.introspection.get_constraints(cursor, HISTORY_TABLE)
+        cursor.execute(f'SELECT MIN(completed_date), MAX(id) FROM {table}')
+        oldest, max_id = cursor.fetchone()
+
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {old}')
+        cursor.execute(
+            f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS, PRIMARY KEY (id, completed_date)) '
+            f'PARTITION BY RANGE (completed_date)'
+        )
+        # The identity or serial sequence of the old table goes away with it
+        cursor.execute(f'CREATE SEQUENCE {quote(sequence)}')
+        if max_id:
+            cursor.execute('SELECT setval(%s, %s)', [sequence, max_id])
+        cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+        cursor.execute(f'ALTER SEQUENCE {quote(sequence)} OWNED BY {table}.id')
+
+        first_month = timezone.localdate(oldest).replace(day=1) if oldest else None
+        ensure_partitions(months_ahead, first_month)
+        cursor.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+        cursor.execute(f'DROP TABLE {old}')
+        for name, constraint in constraints.items():
+            columns = ', '.join(quote(column) for column in constraint['columns'])
+            if constraint['primary_key']:
+                continue
+            if constraint['foreign_key']:
+                to_table, to_column = constraint['foreign_key']
+                cursor.execute(
+                    f'ALTER TABLE {table} ADD CONSTRAINT {quote(name)} FOREIGN KEY ({columns}) '
+                    f'REFERENCES {quote(to_table)} ({quote(to_column)}) DEFERRABLE INITIALLY DEFERRED'
+                )
+            elif constraint['index'] and not constraint['unique']:
+                cursor.execute(f'CREATE INDEX {quote(name)} ON {table} ({columns})')
+    logger.info("Converted %s to a partitioned table", HISTORY_TABLE)
+
+
+def drop_partition(month):
+    ''' Detach and drop the partition of one month, False when the table has no such partition '''
+    if not is_partitioned() or partition_name(month) not in history_partitions():
+        return False
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {quote(HISTORY_TABLE)} DETACH PARTITION {quote(partition_name(month))}')
+        cursor.execute(f'DROP TABLE {quote(partition_name(month))}')
+    logger.info("Dropped history partition %s", partition_name(month))
+    return True
@@ -0,0 +1,218 @@
+# tasks/queries.py
+
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Task, TaskReminder, CompletedTaskHistory, CompletionRollup, SEARCH_CONFIG, supports_search
+
+# Columns read by TaskSerializer, the username comes from the joined user row
+TASK_LIST_FIELDS = (
+    'id', 'title', 'description', 'completed', 'importance',
+    'end_date', 'created_at', 'updated_at', 'user__username',
+)
+
+# Columns read by CompletedTaskHistorySerializer
+HISTORY_LIST_FIELDS = ('id', 'completed_date', 'task__title', 'task__importance')
+
+# Open tasks whose deadline is at most this far ahead are due soon
+DUE_SOON_WINDOW = timezone.timedelta(hours=getattr(settings, 'TASKS_DUE_SOON_HOURS', 24))
+DUE_FILTERS = (TaskReminder.OVERDUE, TaskReminder.DUE_SOON)
+
+# Columns read for each output field of TaskSerializer, for fields= projections
+TASK_FIELD_COLUMNS = {
+    'id': ('id',), 'title': ('title',), 'description': ('description',), 'completed': ('completed',),
+    'importance': ('importance',), 'importance_display': ('importance',), 'end_date': ('end_date',),
+    'created_at': ('created_at',), 'updated_at': ('updated_at',), 'user': ('user__username',),
+}
+
+# Datetime columns filtered with <field>_after (inclusive) and <field>_before (exclusive)
+TASK_RANGE_FILTERS = ('end_date', 'created_at')
+IMPORTANCE_LEVELS = frozenset(choice for choice, _ in Task.IMPORTANCE_CHOICES)
+
+
+def task_list_queryset(user, fields=None):
+    '''
+    Tasks of a user projected to what TaskSerializer needs, in one query.
+
+    With a list of output fields only their columns are read, and the user
+    row is joined only when the username is requested.
+    '''
+    tasks = Task.objects.filter(user=user)
+    if fields is None:
+        return tasks.select_related('user').only(*TASK_LIST_FIELDS)
+    if 'user' in fields:
+        tasks = tasks.select_related('user')
+    return tasks.only(*task_columns(fields))
+
+
+def task_columns(fields):
+    ''' Columns of the given output fields, the primary key first '''
+    columns = ['id']
+    for field in fields:
+        for column in TASK_FIELD_COLUMNS[field]:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def parse_task_fields(value):
+    ''' Output fields selected by a comma separated fields= parameter, in representation order, None for all '''
+    if value is None:
+        return None
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = sorted(fields - TASK_FIELD_COLUMNS.keys())
+    if unknown or not fields:
+        raise ValueError(f"Invalid fields: {', '.join(unknown) or value!r}, expected any of {', '.join(TASK_FIELD_COLUMNS)}")
+    return [field for field in TASK_FIELD_COLUMNS if field in fields]
+
+
+def filter_task_list(tasks, params):
+    '''
+    Apply the completed, importance and date range filters of a task list
+    query string, raising ValueError for an invalid value.
+
+    completed=true|false, importance=Urgent,High (any of), and for end_date
+    and created_at an inclusive <field>_after and exclusive <field>_before
+    bound, as ISO datetimes or dates (midnight in the current timezone).
+    '''
+    completed = params.get('completed')
+    if completed is not None:
+        if completed.lower() in ('true', '1'):
+            tasks = tasks.filter(completed=True)
+        elif completed.lower() in ('false', '0'):
+            tasks = tasks.filter(completed=False)
+        else:
+            raise ValueError(f"Invalid completed filter: {completed}")
+
+    importance = params.get('importance')
+    if importance is not None:
+        levels = {level.strip() for level in importance.split(',') if level.strip()}
+        if not levels or levels - IMPORTANCE_LEVELS:
+            raise ValueError(f"Invalid importance filter: {importance}")
+        tasks = tasks.filter(importance__in=sorted(levels))
+
+    for field in TASK_RANGE_FILTERS:
+        after = params.get(f'{field}_after')
+        if after is not None:
+            tasks = tasks.filter(**{f'{field}__gte': parse_bound(after, f'{field}_after')})
+        before = params.get(f'{field}_before')
+        if before is not None:
+            tasks = tasks.filter(**{f'{field}__lt': parse_bound(before, f'{field}_before')})
+    return tasks
+
+
+def parse_bound(value, name):
+    ''' Aware datetime of an ISO datetime or date query parameter '''
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = datetime(day.year, day.month, day.day) if day else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"Invalid {name}: {value}")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def filter_due(tasks, due, now=None):
+    '''
+    Open tasks whose deadline has passed (overdue) or falls within
+    DUE_SOON_WINDOW (due_soon), as an end_date range on the database.
+    '''
+    now = now or timezone.now()
+    if due == TaskReminder.OVERDUE:
+        return tasks.filter(completed=False, end_date__lte=now)
+    if due == TaskReminder.DUE_SOON:
+        return tasks.filter(completed=False, end_date__gt=now, end_date__lte=now + DUE_SOON_WINDOW)
+    raise ValueError(f"Invalid due filter: {due}, expected one of {', '.join(DUE_FILTERS)}")
+
+
+def search_tasks(tasks, text):
+    '''
+    Tasks matching a search text, best matches first.
+
+    On PostgreSQL the text is a web search query (quoted phrases, "or",
+    -exclusions) matched against the stored search vector through the GIN
+    index and ranked with title matches above description matches. Other
+    databases require every word to appear in the title or the description.
+    '''
+    if supports_search(tasks.db):
+        query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+        return (
+            tasks.filter(search_vector=query)
+            .annotate(rank=SearchRank(F('search_vector'), query))
+            .order_by('-rank', '-id')
+        )
+    for word in text.split():
+        tasks = tasks.filter(Q(title__icontains=word) | Q(description__icontains=word))
+    return tasks.order_by('-created_at', '-id')
+
+
+def completed_history_queryset(user, year=None, month=None):
+    ''' Completed history rows of a user joined with their task, in one query '''
+    history = (
+        CompletedTaskHistory.objects.filter(user=user)
+        .select_related('task')
+        .only(*HISTORY_LIST_FIELDS)
+    )
+
+    # Year (and month) filters become a completed_date range so the (user, completed_date) index is used
+    if year:
+        start, end = period_range(year, month)
+        history = history.filter(completed_date__gte=start, completed_date__lt=end)
+    elif month:
+        # A month across every year cannot be expressed as one range
+        history = history.filter(completed_date__month=month)
+    return history
+
+
+def period_range(year, month=None):
+    ''' Aware [start, end) datetimes of a year, or of one month of that year '''
+    tz = timezone.get_current_timezone()
+    if month:
+        start = datetime(year, month, 1)
+        end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    else:
+        start = datetime(year, 1, 1)
+        end = datetime(year + 1, 1, 1)
+    return timezone.make_aware(start, tz), timezone.make_aware(end, tz)
+
+
+def completion_stats(user, period='month', start=None, end=None):
+    '''
+    Completion counts per period bucket and per importance, read from the rollups.
+
+    The cost depends on the number of buckets in the range, not on the size of
+    the user's history.
+    '''
+    rollups = CompletionRollup.objects.filter(user=user, period=period).order_by('period_start', 'importance')
+    if start:
+        rollups = rollups.filter(period_start__gte=CompletionRollup.period_starts(start)[period])
+    if end:
+        rollups = rollups.filter(period_start__lte=end)
+
+    buckets = {}
+    totals = _empty_stats()
+    for period_start, importance, completed, on_time, overdue in rollups.values_list(
+        'period_start', 'importance', 'completed_count', 'on_time_count', 'overdue_count'
+    ):
+        bucket = buckets.setdefault(period_start, dict(_empty_stats(), period_start=period_start.isoformat()))
+        for stats in (bucket, totals):
+            stats['completed'] += completed
+            stats['on_time'] += on_time
+            stats['overdue'] += overdue
+            stats['by_importance'][importance] = stats['by_importance'].get(importance, 0) + completed
+
+    for stats in [*buckets.values(), totals]:
+        stats['on_time_rate'] = round(stats['on_time'] / stats['completed'], 4) if stats['completed'] else None
+    return {'period': period, 'buckets': list(buckets.values()), 'totals': totals}
+
+
+def _empty_stats():
+    return {'completed': 0, 'on_time': 0, 'overdue': 0, 'by_importance': {}}
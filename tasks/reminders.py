@@ -0,0 +1,58 @@
+# tasks/reminders.py
+
+import logging
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Task, TaskReminder
+from .queries import DUE_SOON_WINDOW
+
+logger = logging.getLogger('tasks')
+
+# How far back a scan looks for deadlines that passed, covers worker downtime
+OVERDUE_LOOKBACK = timezone.timedelta(hours=getattr(settings, 'TASKS_OVERDUE_LOOKBACK_HOURS', 24 * 7))
+REMINDER_BATCH_SIZE = 1000
+
+
+def iter_batches(queryset, batch_size=REMINDER_BATCH_SIZE):
+    '''
+    Batches of open tasks ordered on (end_date, id), read with keyset
+    conditions so every batch is one range scan of the task_open_end_idx
+    partial index.
+    '''
+    queryset = queryset.order_by('end_date', 'id').only('id', 'user', 'end_date')
+    batch = list(queryset[:batch_size])
+    while batch:
+        yield batch
+        if len(batch) < batch_size:
+            return
+        last = batch[-1]
+        batch = list(
+            queryset.filter(Q(end_date__gt=last.end_date) | Q(end_date=last.end_date, id__gt=last.id))[:batch_size]
+        )
+
+
+def scan_reminders(now=None, batch_size=REMINDER_BATCH_SIZE):
+    '''
+    Record due_soon and overdue events for every open task in the scan windows.
+
+    Safe to run repeatedly and from several workers: an event already
+    recorded for a task and deadline is skipped by the unique constraint.
+    Returns the number of tasks examined per kind.
+    '''
+    now = now or timezone.now()
+    windows = {
+        TaskReminder.DUE_SOON: (now, now + DUE_SOON_WINDOW),
+        TaskReminder.OVERDUE: (now - OVERDUE_LOOKBACK, now),
+    }
+    scanned = {}
+    for kind, (start, end) in windows.items():
+        open_tasks = Task.objects.filter(completed=False, end_date__gt=start, end_date__lte=end)
+        scanned[kind] = 0
+        for batch in iter_batches(open_tasks, batch_size):
+            TaskReminder.record(kind, batch)
+            scanned[kind] += len(batch)
+    logger.info("Reminder scan: %s due soon, %s overdue tasks", scanned[TaskReminder.DUE_SOON], scanned[TaskReminder.OVERDUE])
+    return scanned
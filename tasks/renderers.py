@@ -0,0 +1,13 @@
+# tasks/renderers.py
+
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import serialization_timer
+
+
+class InstrumentedJSONRenderer(JSONRenderer):
+    ''' JSONRenderer that counts the encoding time as serialization time of the request '''
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with serialization_timer():
+            return super().render(data, accepted_media_type, renderer_context)
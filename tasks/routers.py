@@ -0,0 +1,78 @@
+# tasks/routers.py
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+from .cache import is_pinned_to_primary
+
+# Database alias the reads of the current request go to, None for the primary
+current_replica = ContextVar('tasks_current_replica', default=None)
+
+
+def replica_aliases():
+    return getattr(settings, 'TASKS_READ_REPLICAS', ())
+
+
+def choose_replica(user_id):
+    ''' A replica alias for the reads of a user, None while the user is pinned to the primary '''
+    replicas = replica_aliases()
+    if not replicas or user_id is None or is_pinned_to_primary(user_id):
+        return None
+    return random.choice(replicas)
+
+
+@contextmanager
+def replica_reads(user_id):
+    ''' Route the reads made inside the block to a replica, unless the user wrote recently '''
+    token = current_replica.set(choose_replica(user_id))
+    try:
+        yield current_replica.get()
+    finally:
+        current_replica.reset(token)
+
+
+class ReplicaRouter:
+    '''
+    Sends reads to a replica inside replica_reads() blocks (the read-heavy
+    views) and everything else, writes included, to the primary.
+
+    Replicas are kept up to date by database replication, so migrations
+    only run on the primary.
+    '''
+
+    def db_for_read(self, model, **hints):
+        return current_replica.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replica_aliases()
+
+
+class ReplicaReadMixin:
+    '''
+    APIView mixin running the queries of safe (GET/HEAD) requests on a read
+    replica. Authentication still reads from the primary.
+    '''
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and replica_aliases():
+            self._replica_token = current_replica.set(choose_replica(request.user.pk))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            current_replica.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -1,12 +1,91 @@
 # tasks/serializers.py
 
+from itertools import repeat
+
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Task, CompletedTaskHistory
+from .queries import task_columns
+from .cache import invalidate_users
+from .metrics import serialization_timer
+
+
+class TaskBulkListSerializer(serializers.ListSerializer):
+    '''
+    Validates a list of tasks together and writes them with bulk queries.
+
+    For updates the serializer is given a {pk: task} mapping as instance and
+    every item must carry the id of the task it updates.
+    '''
+
+    def run_child_validation(self, data):
+        if self.instance is not None:
+            task = self.instance.get(data.get('id')) if isinstance(data, dict) else None
+            if task is None:
+                raise serializers.ValidationError({'id': ['Task not found']})
+            self.child.instance = task
+            self.child.initial_data = data
+        elif isinstance(data, dict) and 'importance' not in data:
+            raise serializers.ValidationError({'importance': ['Importance level is required']})
+        return super().run_child_validation(data)
+
+    def create(self, validated_data):
+        tasks = [Task(**attrs) for attrs in validated_data]
+
+        # Same end date defaulting as Task.save, applied before the single INSERT
+        for task in tasks:
+            task.set_default_end_date()
+        tasks = Task.objects.bulk_create(tasks)
+        Task.objects.filter(pk__in=[task.pk for task in tasks]).update_search_vector()
+        for task in tasks:
+            task._loaded_completed = task.completed
+        invalidate_users(task.user_id for task in tasks)
+
+        CompletedTaskHistory.record_completions([task for task in tasks if task.completed])
+        return tasks
+
+    def update(self, instances, validated_data):
+        tasks = []
+        completed_now = []
+        fields = {'updated_at'}
+        now = timezone.now()
+        for item, attrs in zip(self.initial_data, validated_data):
+            task = instances[item['id']]
+            was_completed = task.was_completed()
+            for attr, value in attrs.items():
+                setattr(task, attr, value)
+            task.set_default_end_date()
+            # bulk_update does not run auto_now
+            task.updated_at = now
+            fields.update(attrs)
+            fields.add('end_date')
+            if task.completed and not was_completed:
+                completed_now.append(task)
+            tasks.append(task)
+
+        # Runs TaskQuerySet.update, which also recomputes the search vectors of changed titles and descriptions
+        Task.objects.bulk_update(tasks, sorted(fields))
+        CompletedTaskHistory.record_completions(completed_now)
+        for task in tasks:
+            task._loaded_completed = task.completed
+        return tasks
+
+    @serialization_timer()
+    def to_representation(self, data):
+        return super().to_representation(data)
+
 
 class TaskSerializer(serializers.ModelSerializer):
     user = serializers.CharField(source='user.username', read_only=True)  # Display the username
     importance_display = serializers.CharField(source='get_importance_display', read_only=True)  # Importance label
 
+    def __init__(self, *args, fields=None, **kwargs):
+        # Optional sparse fieldset: only these fields are represented
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Task
         fields = [
@@ -14,6 +93,7 @@ class TaskSerializer(serializers.ModelSerializer):
             'end_date', 'created_at', 'updated_at', 'user'
         ]
         read_only_fields = ['created_at', 'updated_at', 'user', 'importance_display']
+        list_serializer_class = TaskBulkListSerializer
 
 
 class CompletedTaskHistorySerializer(serializers.ModelSerializer):
@@ -23,4 +103,126 @@ class CompletedTaskHistorySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CompletedTaskHistory
-        fields = ['id', 'task_title', 'task_importance', 'task_completed_date']
\ No newline at end of file
+        fields = ['id', 'task_title', 'task_importance', 'task_completed_date']
+
+def datetime_formatter():
+    '''
+    Function rendering an aware datetime exactly like DRF's DateTimeField.
+
+    The current timezone is looked up once per call to this function, not
+    once per value.
+    '''
+    tz = timezone.get_current_timezone()
+
+    def format_datetime(value):
+        if not value:
+            return None
+        value = value.astimezone(tz).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    return format_datetime
+
+
+class TaskValuesSerializer:
+    '''
+    Read-only fast path producing the same output as TaskSerializer(many=True).
+
+    Rows are read with values_list() instead of model instances, the
+    importance labels come from a precomputed mapping and the datetime
+    columns are formatted column by column. The username is passed in since
+    every row of a list belongs to the requesting user.
+    '''
+
+    value_fields = ('id', 'title', 'description', 'completed', 'importance', 'end_date', 'created_at', 'updated_at')
+    datetime_fields = frozenset(('end_date', 'created_at', 'updated_at'))
+    importance_labels = dict(Task.IMPORTANCE_CHOICES)
+
+    def __init__(self, username, fields=None, ordering_field=None):
+        '''
+        fields narrows the output to a sparse fieldset and the query to its
+        columns, ordering_field is an extra column read for keyset cursors.
+        '''
+        self.username = username
+        self.fields = fields
+        if fields is not None:
+            columns = [column for column in task_columns(fields) if column != 'user__username']
+            if ordering_field and ordering_field not in columns:
+                columns.append(ordering_field)
+            self.value_fields = tuple(columns)
+
+    def values(self, queryset):
+        return queryset.values_list(*self.value_fields)
+
+    def cursor_key(self, field):
+        ''' (ordering value, pk) of a value row, for KeysetPaginator '''
+        index = self.value_fields.index(field)
+        return lambda row: (row[index], row[0])
+
+    @serialization_timer()
+    def to_representation(self, rows):
+        if not rows:
+            return []
+        if self.fields is not None:
+            return self.project(rows)
+        ids, titles, descriptions, completed, importance, end_dates, created, updated = zip(*rows)
+
+        format_datetime = datetime_formatter()
+        labels = self.importance_labels
+        importance_display = [labels.get(value, value) for value in importance]
+        end_dates = map(format_datetime, end_dates)
+        created = map(format_datetime, created)
+        updated = map(format_datetime, updated)
+
+        username = self.username
+        return [
+            {
+                'id': row[0], 'title': row[1], 'description': row[2], 'completed': row[3],
+                'importance': row[4], 'importance_display': row[5], 'end_date': row[6],
+                'created_at': row[7], 'updated_at': row[8], 'user': username,
+            }
+            for row in zip(ids, titles, descriptions, completed, importance, importance_display, end_dates, created, updated)
+        ]
+
+    def project(self, rows):
+        ''' Sparse fieldset representation, computed column by column like the full one '''
+        columns = dict(zip(self.value_fields, zip(*rows)))
+        format_datetime = datetime_formatter()
+        values = []
+        for field in self.fields:
+            if field == 'user':
+                values.append(repeat(self.username, len(rows)))
+            elif field == 'importance_display':
+                labels = self.importance_labels
+                values.append([labels.get(value, value) for value in columns['importance']])
+            elif field in self.datetime_fields:
+                values.append(map(format_datetime, columns[field]))
+            else:
+                values.append(columns[field])
+        fields = self.fields
+        return [dict(zip(fields, row)) for row in zip(*values)]
+
+
+class CompletedTaskHistoryValuesSerializer:
+    ''' Read-only fast path producing the same output as CompletedTaskHistorySerializer(many=True) '''
+
+    value_fields = ('id', 'task_id', 'task__title', 'task__importance', 'completed_date')
+
+    def values(self, queryset):
+        return queryset.values_list(*self.value_fields)
+
+    @serialization_timer()
+    def to_representation(self, rows):
+        format_datetime = datetime_formatter()
+        data = []
+        for pk, task_id, title, importance, completed_date in rows:
+            if task_id is None:
+                # The task was deleted, like DRF the task fields are left out
+                data.append({'id': pk, 'task_completed_date': format_datetime(completed_date)})
+            else:
+                data.append({
+                    'id': pk, 'task_title': title, 'task_importance': importance,
+                    'task_completed_date': format_datetime(completed_date),
+                })
+        return data
@@ -0,0 +1,35 @@
+# tasks/signals.py
+
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import user_cache
+from .cache import invalidate_user
+from .metrics import install_query_hook
+from .models import Task
+from .snapshots import queue_rebuild
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user_responses(sender, instance, update_fields=None, **kwargs):
+    # Token logins only stamp last_login, nothing cached depends on it
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    # Deactivation and password changes must reach the authentication cache
+    user_cache.evict(instance.pk)
+    # A new user can reuse the id of a deleted one, never serve it the old cached responses
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def rebuild_task_list_snapshot(sender, instance, **kwargs):
+    # Hot users get their pre-rendered task list rebuilt by the snapshot worker
+    queue_rebuild(instance.user_id)
+
+
+# Per-request query metrics, on whichever thread runs the query
+connection_created.connect(install_query_hook, dispatch_uid='tasks_query_metrics')
@@ -0,0 +1,206 @@
+# tasks/snapshots.py
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .cache import get_cache, response_key, get_cached_response, set_cached_response
+from .models import Task, TaskListSnapshot
+from .queries import task_list_queryset
+from .serializers import TaskValuesSerializer
+
+logger = logging.getLogger('tasks')
+
+SNAPSHOT_BATCH_SIZE = 100
+MAX_TRACKED_USERS = 10000
+
+
+class HotUserTracker:
+    '''
+    In-process count of task list requests per user.
+
+    A user with `threshold` requests within `window` seconds becomes hot in
+    this process for `hot_seconds`. Each worker process decides from its own
+    traffic, so no shared state is needed. A threshold of 0 disables
+    snapshots.
+    '''
+
+    def __init__(self, threshold, window, hot_seconds, max_users=MAX_TRACKED_USERS):
+        self.threshold = threshold
+        self.window = window
+        self.hot_seconds = hot_seconds
+        self.max_users = max_users
+        self.counts = {}  # user_id -> (window start, requests)
+        self.hot = {}  # user_id -> hot until
+        self.lock = threading.Lock()
+
+    def hit(self, user_id):
+        ''' Count one request: 'hot', 'promoted' when the user just became hot, or None '''
+        if self.threshold <= 0:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            hot_until = self.hot.get(user_id)
+            if hot_until is not None:
+                if hot_until > now:
+                    return 'hot'
+                del self.hot[user_id]
+
+            start, requests = self.counts.get(user_id, (now, 0))
+            if now - start > self.window:
+                start, requests = now, 0
+            requests += 1
+            if requests < self.threshold:
+                if len(self.counts) >= self.max_users and user_id not in self.counts:
+                    self.counts.clear()
+                self.counts[user_id] = (start, requests)
+                return None
+
+            self.counts.pop(user_id, None)
+            self.hot[user_id] = now + self.hot_seconds
+            return 'promoted'
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+            self.hot.clear()
+
+
+hot_users = HotUserTracker(
+    threshold=getattr(settings, 'TASKS_SNAPSHOT_HOT_REQUESTS', 0),
+    window=getattr(settings, 'TASKS_SNAPSHOT_WINDOW', 60),
+    hot_seconds=getattr(settings, 'TASKS_SNAPSHOT_HOT_SECONDS', 600),
+)
+
+
+def _hot_key(user_id):
+    return f'tasks:snapshot:hot:{user_id}'
+
+
+def promote(user_id):
+    '''
+    Create the snapshot row of a user that became hot, queued for its first
+    build, or keep an existing one from expiring.
+    '''
+    now = timezone.now()
+    TaskListSnapshot.objects.update_or_create(
+        user_id=user_id, defaults={'promoted_at': now}, create_defaults={'promoted_at': now, 'requested_at': now},
+    )
+    # Lets the write paths of every process skip users without a snapshot
+    get_cache().set(_hot_key(user_id), 1, timeout=hot_users.hot_seconds)
+    logger.info("Task list of user %s is hot, snapshot enabled", user_id)
+
+
+def snapshot_body(user_id, validators):
+    '''
+    Pre-rendered body of the full task list of a hot user, or None.
+
+    A snapshot is served only when built from the same validators (task
+    count and latest updated_at) as the current ones, the guarantee the
+    task list ETag already relies on. Served bodies are kept in the response
+    cache until the user's next change, repeated reads then run no query.
+    '''
+    state = hot_users.hit(user_id)
+    if state is None:
+        return None
+    if state == 'promoted':
+        promote(user_id)
+        return None
+
+    cache_key = response_key(user_id, 'task_list_snapshot')
+    body = get_cached_response(cache_key)
+    if body is not None:
+        return body
+
+    snapshot = (
+        TaskListSnapshot.objects.filter(user_id=user_id)
+        .values_list('body', 'count', 'last_modified', 'requested_at').first()
+    )
+    if snapshot is None:
+        # Expired by the rebuild worker while the user was still hot here
+        promote(user_id)
+        return None
+    body, count, last_modified, requested_at = snapshot
+    if body is not None and count == validators['count'] and last_modified == validators['last_modified']:
+        body = bytes(body)
+        set_cached_response(cache_key, body)
+        return body
+    if requested_at is None:
+        # Changed by a write path without model signals (bulk update, import)
+        queue_rebuild(user_id, check_hot=False)
+    return None
+
+
+def queue_rebuild(user_id, check_hot=True):
+    ''' Queue the snapshot of a hot user for a rebuild once the current transaction commits '''
+    if user_id is None or (check_hot and get_cache().get(_hot_key(user_id)) is None):
+        return
+    # Always moves requested_at, a rebuild running meanwhile then leaves the snapshot queued
+    transaction.on_commit(
+        lambda: TaskListSnapshot.objects.filter(user_id=user_id).update(requested_at=timezone.now())
+    )
+
+
+def build_snapshot(user_id):
+    '''
+    Render the full task list of one user and store it with its validators.
+
+    The validators are read before the rows: a write in between makes the
+    body newer than its validators, which never match again, instead of
+    labelling an old body as current. The snapshot leaves the queue only if
+    no rebuild was requested while building. Returns False for a user
+    without snapshot.
+    '''
+    snapshots = TaskListSnapshot.objects.filter(user_id=user_id)
+    requested_at = snapshots.values_list('requested_at', flat=True).first()
+    username = get_user_model().objects.filter(pk=user_id).values_list('username', flat=True).first()
+    if username is None:
+        return False
+
+    validators = Task.objects.filter(user_id=user_id).aggregate(last_modified=Max('updated_at'), count=Count('id'))
+    serializer = TaskValuesSerializer(username)
+    rows = list(serializer.values(task_list_queryset(user_id)))
+    body = JSONRenderer().render(serializer.to_representation(rows))
+
+    if not snapshots.update(body=body, built_at=timezone.now(), **validators):
+        return False
+    snapshots.filter(requested_at=requested_at).update(requested_at=None)
+    return True
+
+
+def rebuild_queued(executor=None, batch_size=SNAPSHOT_BATCH_SIZE):
+    '''
+    Rebuild the oldest queued snapshots, on the executor's processes when
+    given (concurrent.futures.ProcessPoolExecutor) or in this process.
+    Returns the number of snapshots rebuilt.
+    '''
+    user_ids = list(
+        TaskListSnapshot.objects.filter(requested_at__isnull=False)
+        .order_by('requested_at').values_list('user_id', flat=True)[:batch_size]
+    )
+    if not user_ids:
+        return 0
+    if executor is None:
+        results = [build_snapshot(user_id) for user_id in user_ids]
+    else:
+        results = list(executor.map(build_snapshot, user_ids))
+    rebuilt = sum(results)
+    logger.info("Rebuilt %s task list snapshots", rebuilt)
+    return rebuilt
+
+
+def expire_snapshots(now=None):
+    ''' Delete the snapshots of users no process found hot for twice the hot period '''
+    now = now or timezone.now()
+    cutoff = now - timezone.timedelta(seconds=2 * hot_users.hot_seconds)
+    deleted, _ = TaskListSnapshot.objects.filter(promoted_at__lt=cutoff).delete()
+    if deleted:
+        logger.info("Expired %s task list snapshots", deleted)
+    return deleted
@@ -0,0 +1,59 @@
+# tasks/sync.py
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import TaskTombstone
+from .queries import task_list_queryset
+
+SYNC_TOKEN_SALT = 'tasks.sync'
+
+# Changes are re-sent from a little before the previous sync, so a write that
+# committed after that sync read the table (but was stamped earlier) is not lost
+SYNC_OVERLAP = timezone.timedelta(seconds=getattr(settings, 'TASKS_SYNC_OVERLAP_SECONDS', 5))
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+def make_sync_token(user, synced_at):
+    return signing.dumps({'u': user.pk, 't': synced_at.isoformat()}, salt=SYNC_TOKEN_SALT, compress=True)
+
+
+def read_sync_token(user, token):
+    ''' Point in time a token was issued at, only valid for the user it was issued to '''
+    try:
+        payload = signing.loads(token, salt=SYNC_TOKEN_SALT)
+    except signing.BadSignature:
+        raise InvalidSyncToken("Invalid sync token")
+
+    synced_at = parse_datetime(payload.get('t') or '')
+    if payload.get('u') != user.pk or synced_at is None:
+        raise InvalidSyncToken("Invalid sync token")
+    return synced_at
+
+
+def changes_since(user, token=None):
+    '''
+    Tasks created or updated and ids of tasks deleted since the token was issued.
+
+    Without a token every task is returned, which is the initial sync.
+    Returns (changed_tasks, deleted_ids, next_token).
+    '''
+    synced_at = timezone.now()
+    tasks = task_list_queryset(user).order_by('updated_at', 'id')
+    deleted_ids = []
+
+    if token:
+        since = read_sync_token(user, token) - SYNC_OVERLAP
+        tasks = tasks.filter(updated_at__gte=since)
+        deleted_ids = list(
+            TaskTombstone.objects.filter(user=user, deleted_at__gte=since)
+            .order_by('deleted_at')
+            .values_list('task_id', flat=True)
+        )
+
+    return list(tasks), deleted_ids, make_sync_token(user, synced_at)
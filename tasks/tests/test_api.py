@@ -1,11 +1,35 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, router
+from django.core.management import call_command
+from django.test import AsyncClient, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import status
-from tasks.models import Task, CompletedTaskHistory
+from tasks.models import Task, CompletedTaskHistory, TaskTombstone, TaskReminder, HistoryArchive, TaskListSnapshot
+from tasks.archive import reads_archive
+from tasks.cache import invalidate_user, get_cache
+from tasks.checks import check_replica_pin_cache
+from tasks.reminders import scan_reminders
+from tasks.routers import current_replica, replica_reads
+from tasks.snapshots import hot_users, rebuild_queued, expire_snapshots
+from tasks.throttling import LocalBuckets, CacheBuckets, local_buckets
+from tasks.sync import make_sync_token
+from tasks.transfer import import_tasks
+from tasks.metrics import registry
+from tasks.authentication import user_cache
 
 class TaskAPITestCase(APITestCase):
     
@@ -115,8 +139,9 @@ class CompletedTaskHistoryViewTest(APITestCase):
         task.completed = True
         task.save()
 
-        # Check that completed history now has two entries
-        self.assertEqual(CompletedTaskHistory.objects.filter(task__user=self.user).count(), 2)
+        # Check that completed history now has three entries: the task created as completed
+        # in setUp, the manually created row and the newly completed task
+        self.assertEqual(CompletedTaskHistory.objects.filter(task__user=self.user).count(), 3)
 
     def test_completed_task_history_api(self):
         """Test fetching completed tasks history from the API with month and year filters"""
@@ -146,3 +171,1120 @@ class CompletedTaskHistoryViewTest(APITestCase):
         response = self.client.get(url, {'year': 'abcd'})  # Invalid year
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+
+
+class TaskListPaginationTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        for i in range(5):
+            Task.objects.create(user=self.user, title=f'task {i}', importance='Low')
+
+    def test_cursor_pages_cover_all_tasks(self):
+        ''' Walking the cursor returns every task exactly once in (created_at, id) order '''
+        url = reverse('task_list_api')
+        seen = []
+        params = {'page_size': 2}
+        while True:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(task['id'] for task in response.data['results'])
+            if not response.data['next_cursor']:
+                break
+            params = {'page_size': 2, 'cursor': response.data['next_cursor']}
+
+        expected = list(Task.objects.filter(user=self.user).order_by('created_at', 'id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_cursor_descending_end_date(self):
+        ''' Descending end_date ordering pages in reverse order '''
+        url = reverse('task_list_api')
+        response = self.client.get(url, {'page_size': 3, 'ordering': '-end_date'})
+        self.assertEqual(len(response.data['results']), 3)
+
+        response = self.client.get(url, {'page_size': 3, 'ordering': '-end_date', 'cursor': response.data['next_cursor']})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNone(response.data['next_cursor'])
+
+    def test_invalid_cursor(self):
+        ''' A malformed cursor or unknown ordering is rejected '''
+        url = reverse('task_list_api')
+        response = self.client.get(url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(url, {'page_size': 2, 'ordering': 'title'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_streaming_list(self):
+        ''' Streaming mode returns the full list as one JSON array '''
+        url = reverse('task_list_api')
+        response = self.client.get(url, {'stream': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(data), 5)
+        self.assertEqual(data[0]['title'], 'task 0')
+
+
+class QueryBudgetTest(APITestCase):
+    ''' Each read endpoint runs a fixed number of queries whatever the row count '''
+
+    # The ETag aggregate + one query for the rows, the token user is cached
+    TASK_LIST_QUERIES = 2
+    # One query for the rows
+    HISTORY_QUERIES = 1
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        # First request of the token loads the user into the authentication cache
+        self.client.get(reverse('task_stats_api'))
+
+    def add_tasks(self, count):
+        for i in range(count):
+            task = Task.objects.create(user=self.user, title=f'task {i}', importance='Medium')
+            CompletedTaskHistory.objects.create(task=task, completed_date=timezone.now())
+
+    def test_task_list_query_budget(self):
+        url = reverse('task_list_api')
+        for count in (1, 10):
+            self.add_tasks(count)
+            with self.assertNumQueries(self.TASK_LIST_QUERIES):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data[0]['user'], 'testuser')
+
+    def test_task_list_page_query_budget(self):
+        url = reverse('task_list_api')
+        for count in (1, 10):
+            self.add_tasks(count)
+            with self.assertNumQueries(self.TASK_LIST_QUERIES):
+                response = self.client.get(url, {'page_size': 5})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_completed_history_query_budget(self):
+        url = reverse('completed_task_history_api')
+        now = timezone.now()
+        for count in (1, 10):
+            self.add_tasks(count)
+            with self.assertNumQueries(self.HISTORY_QUERIES):
+                response = self.client.get(url, {'month': now.month, 'year': now.year})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data[0]['task_importance'], 'Medium')
+
+
+class TaskBulkAPITest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.url = reverse('task_bulk_api')
+
+    def test_bulk_create_update_delete(self):
+        ''' Create, update and delete tasks in one request '''
+        to_update = Task.objects.create(user=self.user, title='to update', importance='Low')
+        to_delete = Task.objects.create(user=self.user, title='to delete', importance='Low')
+
+        data = {
+            'create': [
+                {'title': 'bulk 1', 'importance': 'Urgent'},
+                {'title': 'bulk 2', 'importance': 'Medium', 'completed': True},
+            ],
+            'update': [{'id': to_update.pk, 'title': 'updated', 'completed': True}],
+            'delete': [to_delete.pk],
+        }
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['created']), 2)
+        self.assertEqual(response.data['updated'][0]['title'], 'updated')
+        self.assertEqual(response.data['deleted'], 1)
+        self.assertFalse(Task.objects.filter(pk=to_delete.pk).exists())
+
+        # End date defaulting from Task.save is applied to bulk created tasks
+        created = Task.objects.get(title='bulk 1')
+        self.assertEqual(created.end_date.date(), (timezone.now() + timezone.timedelta(days=3)).date())
+
+        # Completed tasks get their history rows
+        self.assertEqual(CompletedTaskHistory.objects.filter(task__title='bulk 2').count(), 1)
+        self.assertEqual(CompletedTaskHistory.objects.filter(task=to_update).count(), 1)
+
+    def test_bulk_invalid_data_is_atomic(self):
+        ''' One invalid operation rejects the whole batch '''
+        data = {
+            'create': [
+                {'title': 'valid', 'importance': 'Low'},
+                {'title': 'missing importance'},
+            ],
+        }
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Task.objects.filter(user=self.user).exists())
+
+    def test_bulk_update_other_user_task(self):
+        ''' Tasks of other users cannot be updated or deleted '''
+        other = User.objects.create_user(username="other", password="otherpassword")
+        task = Task.objects.create(user=other, title='not yours', importance='Low')
+
+        response = self.client.post(self.url, {'update': [{'id': task.pk, 'title': 'mine'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(self.url, {'delete': [task.pk]}, format='json')
+        self.assertEqual(response.data['deleted'], 0)
+        self.assertTrue(Task.objects.filter(pk=task.pk).exists())
+
+    def test_bulk_update_recomputes_search_vectors_once(self):
+        ''' bulk_update goes through TaskQuerySet.update, which refreshes the search vectors '''
+        task = Task.objects.create(user=self.user, title='before', importance='Low')
+        with mock.patch('tasks.models.supports_search', return_value=True), \
+                mock.patch('tasks.models.TaskQuerySet.update_search_vector') as update_search_vector:
+            response = self.client.post(self.url, {'update': [{'id': task.pk, 'title': 'after'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(update_search_vector.call_count, 1)
+
+    def test_bulk_malformed_body(self):
+        ''' Bodies that are not an object of lists are rejected before any operation '''
+        for data in ([{'title': 'in an array', 'importance': 'Low'}], {'create': 5}, {'delete': 'all'}):
+            response = self.client.post(self.url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+
+    def test_bulk_rejects_non_integer_ids(self):
+        ''' Booleans and strings are not task ids '''
+        task = Task.objects.create(user=self.user, title='first task', importance='Low')
+
+        for data in ({'delete': [True]}, {'delete': ['1']}, {'update': [{'id': True, 'title': 'renamed'}]}):
+            response = self.client.post(self.url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+        task.refresh_from_db()
+        self.assertEqual(task.title, 'first task')
+
+
+class ResponseCacheTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.task = Task.objects.create(user=self.user, title='cached', importance='Low')
+
+    def test_task_list_served_from_cache(self):
+        ''' A repeated read runs no query at all '''
+        url = reverse('task_list_api')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 1)
+
+    def test_task_save_and_delete_invalidate(self):
+        ''' Writes through Task.save and Task.delete are visible on the next read '''
+        url = reverse('task_list_api')
+        self.client.get(url)
+
+        self.task.title = 'renamed'
+        self.task.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data[0]['title'], 'renamed')
+
+        self.task.delete()
+        response = self.client.get(url)
+        self.assertEqual(len(response.data), 0)
+
+    def test_queryset_update_invalidates(self):
+        ''' Mass updates also invalidate the cached list '''
+        url = reverse('task_list_api')
+        self.client.get(url)
+
+        Task.objects.filter(user=self.user).update(title='mass renamed')
+        response = self.client.get(url)
+        self.assertEqual(response.data[0]['title'], 'mass renamed')
+
+    def test_history_cache_keyed_on_filters(self):
+        ''' History responses are cached per month/year and invalidated by completions '''
+        url = reverse('completed_task_history_api')
+        now = timezone.now()
+        self.assertEqual(len(self.client.get(url, {'year': now.year}).data), 0)
+        self.assertEqual(len(self.client.get(url, {'year': now.year - 1}).data), 0)
+
+        self.task.completed = True
+        self.task.save()
+        self.assertEqual(len(self.client.get(url, {'year': now.year}).data), 1)
+        self.assertEqual(len(self.client.get(url, {'year': now.year - 1}).data), 0)
+
+
+class ConditionalRequestTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.task = Task.objects.create(user=self.user, title='etag task', importance='Low')
+
+    def test_if_none_match_returns_304(self):
+        ''' A matching If-None-Match gets 304 without loading tasks '''
+        url = reverse('task_list_api')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        # The task rows are never queried for a 304, the validators and the user are cached
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_with_tasks(self):
+        ''' Creating or deleting a task produces a new ETag '''
+        url = reverse('task_list_api')
+        etag = self.client.get(url)['ETag']
+
+        Task.objects.create(user=self.user, title='another', importance='Low')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        self.task.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since(self):
+        ''' If-Modified-Since at or after the last change gets 304 '''
+        url = reverse('task_list_api')
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_if_modified_since_after_delete(self):
+        ''' Deleting a task older than the latest change still modifies the list '''
+        url = reverse('task_list_api')
+        Task.objects.create(user=self.user, title='newest', importance='Low')
+        last_modified = self.client.get(url)['Last-Modified']
+
+        # Last-Modified has a one second resolution
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timezone.timedelta(seconds=2)):
+            self.task.delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertNotEqual(response['Last-Modified'], last_modified)
+
+    def test_update_if_match(self):
+        ''' Updates with a stale If-Match are rejected with 412 '''
+        url = reverse('task_update_api', args=[self.task.pk])
+        response = self.client.put(url, {'title': 'first'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        response = self.client.put(url, {'title': 'second'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # The ETag from the first update is stale now
+        response = self.client.put(url, {'title': 'third'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.title, 'second')
+
+
+class TaskSyncTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.url = reverse('task_sync_api')
+
+    def backdate(self, seconds):
+        ''' Move every existing change into the past, beyond the sync overlap window '''
+        past = timezone.now() - timezone.timedelta(seconds=seconds)
+        Task.objects.filter(user=self.user).update(updated_at=past)
+        TaskTombstone.objects.filter(user=self.user).update(deleted_at=past)
+
+    def test_sync_returns_only_changes(self):
+        ''' After the initial sync only changed tasks and tombstones are returned '''
+        keep = Task.objects.create(user=self.user, title='keep', importance='Low')
+        change = Task.objects.create(user=self.user, title='change', importance='Low')
+        remove = Task.objects.create(user=self.user, title='remove', importance='Low')
+
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data['changed']), 3)
+        self.assertEqual(response.data['deleted'], [])
+
+        # Pretend the initial sync happened 30s ago and the tasks were written before it
+        self.backdate(60)
+        token = make_sync_token(self.user, timezone.now() - timezone.timedelta(seconds=30))
+
+        change.title = 'changed'
+        change.save()
+        remove_id = remove.pk
+        remove.delete()
+
+        response = self.client.get(self.url, {'since': token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([task['title'] for task in response.data['changed']], ['changed'])
+        self.assertEqual(response.data['deleted'], [remove_id])
+        self.assertTrue(response.data['sync_token'])
+        self.assertTrue(Task.objects.filter(pk=keep.pk).exists())
+
+    def test_bulk_delete_leaves_tombstones(self):
+        ''' Deleting through a queryset also records tombstones '''
+        tasks = [Task.objects.create(user=self.user, title=f'task {i}', importance='Low') for i in range(3)]
+        Task.objects.filter(user=self.user).delete()
+        self.assertEqual(
+            set(TaskTombstone.objects.filter(user=self.user).values_list('task_id', flat=True)),
+            {task.pk for task in tasks},
+        )
+
+    def test_invalid_or_foreign_token(self):
+        ''' Tokens are signed and bound to the user they were issued to '''
+        response = self.client.get(self.url, {'since': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        other = User.objects.create_user(username="other", password="otherpassword")
+        token = make_sync_token(other, timezone.now())
+        response = self.client.get(self.url, {'since': token})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncTaskAPITest(APITestCase):
+    ''' The async variant of the task API behaves like the DRF views '''
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_async_crud(self):
+        response = self.client.post(reverse('async_task_create_api'), {'title': 'async task', 'importance': 'Urgent'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        task_id = response.json()['id']
+
+        response = self.client.put(reverse('async_task_update_api', args=[task_id]), {'completed': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.json()['completed'])
+        self.assertEqual(CompletedTaskHistory.objects.filter(task_id=task_id).count(), 1)
+
+        response = self.client.get(reverse('async_task_list_api'))
+        self.assertEqual(response.json(), self.client.get(reverse('task_list_api')).json())
+
+        response = self.client.get(reverse('async_completed_task_history_api'), {'year': timezone.now().year})
+        self.assertEqual(len(response.json()), 1)
+
+        response = self.client.delete(reverse('async_task_delete_api', args=[task_id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Task.objects.filter(pk=task_id).exists())
+
+    def test_async_update_if_match(self):
+        ''' The async update checks If-Match like the DRF view, ETags are interchangeable '''
+        task = Task.objects.create(user=self.user, title='first', importance='Low')
+        url = reverse('async_task_update_api', args=[task.pk])
+        etag = self.client.put(reverse('task_update_api', args=[task.pk]), {'title': 'second'}, format='json')['ETag']
+
+        response = self.client.put(url, {'title': 'third'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # The ETag of the first update is stale now
+        response = self.client.put(url, {'title': 'fourth'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        task.refresh_from_db()
+        self.assertEqual(task.title, 'third')
+
+    def test_async_requires_valid_token(self):
+        client = APIClient()
+        response = client.get(reverse('async_task_list_api'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        response = client.get(reverse('async_task_list_api'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TaskStatsTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.url = reverse('task_stats_api')
+
+    def test_stats_from_rollups(self):
+        ''' Completions are counted per period, importance and deadline '''
+        Task.objects.create(user=self.user, title='on time', importance='Urgent', completed=True)
+        late = Task.objects.create(
+            user=self.user, title='late', importance='Low',
+            end_date=timezone.now() - timezone.timedelta(days=1),
+        )
+        late.completed = True
+        late.save()
+        Task.objects.create(user=self.user, title='open', importance='Low')
+
+        # The stats are answered from the rollup table alone
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'period': 'day'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['buckets']), 1)
+        totals = response.data['totals']
+        self.assertEqual(totals['completed'], 2)
+        self.assertEqual(totals['on_time'], 1)
+        self.assertEqual(totals['overdue'], 1)
+        self.assertEqual(totals['on_time_rate'], 0.5)
+        self.assertEqual(totals['by_importance'], {'Low': 1, 'Urgent': 1})
+
+    def test_mass_completion_updates_rollups(self):
+        ''' Completions through QuerySet.update() reach the rollups too '''
+        for i in range(3):
+            Task.objects.create(user=self.user, title=f'task {i}', importance='Medium')
+        Task.objects.filter(user=self.user).update(completed=True)
+
+        for period in ('day', 'week', 'month'):
+            response = self.client.get(self.url, {'period': period})
+            self.assertEqual(response.data['totals']['completed'], 3)
+
+    def test_stats_invalid_params(self):
+        self.assertEqual(self.client.get(self.url, {'period': 'year'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'start': '2024-13-01'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+
+class RequestMetricsTest(APITestCase):
+
+    def setUp(self):
+        registry.reset()
+        self.user = User.objects.create_user(username="metricsUser", password="metricsPassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.authorization = f'Bearer {refresh.access_token}'
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=self.authorization)
+        Task.objects.create(user=self.user, title='metrics task', importance='Low')
+
+    def test_request_recorded_per_view(self):
+        ''' Wall time, queries, serialization and size are recorded under the URL name '''
+        self.client.get(reverse('task_list_api'))
+
+        histograms = registry.histograms
+        counts, queries = histograms[('tasks_http_db_queries', 'task_list_api')].snapshot()
+        self.assertEqual(sum(counts), 1)
+        self.assertGreater(queries, 0)
+        _, serialization = histograms[('tasks_http_serialization_duration_seconds', 'task_list_api')].snapshot()
+        self.assertGreater(serialization, 0)
+        _, size = histograms[('tasks_http_response_size_bytes', 'task_list_api')].snapshot()
+        self.assertGreater(size, 0)
+        self.assertEqual(registry.requests[('task_list_api', 'GET', 200)], 1)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('task_list_api'))
+        response = self.client.get(reverse('metrics_api'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('tasks_http_requests_total{view="task_list_api",method="GET",status="200"} 1', body)
+        self.assertIn('tasks_http_request_duration_seconds_count{view="task_list_api"} 1', body)
+
+    @override_settings(TASKS_METRICS_TOKEN='scrape-secret')
+    def test_metrics_endpoint_token(self):
+        client = APIClient()
+        self.assertEqual(client.get(reverse('metrics_api')).status_code, status.HTTP_403_FORBIDDEN)
+        client.credentials(HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(client.get(reverse('metrics_api')).status_code, status.HTTP_200_OK)
+
+    async def test_queries_counted_under_asgi(self):
+        ''' Queries run on sync_to_async threads are counted for the request '''
+        client = AsyncClient()
+        for name in ('async_task_list_api', 'task_list_api'):
+            response = await client.get(reverse(name), headers={'Authorization': self.authorization})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            _, queries = registry.histograms[('tasks_http_db_queries', name)].snapshot()
+            self.assertGreater(queries, 0)
+
+    @override_settings(TASKS_SLOW_REQUEST_QUERIES=1)
+    def test_slow_request_logged_with_queries(self):
+        with self.assertLogs('api.slow', level='WARNING') as logs:
+            self.client.get(reverse('task_list_api'))
+        self.assertIn('task_list_api', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+
+class AuthUserCacheTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="authUser", password="authPassword")
+        self.token = RefreshToken.for_user(self.user).access_token
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.url = reverse('task_stats_api')
+
+    def test_user_loaded_once_per_token(self):
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+        # Only the rollup query is left
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deactivation_evicts_cached_user(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_last_login_update_keeps_cached_user(self):
+        self.client.get(self.url)
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=['last_login'])
+        self.assertIsNotNone(user_cache.get(self.user.pk, self.token['jti']))
+
+
+
+class TaskTransferTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="transferUser", password="transferPassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def export(self, name, fmt):
+        response = self.client.get(reverse(name), {'as': fmt})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_ndjson_and_csv(self):
+        Task.objects.create(user=self.user, title='first', importance='Low', completed=True)
+        Task.objects.create(user=self.user, title='with, comma', description='multi\nline', importance='Urgent')
+
+        rows = [json.loads(line) for line in self.export('task_export_api', 'ndjson').splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['first', 'with, comma'])
+        self.assertTrue(rows[0]['end_date'].endswith('Z'))
+
+        body = self.export('task_export_api', 'csv')
+        self.assertTrue(body.startswith('id,title,description,completed,importance,end_date,created_at,updated_at'))
+        self.assertIn('"with, comma","multi\nline"', body.replace('\r\n', '\n'))
+
+        history = self.export('completed_task_history_export_api', 'ndjson').splitlines()
+        self.assertEqual(json.loads(history[0])['task_title'], 'first')
+
+    def test_import_reports_invalid_rows(self):
+        body = '\n'.join([
+            json.dumps({'title': 'valid', 'importance': 'Medium'}),
+            json.dumps({'title': 'no importance'}),
+            'not json',
+            '',
+            json.dumps({'title': 'bad choice', 'importance': 'Whenever'}),
+            json.dumps({'title': 'done', 'importance': 'Low', 'completed': True, 'end_date': '2030-01-01T10:00:00Z'}),
+        ])
+        response = self.client.post(reverse('task_import_api'), body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['error_count'], 3)
+        self.assertEqual([error['line'] for error in response.data['errors']], [2, 3, 5])
+        self.assertIn('importance', response.data['errors'][0]['errors'])
+
+        # End date defaults of Task.save apply, completed rows get their history
+        valid = Task.objects.get(user=self.user, title='valid')
+        self.assertIsNotNone(valid.end_date)
+        self.assertEqual(CompletedTaskHistory.objects.filter(user=self.user).count(), 1)
+
+    def test_csv_export_imports_back(self):
+        for i in range(5):
+            Task.objects.create(user=self.user, title=f'task {i}', importance='Low')
+        body = self.export('task_export_api', 'csv')
+
+        other = User.objects.create_user(username="otherTransferUser", password="otherPassword")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(other).access_token}')
+        response = self.client.post(reverse('task_import_api'), body, content_type='text/csv')
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(response.data['error_count'], 0)
+        self.assertEqual(Task.objects.filter(user=other).count(), 5)
+
+    def test_csv_import_reports_invalid_rows(self):
+        ''' Undecodable lines and malformed records are reported, the rows after them imported '''
+        body = b'\n'.join([
+            b'title,importance',
+            b'first,Low',
+            b'\xff\xfe,Low',
+            b'"' + b'x' * 200000 + b'",Low',
+            b'last,Urgent',
+        ])
+        response = self.client.post(reverse('task_import_api'), body, content_type='text/csv')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['line'] for error in response.data['errors']], [3, 4])
+        self.assertEqual(set(Task.objects.filter(user=self.user).values_list('title', flat=True)), {'first', 'last'})
+
+    def test_import_invalidates_every_batch(self):
+        ''' Each committed batch is visible in the cached responses, even if a later one fails '''
+        body = ''.join(json.dumps({'title': f'task {i}', 'importance': 'Low'}) + '\n' for i in range(3))
+        with mock.patch('tasks.transfer.invalidate_user') as invalidate:
+            result = import_tasks(self.user, io.BytesIO(body.encode()), 'ndjson', batch_size=2)
+        self.assertEqual(result.created, 3)
+        self.assertEqual(invalidate.call_count, 2)
+
+    def test_import_multipart_upload(self):
+        upload = SimpleUploadedFile('tasks.csv', b'title,importance\nuploaded,Urgent\n', content_type='text/csv')
+        response = self.client.post(reverse('task_import_api'), {'file': upload}, format='multipart')
+        self.assertEqual(response.data['created'], 1)
+
+
+class TaskDeadlineTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="deadlineUser", password="deadlinePassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        now = timezone.now()
+        self.overdue = Task.objects.create(user=self.user, title='overdue', importance='Low', end_date=now - timezone.timedelta(hours=2))
+        self.due_soon = Task.objects.create(user=self.user, title='due soon', importance='Low', end_date=now + timezone.timedelta(hours=2))
+        Task.objects.create(user=self.user, title='later', importance='Low', end_date=now + timezone.timedelta(days=5))
+        Task.objects.create(user=self.user, title='done', importance='Low', completed=True, end_date=now - timezone.timedelta(hours=2))
+
+    def titles(self, name, due):
+        response = self.client.get(reverse(name), {'due': due})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [task['title'] for task in response.json()]
+
+    def test_due_filter(self):
+        for name in ('task_list_api', 'async_task_list_api'):
+            self.assertEqual(self.titles(name, 'overdue'), ['overdue'])
+            self.assertEqual(self.titles(name, 'due_soon'), ['due soon'])
+
+        response = self.client.get(reverse('task_list_api'), {'due': 'tomorrow'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_due_filter_is_not_cached(self):
+        self.assertEqual(self.titles('task_list_api', 'due_soon'), ['due soon'])
+        # Moving the deadline without touching the task list validators of other tasks
+        Task.objects.filter(pk=self.due_soon.pk).update(end_date=timezone.now() - timezone.timedelta(minutes=1))
+        self.assertEqual(self.titles('task_list_api', 'due_soon'), [])
+
+    def test_scan_records_events_once(self):
+        self.assertEqual(scan_reminders(batch_size=1), {TaskReminder.DUE_SOON: 1, TaskReminder.OVERDUE: 1})
+        scan_reminders(batch_size=1)
+
+        events = TaskReminder.objects.values_list('task__title', 'kind').order_by('kind')
+        self.assertEqual(list(events), [('due soon', TaskReminder.DUE_SOON), ('overdue', TaskReminder.OVERDUE)])
+
+        # A new deadline is a new event
+        self.due_soon.end_date = timezone.now() + timezone.timedelta(hours=3)
+        self.due_soon.save()
+        scan_reminders()
+        self.assertEqual(TaskReminder.objects.filter(task=self.due_soon).count(), 2)
+
+
+class TaskListFilterTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="filterUser", password="filterPassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        now = timezone.now()
+        Task.objects.create(user=self.user, title='urgent open', importance='Urgent', end_date=now + timezone.timedelta(days=2))
+        Task.objects.create(user=self.user, title='urgent done', importance='Urgent', completed=True, end_date=now + timezone.timedelta(days=3))
+        Task.objects.create(user=self.user, title='medium open', importance='Medium', end_date=now + timezone.timedelta(days=1))
+        Task.objects.create(user=self.user, title='low later', importance='Low', end_date=now + timezone.timedelta(days=30))
+
+    def get(self, params, name='task_list_api'):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.json()
+
+    def test_filters(self):
+        week = (timezone.now() + timezone.timedelta(days=7)).isoformat()
+        for name in ('task_list_api', 'async_task_list_api'):
+            tasks = self.get({'completed': 'false', 'importance': 'Urgent,Medium', 'end_date_before': week, 'ordering': 'end_date'}, name)
+            self.assertEqual([task['title'] for task in tasks], ['medium open', 'urgent open'])
+
+            tasks = self.get({'completed': 'true', 'created_at_after': timezone.now().date().isoformat()}, name)
+            self.assertEqual([task['title'] for task in tasks], ['urgent done'])
+
+            tasks = self.get({'ordering': '-end_date'}, name)
+            self.assertEqual(tasks[0]['title'], 'low later')
+
+    def test_invalid_parameters(self):
+        for params in ({'completed': 'maybe'}, {'importance': 'Whenever'}, {'end_date_after': 'soon'},
+                       {'ordering': 'title'}, {'fields': 'title,secret'}):
+            for name in ('task_list_api', 'async_task_list_api'):
+                response = self.client.get(reverse(name), params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_sparse_fieldset(self):
+        params = {'fields': 'title,importance_display,user', 'ordering': 'end_date'}
+        expected = {'title': 'medium open', 'importance_display': 'Moderate Priority (Complete within two weeks)', 'user': 'filterUser'}
+        self.assertEqual(self.get(params)[0], expected)
+        self.assertEqual(self.get(params, 'async_task_list_api')[0], expected)
+
+        # Only the requested columns are read
+        with CaptureQueriesContext(connection) as queries:
+            self.get({'fields': 'title', 'completed': 'false'})
+        select = queries.captured_queries[-1]['sql']
+        self.assertIn('"title"', select)
+        self.assertNotIn('"description"', select)
+        self.assertNotIn('auth_user', select)
+
+    def test_sparse_fieldset_pages(self):
+        for name in ('task_list_api', 'async_task_list_api'):
+            page = self.get({'fields': 'id,title', 'page_size': 3, 'ordering': 'end_date'}, name)
+            self.assertEqual(set(page['results'][0]), {'id', 'title'})
+            rest = self.get({'fields': 'id,title', 'page_size': 3, 'ordering': 'end_date', 'cursor': page['next_cursor']}, name)
+            self.assertEqual([task['title'] for task in rest['results']], ['low later'])
+
+
+class TaskSearchTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="searchUser", password="searchPassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        Task.objects.create(user=self.user, title='Quarterly report', description='Collect invoices', importance='Urgent')
+        Task.objects.create(user=self.user, title='Groceries', description='Milk and report cards', importance='Low')
+        Task.objects.create(user=self.user, title='Dentist', importance='Medium')
+        other = User.objects.create_user(username="otherSearchUser", password="otherPassword")
+        Task.objects.create(user=other, title='Secret report', importance='Low')
+
+    def search(self, **params):
+        response = self.client.get(reverse('task_search_api'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.data
+
+    def test_search_title_and_description(self):
+        results = self.search(q='report')['results']
+        self.assertEqual(sorted(task['title'] for task in results), ['Groceries', 'Quarterly report'])
+
+        results = self.search(q='report invoices')['results']
+        self.assertEqual([task['title'] for task in results], ['Quarterly report'])
+
+        # Task list filters and projections combine with the search
+        results = self.search(q='report', importance='Low', fields='title')['results']
+        self.assertEqual(results, [{'title': 'Groceries'}])
+
+    def test_search_pages(self):
+        first = self.search(q='report', page_size=1)
+        self.assertEqual(len(first['results']), 1)
+        self.assertEqual(first['next_page'], 2)
+        second = self.search(q='report', page_size=1, page=2)
+        self.assertIsNone(second['next_page'])
+        self.assertNotEqual(first['results'][0]['id'], second['results'][0]['id'])
+
+    def test_search_sees_changes(self):
+        self.assertEqual(self.search(q='dentist')['results'][0]['title'], 'Dentist')
+        task = Task.objects.get(title='Dentist')
+        task.title = 'Orthodontist'
+        task.save()
+        self.assertEqual(self.search(q='dentist')['results'], [])
+
+    def test_invalid_search(self):
+        for params in ({}, {'q': ' '}, {'q': 'report', 'page': 0}, {'q': 'x' * 201}):
+            response = self.client.get(reverse('task_search_api'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class HistoryArchiveTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="archiveUser", password="archivePassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        other = User.objects.create_user(username="otherArchiveUser", password="otherPassword")
+
+        self.old = timezone.now() - timezone.timedelta(days=800)
+        for user, title in ((self.user, 'old task'), (self.user, 'old deleted task'), (other, 'other old task')):
+            task = Task.objects.create(user=user, title=title, importance='Low')
+            CompletedTaskHistory.objects.create(task=task, completed_date=self.old)
+        Task.objects.get(title='old deleted task').delete()
+        task = Task.objects.create(user=self.user, title='recent task', importance='Urgent')
+        CompletedTaskHistory.objects.create(task=task, completed_date=timezone.now())
+
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        self.settings_override = override_settings(TASKS_HISTORY_ARCHIVE_DIR=self.archive_dir, TASKS_HISTORY_HOT_MONTHS=12)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def history(self, name='completed_task_history_api', **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(response.json(), key=lambda row: row['id'])
+
+    def test_archived_months_are_served_from_the_archive(self):
+        before = {
+            'all': self.history(),
+            'old year': self.history(year=self.old.year),
+            'old month': self.history(year=self.old.year, month=self.old.month),
+        }
+        call_command('archive_history', stdout=io.StringIO())
+
+        # Only the recent row is left in the table, responses are unchanged
+        self.assertEqual(list(CompletedTaskHistory.objects.values_list('task__title', flat=True)), ['recent task'])
+        self.assertEqual(HistoryArchive.objects.get().row_count, 3)
+        invalidate_user(self.user.pk)
+        for name in ('completed_task_history_api', 'async_completed_task_history_api'):
+            self.assertEqual(self.history(name), before['all'])
+            self.assertEqual(self.history(name, year=self.old.year), before['old year'])
+            self.assertEqual(self.history(name, year=self.old.year, month=self.old.month), before['old month'])
+        self.assertEqual(len(before['all']), 3)
+        self.assertNotIn('task_title', before['old month'][1])
+
+        # The archive is a plain gzip NDJSON file
+        with gzip.open(os.path.join(self.archive_dir, HistoryArchive.objects.get().path), 'rt') as archive:
+            titles = sorted(json.loads(line)['task_title'] or '' for line in archive)
+        self.assertEqual(titles, ['', 'old task', 'other old task'])
+
+        # Nothing left to archive on a second run
+        call_command('archive_history', stdout=io.StringIO())
+        self.assertEqual(HistoryArchive.objects.count(), 1)
+
+    def test_recent_months_skip_the_archive(self):
+        now = timezone.now()
+        self.assertFalse(reads_archive(now.year, now.month))
+        self.assertTrue(reads_archive(self.old.year, self.old.month))
+        self.assertTrue(reads_archive())
+
+
+@override_settings(TASKS_READ_REPLICAS=['replica1'], TASKS_REPLICA_PIN_SECONDS=5)
+class ReplicaRoutingTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="replicaUser", password="replicaPassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        # Creating the user pinned it to the primary
+        get_cache().clear()
+
+    def test_reads_go_to_the_replica(self):
+        with replica_reads(self.user.pk) as alias:
+            self.assertEqual(alias, 'replica1')
+            self.assertEqual(Task.objects.filter(user=self.user).db, 'replica1')
+            self.assertEqual(router.db_for_write(Task), 'default')
+        self.assertEqual(Task.objects.filter(user=self.user).db, 'default')
+        self.assertFalse(router.allow_migrate('replica1', 'tasks'))
+
+    def test_recent_writer_reads_the_primary(self):
+        Task.objects.create(user=self.user, title='just written', importance='Low')
+        with replica_reads(self.user.pk) as alias:
+            self.assertIsNone(alias)
+            self.assertEqual(Task.objects.filter(user=self.user).db, 'default')
+
+    def test_read_views_route_their_queries(self):
+        seen = []
+
+        def task_list_queryset(user, fields=None):
+            seen.append(current_replica.get())
+            return Task.objects.none()
+
+        with mock.patch('tasks.api_views.task_list_queryset', task_list_queryset), \
+                mock.patch('tasks.api_views.task_list_validators', return_value={'count': 0, 'last_modified': None}):
+            self.client.get(reverse('task_list_api'))
+            Task.objects.create(user=self.user, title='pins the user', importance='Low')
+            self.client.get(reverse('task_list_api'))
+        self.assertEqual(seen, ['replica1', None])
+        self.assertIsNone(current_replica.get())
+
+    def test_pin_needs_a_shared_cache(self):
+        ''' Replicas with a per-process cache fail the startup checks '''
+        local_cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.gettempdir()}}
+        with override_settings(CACHES=local_cache):
+            self.assertEqual([error.id for error in check_replica_pin_cache(None)], ['tasks.E001'])
+            with override_settings(TASKS_READ_REPLICAS=[]):
+                self.assertEqual(check_replica_pin_cache(None), [])
+        with override_settings(CACHES=shared_cache):
+            self.assertEqual(check_replica_pin_cache(None), [])
+
+
+class TaskListSnapshotTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="hotUser", password="hotPassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.task = Task.objects.create(user=self.user, title='first', importance='Low')
+        Task.objects.create(user=self.user, title='second', importance='Urgent', description='ü')
+        get_cache().clear()
+        hot_users.clear()
+        self.addCleanup(hot_users.clear)
+        patcher = mock.patch.object(hot_users, 'threshold', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = reverse('task_list_api')
+
+    def make_hot(self):
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+        self.assertTrue(TaskListSnapshot.objects.filter(user=self.user, requested_at__isnull=False).exists())
+        self.assertEqual(rebuild_queued(), 1)
+        return response
+
+    def test_hot_user_is_served_the_snapshot(self):
+        rendered = self.make_hot()
+        response = self.client.get(self.url)
+        self.assertFalse(hasattr(response, 'data'))
+        self.assertEqual(response.content, rendered.content)
+        self.assertEqual(response['ETag'], rendered['ETag'])
+        # Kept in the response cache until the next change
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).content, rendered.content)
+
+    def test_filtered_requests_skip_the_snapshot(self):
+        self.make_hot()
+        response = self.client.get(self.url, {'importance': 'Urgent'})
+        self.assertEqual([task['title'] for task in response.data], ['second'])
+
+    def test_task_save_queues_a_rebuild(self):
+        self.make_hot()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.title = 'renamed'
+            self.task.save()
+        self.assertTrue(TaskListSnapshot.objects.filter(user=self.user, requested_at__isnull=False).exists())
+
+        # The stale snapshot is never served
+        response = self.client.get(self.url)
+        self.assertEqual(response.data[0]['title'], 'renamed')
+        self.assertEqual(rebuild_queued(), 1)
+        response = self.client.get(self.url)
+        self.assertFalse(hasattr(response, 'data'))
+        self.assertEqual(json.loads(response.content)[0]['title'], 'renamed')
+
+    def test_stale_read_queues_writes_without_signals(self):
+        self.make_hot()
+        Task.objects.filter(user=self.user).update(completed=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(self.url)
+        self.assertTrue(all(task['completed'] for task in response.data))
+        self.assertEqual(rebuild_queued(), 1)
+
+    def test_cold_snapshots_expire(self):
+        self.make_hot()
+        self.assertEqual(expire_snapshots(), 0)
+        later = timezone.now() + timezone.timedelta(seconds=2 * hot_users.hot_seconds + 1)
+        self.assertEqual(expire_snapshots(later), 1)
+        call_command('run_snapshots', once=True, processes=0, stdout=io.StringIO())
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=rates))
+
+
+class ThrottleTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="busyUser", password="busyPassword")
+        refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        local_buckets.clear()
+        self.addCleanup(local_buckets.clear)
+        get_cache().clear()
+
+    def assert_read_budget(self):
+        url = reverse('task_list_api')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # One token every 30 s
+        self.assertEqual(response['Retry-After'], '30')
+
+        # Writes have their own budget
+        response = self.client.post(reverse('task_create_api'), {'title': 'write', 'importance': 'Low'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @throttle_rates(tasks_read='2/min', tasks_write='10/min')
+    def test_read_budget(self):
+        self.assert_read_budget()
+
+    @throttle_rates(tasks_read='2/min', tasks_write='10/min')
+    @override_settings(TASKS_THROTTLE_BACKEND='cache')
+    def test_read_budget_in_the_shared_cache(self):
+        self.assert_read_budget()
+
+    def assert_async_read_budget(self):
+        self.assertEqual(self.client.get(reverse('task_list_api')).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse('async_task_list_api')).status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('async_task_list_api'))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(response.json(), self.client.get(reverse('task_list_api')).json())
+
+        response = self.client.post(reverse('async_task_create_api'), {'title': 'write', 'importance': 'Low'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @throttle_rates(tasks_read='2/min', tasks_write='10/min')
+    def test_async_routes_share_the_budget(self):
+        ''' The async views spend the same read budget as the DRF views '''
+        self.assert_async_read_budget()
+
+    @throttle_rates(tasks_read='2/min', tasks_write='10/min')
+    @override_settings(TASKS_THROTTLE_BACKEND='cache')
+    def test_async_routes_share_the_budget_in_the_shared_cache(self):
+        self.assert_async_read_budget()
+
+    @throttle_rates(tasks_token='1/min')
+    def test_token_budget_per_client(self):
+        data = {'username': 'busyUser', 'password': 'busyPassword'}
+        self.assertEqual(self.client.post(reverse('token_obtain_pair'), data).status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('token_obtain_pair'), data)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '60')
+
+    def test_bucket_refill_and_wait(self):
+        buckets = LocalBuckets()
+        with mock.patch('tasks.throttling.time.monotonic', return_value=100.0):
+            self.assertEqual(buckets.consume('key', 1.0, 2), 0)
+            self.assertEqual(buckets.consume('key', 1.0, 2), 0)
+            self.assertAlmostEqual(buckets.consume('key', 1.0, 2), 1.0)
+            # Refused requests take no token
+            self.assertAlmostEqual(buckets.consume('key', 1.0, 2), 1.0)
+        with mock.patch('tasks.throttling.time.monotonic', return_value=100.5):
+            self.assertAlmostEqual(buckets.consume('key', 1.0, 2), 0.5)
+        with mock.patch('tasks.throttling.time.monotonic', return_value=101.0):
+            self.assertEqual(buckets.consume('key', 1.0, 2), 0)
+
+    def test_shared_bucket_refill_and_wait(self):
+        buckets = CacheBuckets()
+        with mock.patch('tasks.throttling.time.time_ns', return_value=100 * 10 ** 9):
+            self.assertEqual(buckets.consume('key', 1.0, 2), 0)
+            self.assertEqual(buckets.consume('key', 1.0, 2), 0)
+            self.assertAlmostEqual(buckets.consume('key', 1.0, 2), 1.0)
+            self.assertAlmostEqual(buckets.consume('key', 1.0, 2), 1.0)
+        with mock.patch('tasks.throttling.time.time_ns', return_value=105 * 10 ** 9):
+            # Idle long enough to be full again
+            self.assertEqual(buckets.consume('key', 1.0, 2), 0)
+            self.assertEqual(buckets.consume('key', 1.0, 2), 0)
+            self.assertAlmostEqual(buckets.consume('key', 1.0, 2), 1.0)
+
+class StartupReportTest(SimpleTestCase):
+
+    def test_api_profile_skips_the_site_apps(self):
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command('startup_report', profiles=['api'], runs=1, output=output.name, stderr=io.StringIO())
+            report = json.load(output)
+
+        api = report['profiles']['api']
+        self.assertEqual(api['apps'], ['django.contrib.auth', 'django.contrib.contenttypes', 'rest_framework', 'tasks'])
+        self.assertIn('tasks', api['import_ms'])
+        self.assertFalse(any(group.startswith(('allauth', 'dj_rest_auth', 'django.contrib.admin')) for group in api['import_ms']))
+        self.assertGreater(api['startup_ms'], 0)
+
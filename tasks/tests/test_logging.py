@@ -0,0 +1,137 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase
+from backend.logging_handlers import AsyncRotatingFileHandler, JsonFormatter, SamplingFilter
+
+
+class AsyncLoggingTest(SimpleTestCase):
+
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+        self.logger = logging.getLogger(f'test.async.{self.id()}')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+
+    def make_handler(self, **kwargs):
+        filename = os.path.join(self.log_dir.name, 'logs', 'test.log')
+        handler = AsyncRotatingFileHandler(filename, **kwargs)
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        return handler, filename
+
+    def test_records_are_written_by_listener(self):
+        handler, filename = self.make_handler()
+        handler.setFormatter(JsonFormatter())
+        self.logger.info("Returned %s tasks for %s", 3, 'alice')
+        handler.close()
+
+        with open(filename) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn('"message": "Returned 3 tasks for alice"', lines[0])
+
+    def test_listener_starts_with_the_first_record(self):
+        handler, filename = self.make_handler()
+        self.assertFalse(handler.started)
+        self.assertFalse(os.path.exists(os.path.dirname(filename)))
+
+        self.logger.info("first")
+        self.assertTrue(handler.started)
+        handler.close()
+        self.assertTrue(os.path.exists(filename))
+
+    def test_full_queue_drops_info_but_keeps_warnings(self):
+        handler, filename = self.make_handler(queue_size=1, warning_timeout=5)
+        # Hold the listener so the queue stays full
+        handler.listener.stop()
+        handler.listener = None
+
+        self.logger.info("kept")
+        self.logger.info("dropped")
+        self.assertEqual(handler.dropped, 1)
+
+        # A warning waits for room instead of being dropped, another thread drains the queue meanwhile
+        drain = threading.Timer(0.1, handler.queue.get_nowait)
+        drain.start()
+        self.logger.warning("waited")
+        drain.join()
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(handler.queue.get_nowait().getMessage(), "waited")
+
+        self.logger.info("after")
+        # The drop notice takes the free slot and the next info record is counted
+        self.assertEqual(handler.queue.get_nowait().getMessage(), "1 log records dropped, the logging queue was full")
+        self.assertEqual(handler.dropped, 1)
+        handler.close()
+
+    def test_full_queue_warning_latency_is_bounded(self):
+        handler, filename = self.make_handler(queue_size=1)
+        handler.listener.stop()
+        handler.listener = None
+
+        self.logger.warning("kept")
+        start = time.perf_counter()
+        self.logger.error("no listener")
+        # Dropped after the short warning wait, not the put_timeout of the block policy
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(handler.dropped, 1)
+        handler.close()
+
+    def test_block_policy_waits_up_to_the_timeout(self):
+        handler, filename = self.make_handler(queue_size=1, overflow='block', put_timeout=0.05)
+        handler.listener.stop()
+        handler.listener = None
+
+        self.logger.info("kept")
+        self.logger.info("no listener")
+        self.assertEqual(handler.dropped, 1)
+        handler.close()
+
+    def test_drops_are_counted_across_threads(self):
+        handler, filename = self.make_handler(queue_size=1)
+        handler.listener.stop()
+        handler.listener = None
+        self.logger.info("kept")
+
+        def log():
+            for _ in range(1000):
+                self.logger.debug("dropped")
+
+        threads = [threading.Thread(target=log) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(handler.dropped, 8000)
+        handler.close()
+
+    def test_forked_child_starts_its_own_listener(self):
+        handler, filename = self.make_handler()
+        self.logger.info("from parent")
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self.logger.warning("from child")
+                handler.close()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        handler.close()
+
+        with open(filename) as f:
+            body = f.read()
+        self.assertIn("from parent", body)
+        self.assertIn("from child", body)
+
+    def test_sampling_filter_never_drops_warnings(self):
+        sampler = SamplingFilter(rate=0.0)
+        info = logging.makeLogRecord({'levelno': logging.INFO, 'msg': 'info'})
+        warning = logging.makeLogRecord({'levelno': logging.WARNING, 'msg': 'warning'})
+        self.assertFalse(sampler.filter(info))
+        self.assertTrue(sampler.filter(warning))
@@ -0,0 +1,75 @@
+import re
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase
+from django.utils import timezone
+from tasks.models import Task, CompletedTaskHistory
+from tasks.pagination import KeysetPaginator
+from tasks.queries import task_list_queryset, completed_history_queryset, filter_task_list
+
+
+class QueryPlanTest(TestCase):
+    ''' The per-user access patterns must be served by an index, never a full table scan '''
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='planUser', password='planPassword')
+        task = Task.objects.create(user=self.user, title='plan task', importance='Low', completed=True)
+        CompletedTaskHistory.objects.create(task=task, completed_date=timezone.now())
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables always favour a seq scan, so only allow it when no index fits
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertNoFullScan(self, queryset, table):
+        plan = self.explain(queryset)
+        if connection.vendor == 'postgresql':
+            self.assertNotIn(f'Seq Scan on {table}', plan)
+        else:
+            # SQLite reports "SCAN <table>" for full scans and "SEARCH <table> USING INDEX" otherwise
+            self.assertIsNone(re.search(rf'\bSCAN {table}\b', plan), plan)
+
+    def test_task_list_page(self):
+        queryset = KeysetPaginator('created_at').order(task_list_queryset(self.user))
+        self.assertNoFullScan(queryset, 'tasks_task')
+
+    def test_task_list_next_pages(self):
+        task = Task.objects.get(user=self.user)
+        for ordering in ('created_at', 'end_date'):
+            paginator = KeysetPaginator(ordering)
+            cursor = paginator.encode_cursor(getattr(task, ordering), task.pk)
+            queryset = paginator.filter_after(paginator.order(task_list_queryset(self.user)), cursor)
+            self.assertNoFullScan(queryset, 'tasks_task')
+        # created_at is NOT NULL, its pages have no NULL tail branch
+        paginator = KeysetPaginator('created_at')
+        cursor = paginator.encode_cursor(task.created_at, task.pk)
+        self.assertNotIn('IS NULL', str(paginator.filter_after(Task.objects.all(), cursor).query))
+
+    def test_open_tasks_by_deadline(self):
+        queryset = Task.objects.filter(
+            user=self.user, completed=False, end_date__lt=timezone.now()
+        ).order_by('end_date')
+        self.assertNoFullScan(queryset, 'tasks_task')
+
+    def test_task_list_dashboard(self):
+        tasks = filter_task_list(task_list_queryset(self.user, ['id', 'title', 'end_date']), {
+            'completed': 'false', 'importance': 'Urgent', 'end_date_before': timezone.now().date().isoformat(),
+        })
+        self.assertNoFullScan(KeysetPaginator('end_date').order(tasks), 'tasks_task')
+
+    def test_reminder_scan(self):
+        # Every batch of the cross-user scan is a range on the open tasks index
+        now = timezone.now()
+        open_tasks = Task.objects.filter(completed=False, end_date__gt=now, end_date__lte=now + timezone.timedelta(days=1))
+        queryset = open_tasks.filter(Q(end_date__gt=now) | Q(end_date=now, id__gt=1)).order_by('end_date', 'id')
+        self.assertNoFullScan(queryset, 'tasks_task')
+
+    def test_completed_history_month(self):
+        now = timezone.now()
+        queryset = completed_history_queryset(self.user, year=now.year, month=now.month)
+        self.assertNoFullScan(queryset, 'tasks_completedtaskhistory')
+        self.assertNoFullScan(queryset, 'tasks_task')
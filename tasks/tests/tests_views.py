@@ -1,7 +1,12 @@
 from django.test import TestCase
 from django.urls import reverse
 from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
 from ..models import Task, CompletedTaskHistory
+from ..queries import task_list_queryset, completed_history_queryset
+from ..serializers import (
+    TaskSerializer, TaskValuesSerializer, CompletedTaskHistorySerializer, CompletedTaskHistoryValuesSerializer,
+)
 from django.contrib.auth.models import User
 
 # Create your tests here.
@@ -52,6 +57,41 @@ class TaskTest(TestCase):
         self.assertEqual(history.count(), 1)  # Ensure one record in history
         self.assertEqual(history.first().task, task)
 
+    def test_completion_history_only_on_transition(self):
+        '''Saving an already completed task again does not add history rows'''
+        task = Task.objects.create(user=self.user, title='Toggle', importance='Low')
+
+        task.completed = True
+        task.save()
+        task.title = 'Toggle again'
+        task.save()
+        self.assertEqual(CompletedTaskHistory.objects.filter(task=task).count(), 1)
+
+        # Reloaded instances know their completion state without another query
+        task = Task.objects.get(pk=task.pk)
+        with self.assertNumQueries(1):
+            task.save()
+        self.assertEqual(CompletedTaskHistory.objects.filter(task=task).count(), 1)
+
+        # Completing again after reopening is a new completion
+        task.completed = False
+        task.save()
+        task.completed = True
+        task.save()
+        self.assertEqual(CompletedTaskHistory.objects.filter(task=task).count(), 2)
+
+    def test_queryset_update_records_history(self):
+        '''Mass completion through QuerySet.update() records history in bulk'''
+        done = Task.objects.create(user=self.user, title='Done', importance='Low', completed=True)
+        for i in range(3):
+            Task.objects.create(user=self.user, title=f'Open {i}', importance='Low')
+
+        updated = Task.objects.filter(user=self.user).update(completed=True)
+
+        self.assertEqual(updated, 4)
+        self.assertEqual(CompletedTaskHistory.objects.filter(task__user=self.user).count(), 4)
+        self.assertEqual(CompletedTaskHistory.objects.filter(task=done).count(), 1)
+
     def test_completed_task_history_view(self):
         """Test accessing the completed task history page with filtering."""
         task = Task.objects.create(
@@ -68,3 +108,38 @@ class TaskTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "History Test Task")
         self.assertContains(response, "Importance: Medium")
+
+
+class ValuesSerializerTest(TestCase):
+    '''The values() fast paths must render byte-identical JSON to the model serializers'''
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='fastUser', password='fastPassword')
+        for i, importance in enumerate(['Low', 'Medium', 'Urgent']):
+            Task.objects.create(
+                user=self.user, title=f'Fast {i}', description=None if i else 'text',
+                importance=importance, completed=bool(i % 2),
+            )
+        # Legacy rows: the old lowercase default and a missing end date
+        Task.objects.filter(title='Fast 0').update(importance='low', end_date=None)
+
+        deleted = Task.objects.create(user=self.user, title='Deleted', importance='Low', completed=True)
+        deleted.delete()
+
+    def test_task_list_identical(self):
+        renderer = JSONRenderer()
+        tasks = task_list_queryset(self.user).order_by('id')
+        fast = TaskValuesSerializer(self.user.username)
+        self.assertEqual(
+            renderer.render(fast.to_representation(list(fast.values(tasks)))),
+            renderer.render(TaskSerializer(tasks, many=True).data),
+        )
+
+    def test_history_identical(self):
+        renderer = JSONRenderer()
+        history = completed_history_queryset(self.user).order_by('id')
+        fast = CompletedTaskHistoryValuesSerializer()
+        self.assertEqual(
+            renderer.render(fast.to_representation(list(fast.values(history)))),
+            renderer.render(CompletedTaskHistorySerializer(history, many=True).data),
+        )
@@ -0,0 +1,158 @@
+# tasks/throttling.py
+
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .cache import get_cache
+
+MAX_LOCAL_BUCKETS = 100000
+# Shared buckets are dropped after a day without refill; a client throttled
+# without pause for that long starts over with a full bucket once
+CACHE_BUCKET_TIMEOUT = 24 * 3600
+READ_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+WRITE_METHODS = frozenset(('POST', 'PUT', 'PATCH', 'DELETE'))
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    ''' (requests, period in seconds) of a DRF rate such as "120/min" '''
+    requests, period = rate.split('/')
+    return int(requests), PERIODS[period[0]]
+
+
+class LocalBuckets:
+    '''
+    Token buckets of this process, one float per key.
+
+    Each bucket is kept in its GCRA form: the time at which it would be full
+    again ("theoretical arrival time"). A request takes one token by moving
+    that time forward by one emission interval (period / rate), and is
+    refused when this would put the bucket more than `capacity` tokens in
+    debt. Refusals do not consume, and the wait until the next token frees
+    up is exact.
+
+    There is no lock: a check is one dict read and one dict store. Two
+    threads racing on the last token of the same key can both pass, so a
+    client may exceed its budget by at most the number of threads of a
+    process.
+    '''
+
+    def __init__(self, max_keys=MAX_LOCAL_BUCKETS):
+        self.max_keys = max_keys
+        self.buckets = {}
+
+    def consume(self, key, interval, capacity):
+        ''' Take one token: 0 when allowed, otherwise the seconds until a token is available '''
+        now = time.monotonic()
+        full_at = self.buckets.get(key, now)
+        if full_at < now:
+            full_at = now
+        full_at += interval
+        excess = full_at - now - capacity * interval
+        if excess > 0:
+            return excess
+        if len(self.buckets) >= self.max_keys and key not in self.buckets:
+            self.prune(now)
+        self.buckets[key] = full_at
+        return 0
+
+    def prune(self, now):
+        # Full buckets hold no state, they start over at the next request
+        self.buckets = {key: full_at for key, full_at in list(self.buckets.items()) if full_at > now}
+
+    def clear(self):
+        self.buckets = {}
+
+
+class CacheBuckets:
+    '''
+    The same buckets in the shared cache, so the budget covers every worker
+    process. Stored in microseconds of wall clock time, updated with the
+    cache's atomic incr/decr (Redis, Memcached).
+
+    Moving the time of an idle bucket up to now is a plain set: two requests
+    racing on a bucket that just went idle can both count from now, letting
+    one extra request through.
+    '''
+
+    def consume(self, key, interval, capacity):
+        cache = get_cache()
+        key = f'tasks:throttle:{key}'
+        now = time.time_ns() // 1000
+        step = round(interval * 1_000_000)
+        try:
+            full_at = cache.incr(key, step)
+        except ValueError:
+            if cache.add(key, now + step, timeout=CACHE_BUCKET_TIMEOUT):
+                return 0
+            full_at = cache.incr(key, step)
+        if full_at < now + step:
+            # The bucket had refilled completely
+            cache.set(key, now + step, timeout=CACHE_BUCKET_TIMEOUT)
+            return 0
+        excess = full_at - now - capacity * step
+        if excess > 0:
+            # Refused requests give their token back
+            cache.decr(key, step)
+            return excess / 1_000_000
+        return 0
+
+
+local_buckets = LocalBuckets()
+cache_buckets = CacheBuckets()
+
+
+def get_buckets():
+    return cache_buckets if getattr(settings, 'TASKS_THROTTLE_BACKEND', 'local') == 'cache' else local_buckets
+
+
+class TokenBucketThrottle(BaseThrottle):
+    '''
+    Throttle with a token bucket per user, or per client IP for anonymous
+    requests, refilled at the `scope` rate of DEFAULT_THROTTLE_RATES
+    ("120/min": a burst of up to 120 requests, then one every 0.5 s).
+    '''
+    scope = None
+    methods = None  # HTTP methods the budget applies to, None for all
+
+    def __init__(self):
+        self.delay = None
+
+    def allow_request(self, request, view):
+        if self.methods is not None and request.method not in self.methods:
+            return True
+        # Read per request so the rates follow override_settings
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if rate is None:
+            return True
+        capacity, period = parse_rate(rate)
+
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        self.delay = get_buckets().consume(f'{self.scope}:{ident}', period / capacity, capacity)
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+
+class ReadRateThrottle(TokenBucketThrottle):
+    scope = 'tasks_read'
+    methods = READ_METHODS
+
+
+class WriteRateThrottle(TokenBucketThrottle):
+    scope = 'tasks_write'
+    methods = WRITE_METHODS
+
+
+class TokenRateThrottle(TokenBucketThrottle):
+    ''' Token issuance and refresh, keyed by client IP since the request is not authenticated yet '''
+    scope = 'tasks_token'
@@ -0,0 +1,305 @@
+# tasks/transfer.py
+
+import csv
+import io
+import json
+import logging
+
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import invalidate_user
+from .models import Task, CompletedTaskHistory
+from .serializers import datetime_formatter
+
+logger = logging.getLogger('tasks')
+
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+# (column name, values_list field) of each export
+TASK_EXPORT_COLUMNS = (
+    ('id', 'id'), ('title', 'title'), ('description', 'description'), ('completed', 'completed'),
+    ('importance', 'importance'), ('end_date', 'end_date'), ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+)
+HISTORY_EXPORT_COLUMNS = (
+    ('id', 'id'), ('task_id', 'task_id'), ('task_title', 'task__title'),
+    ('task_importance', 'task__importance'), ('completed_date', 'completed_date'),
+)
+DATETIME_COLUMNS = frozenset(('end_date', 'created_at', 'updated_at', 'completed_date'))
+
+EXPORT_CHUNK_SIZE = 2000  # Rows fetched per round trip (server-side cursor on PostgreSQL)
+IMPORT_BATCH_SIZE = 5000  # Rows per bulk_create / transaction
+READ_SIZE = 64 * 1024
+MAX_REPORTED_ERRORS = 1000
+
+IMPORTANCE_LEVELS = frozenset(choice for choice, _ in Task.IMPORTANCE_CHOICES)
+TITLE_MAX_LENGTH = Task._meta.get_field('title').max_length
+TRUE_VALUES = frozenset(('true', '1', 'yes', 'y', 't'))
+FALSE_VALUES = frozenset(('false', '0', 'no', 'n', 'f', ''))
+
+
+def task_export_queryset(user):
+    return Task.objects.filter(user=user).order_by('id').values_list(*(field for _, field in TASK_EXPORT_COLUMNS))
+
+
+def history_export_queryset(user):
+    return (
+        CompletedTaskHistory.objects.filter(user=user).order_by('id')
+        .values_list(*(field for _, field in HISTORY_EXPORT_COLUMNS))
+    )
+
+
+def export_rows(queryset, columns, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    '''
+    Yield a queryset of value rows as NDJSON or CSV, one bytes chunk per
+    fetched chunk of rows, so memory stays constant whatever the row count.
+    '''
+    names = [name for name, _ in columns]
+    format_datetime = datetime_formatter()
+    # Datetime columns are formatted like the JSON API, everything else is written as is
+    datetime_columns = [i for i, name in enumerate(names) if name in DATETIME_COLUMNS]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(names)
+
+    count = 0
+    for row in queryset.iterator(chunk_size=chunk_size):
+        row = list(row)
+        for i in datetime_columns:
+            row[i] = format_datetime(row[i])
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(names, row)), ensure_ascii=False))
+            buffer.write('\n')
+        count += 1
+        if count % chunk_size == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def export_response(queryset, columns, fmt, filename):
+    response = StreamingHttpResponse(export_rows(queryset, columns, fmt), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+def iter_lines(stream, read_size=READ_SIZE):
+    ''' Lines (bytes, newline included) of a binary file-like object, read incrementally '''
+    pending = b''
+    while True:
+        chunk = stream.read(read_size)
+        if not chunk:
+            break
+        pending += chunk
+        lines = pending.split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + b'\n'
+    if pending:
+        yield pending
+
+
+class ImportResult:
+
+    def __init__(self):
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'error_count': self.error_count, 'errors': self.errors}
+
+
+def parse_ndjson(lines):
+    ''' (line number, row dict or None, parse error) for every non-blank line '''
+    for number, line in enumerate(lines, start=1):
+        if number == 1:
+            line = line.removeprefix(b'\xef\xbb\xbf')
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, None, {'non_field_errors': ['Invalid JSON']}
+            continue
+        if not isinstance(row, dict):
+            yield number, None, {'non_field_errors': ['Expected a JSON object']}
+            continue
+        yield number, row, None
+
+
+def parse_csv(lines):
+    '''
+    (line number, row dict or None, parse error) for every CSV record.
+
+    Like the NDJSON parser, a line that is not valid UTF-8 or a malformed
+    record is reported with its line number and the import goes on with the
+    next one.
+    '''
+    decode_errors = []
+
+    def decode(lines):
+        for number, line in enumerate(lines, start=1):
+            try:
+                yield line.decode('utf-8-sig' if number == 1 else 'utf-8')
+            except UnicodeDecodeError as e:
+                decode_errors.append((number, None, {'non_field_errors': [f'Invalid UTF-8: {e.reason}']}))
+                # Read as a blank line, which the reader skips
+                yield '\n'
+
+    reader = csv.DictReader(decode(lines))
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            break
+        except csv.Error as e:
+            # The reader starts over on the line after the malformed record. DictReader
+            # only copies line_num on success, the underlying reader has the failing line.
+            row, errors = None, {'non_field_errors': [f'Invalid CSV: {e}']}
+        else:
+            errors = None
+        yield from decode_errors
+        decode_errors.clear()
+        yield reader.reader.line_num, row, errors
+    yield from decode_errors
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError
+
+
+def build_task(row, tz, default_end_dates):
+    '''
+    (title, description, completed, importance, end_date) of one imported
+    row, or the per-field errors.
+
+    Applies the same rules as TaskSerializer plus the create rules of the
+    API: title and importance are required, unknown columns (id, timestamps
+    of an export) are ignored.
+    '''
+    errors = {}
+
+    title = row.get('title')
+    if not isinstance(title, str) or not title.strip():
+        errors['title'] = ['This field is required.']
+    elif len(title) > TITLE_MAX_LENGTH:
+        errors['title'] = [f'Ensure this field has no more than {TITLE_MAX_LENGTH} characters.']
+
+    importance = row.get('importance')
+    if not importance:
+        errors['importance'] = ['Importance level is required']
+    elif not isinstance(importance, str) or importance not in IMPORTANCE_LEVELS:
+        errors['importance'] = [f'"{importance}" is not a valid choice.']
+
+    description = row.get('description') or None
+    if description is not None and not isinstance(description, str):
+        errors['description'] = ['Not a valid string.']
+
+    try:
+        completed = parse_bool(row.get('completed'))
+    except ValueError:
+        errors['completed'] = ['Must be a valid boolean.']
+
+    end_date = row.get('end_date') or None
+    if end_date is not None:
+        try:
+            parsed = parse_datetime(end_date) if isinstance(end_date, str) else None
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            errors['end_date'] = ['Datetime has wrong format.']
+        elif timezone.is_naive(parsed):
+            end_date = timezone.make_aware(parsed, tz)
+        else:
+            end_date = parsed
+
+    if errors:
+        return None, errors
+    return (title, description, completed, importance, end_date or default_end_dates[importance]), None
+
+
+def import_tasks(user, stream, fmt, batch_size=IMPORT_BATCH_SIZE):
+    '''
+    Import tasks for a user from a binary NDJSON or CSV stream.
+
+    The stream is parsed incrementally, valid rows are inserted in batches
+    (each batch in its own transaction) and invalid rows are reported with
+    their line number without stopping the import. Completed tasks get their
+    history rows like tasks created through the API. The user's cached
+    responses are invalidated after every committed batch, so an import
+    failing half way does not leave them stale.
+    '''
+    result = ImportResult()
+    parse = parse_csv if fmt == 'csv' else parse_ndjson
+    tz = timezone.get_current_timezone()
+    # Same end date defaults as Task.set_default_end_date, computed once per import
+    now = timezone.now()
+    default_end_dates = {
+        importance: now + timezone.timedelta(days=days) for importance, days in Task.IMPORTANCE_DAYS.items()
+    }
+
+    batch = []
+    for line, row, parse_errors in parse(iter_lines(stream)):
+        if parse_errors:
+            result.add_error(line, parse_errors)
+            continue
+        values, errors = build_task(row, tz, default_end_dates)
+        if errors:
+            result.add_error(line, errors)
+            continue
+        batch.append(values)
+        if len(batch) >= batch_size:
+            result.created += _insert_batch(user, batch)
+            batch = []
+    if batch:
+        result.created += _insert_batch(user, batch)
+
+    logger.info("Imported %s tasks for user %s with %s invalid rows", result.created, user.pk, result.error_count)
+    return result
+
+
+def _insert_batch(user, rows):
+    '''
+    Insert one batch with a single bulk_create, in its own transaction.
+
+    The primary keys come back from the insert (RETURNING on PostgreSQL), the
+    search vectors and the history of the completed tasks are written for
+    exactly those rows.
+    '''
+    tasks = [
+        Task(user=user, title=title, description=description, completed=completed, importance=importance, end_date=end_date)
+        for title, description, completed, importance, end_date in rows
+    ]
+    with transaction.atomic():
+        tasks = Task.objects.bulk_create(tasks)
+        Task.objects.filter(pk__in=[task.pk for task in tasks]).update_search_vector()
+        completed = [task for task in tasks if task.completed]
+        if completed:
+            CompletedTaskHistory.record_completions(completed)
+    invalidate_user(user.pk)
+    return len(tasks)